@@ -0,0 +1,121 @@
+from collections import Counter
+from django.db.models import Count, F, Q, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from timecapsuleapi import registry
+from timecapsuleapi.models import Prediction, PredictionCategoryDay, PredictionVerifierDay, VerificationStatus
+
+OUTCOMES = ("verified", "disproved")
+
+
+def contribution(category, verification_status_id, verification_user_id, verification_date):
+    """The daily rollup bucket one prediction counts towards, if any
+
+    Returns:
+        tuple -- (day, category, verifier id, outcome), or None while the
+        prediction is not verified or disproved
+    """
+    if verification_date is None:
+        return None
+
+    try:
+        outcome = registry.verification_statuses.get(verification_status_id).name
+    except VerificationStatus.DoesNotExist:
+        return None
+
+    if outcome not in OUTCOMES:
+        return None
+
+    day = timezone.localtime(verification_date).date()
+    return (day, category or "", verification_user_id, outcome)
+
+
+def prediction_contribution(prediction):
+    return contribution(
+        prediction.category,
+        prediction.verification_status_id,
+        prediction.verification_user_id,
+        prediction.verification_date,
+    )
+
+
+def move(previous, current):
+    """Move one prediction from its previous bucket to its current one"""
+    changes = Counter()
+    if previous is not None:
+        changes[previous] -= 1
+    if current is not None:
+        changes[current] += 1
+    apply(changes)
+
+
+def apply(changes):
+    """Apply a Counter of {contribution: amount} to the daily rollup rows"""
+    for (day, category, verifier_id, outcome), amount in changes.items():
+        if not amount:
+            continue
+        _adjust(PredictionCategoryDay, {"day": day, "category": category}, outcome, amount)
+        if verifier_id is not None:
+            _adjust(PredictionVerifierDay, {"day": day, "verification_user_id": verifier_id}, outcome, amount)
+
+
+def _adjust(model, keys, field, amount):
+    rows = model.objects.filter(**keys)
+    if rows.update(**{field: F(field) + amount}):
+        return
+
+    # Create the row first so concurrent writers both increment it
+    model.objects.bulk_create([model(**keys)], ignore_conflicts=True)
+    rows.update(**{field: F(field) + amount})
+
+
+def rebuild():
+    """Recompute both daily rollup tables from the prediction table
+
+    Returns:
+        tuple -- Number of category rows and verifier rows written
+    """
+    outcome_ids = {
+        vs.name: vs.id for vs in registry.verification_statuses.all() if vs.name in OUTCOMES
+    }
+    totals = {
+        outcome: Count("id", filter=Q(verification_status_id=outcome_ids.get(outcome)))
+        for outcome in OUTCOMES
+    }
+    verified = Prediction.objects.exclude(verification_date=None).filter(
+        verification_status_id__in=outcome_ids.values()
+    ).order_by()
+
+    by_category = (
+        verified.annotate(day=TruncDate("verification_date"), bucket=Coalesce("category", Value("")))
+        .values("day", "bucket")
+        .annotate(**totals)
+    )
+    category_rows = {}
+    for row in by_category:
+        key = (row["day"], row["bucket"])
+        current = category_rows.setdefault(key, PredictionCategoryDay(day=row["day"], category=row["bucket"]))
+        current.verified += row["verified"]
+        current.disproved += row["disproved"]
+
+    by_verifier = (
+        verified.exclude(verification_user=None)
+        .annotate(day=TruncDate("verification_date"))
+        .values("day", "verification_user")
+        .annotate(**totals)
+    )
+    verifier_rows = [
+        PredictionVerifierDay(
+            day=row["day"],
+            verification_user_id=row["verification_user"],
+            verified=row["verified"],
+            disproved=row["disproved"],
+        )
+        for row in by_verifier
+    ]
+
+    PredictionCategoryDay.objects.all().delete()
+    PredictionVerifierDay.objects.all().delete()
+    PredictionCategoryDay.objects.bulk_create(category_rows.values(), batch_size=500)
+    PredictionVerifierDay.objects.bulk_create(verifier_rows, batch_size=500)
+    return len(category_rows), len(verifier_rows)
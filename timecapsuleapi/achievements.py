@@ -0,0 +1,104 @@
+from collections import namedtuple
+from django.utils import timezone
+from timecapsuleapi.models import UserAchievement, UserProfile, TimeCapsule, DiscussionThread, Prediction
+
+AchievementRule = namedtuple("AchievementRule", ("key", "name", "description", "metric", "threshold"))
+
+# Every achievement is a threshold on one metric. Adding a rule here is all
+# it takes; run `backfill_achievements` afterwards to award it retroactively.
+ACHIEVEMENT_RULES = (
+    AchievementRule("capsule_creator", "Time Capsule Creator", "Created your first time capsule", "capsules_created", 1),
+    AchievementRule("capsule_enthusiast", "Time Capsule Enthusiast", "Created 5 time capsules", "capsules_created", 5),
+    AchievementRule("capsule_master", "Time Capsule Master", "Created 10 time capsules", "capsules_created", 10),
+    AchievementRule("discussion_starter", "Discussion Starter", "Started your first discussion", "discussions_started", 1),
+    AchievementRule("prediction_verifier", "Prediction Verifier", "Verified your first prediction", "predictions_verified", 1),
+)
+
+RULES_BY_KEY = {rule.key: rule for rule in ACHIEVEMENT_RULES}
+
+
+def _current_value(metric, profile_id):
+    """Current value of a metric for one user"""
+    if metric == "capsules_created":
+        counter = "created_capsules_count"
+    elif metric == "predictions_verified":
+        counter = "verified_predictions_count"
+    else:
+        return DiscussionThread.objects.filter(created_by_id=profile_id).count()
+
+    value = UserProfile.objects.filter(pk=profile_id).values_list(counter, flat=True).first()
+    return value or 0
+
+
+def _event_dates(metric, profile_id):
+    """Dates of the events a metric counts for one user, oldest first"""
+    if metric == "capsules_created":
+        events = TimeCapsule.objects.filter(creator_id=profile_id).values_list("created_at", flat=True)
+        return events.order_by("created_at")
+    if metric == "predictions_verified":
+        events = Prediction.objects.filter(verification_user_id=profile_id).values_list("verification_date", flat=True)
+        return events.exclude(verification_date=None).order_by("verification_date")
+    events = DiscussionThread.objects.filter(created_by_id=profile_id).values_list("created_at", flat=True)
+    return events.order_by("created_at")
+
+
+def award(profile_id, metric, date_earned=None):
+    """Record every achievement a user now qualifies for on one metric
+
+    Called from the write paths right after the metric changed. Existing
+    ledger rows are left alone, so calling this again is harmless.
+    """
+    if profile_id is None:
+        return
+
+    value = _current_value(metric, profile_id)
+    date_earned = date_earned or timezone.now()
+    earned = [
+        UserAchievement(user_id=profile_id, key=rule.key, date_earned=date_earned)
+        for rule in ACHIEVEMENT_RULES
+        if rule.metric == metric and value >= rule.threshold
+    ]
+    if earned:
+        UserAchievement.objects.bulk_create(earned, ignore_conflicts=True)
+
+
+def backfill(profile_ids):
+    """Award achievements from existing history, dated when they were reached
+
+    Returns:
+        int -- Number of achievements reached, including ones already recorded
+    """
+    metrics = {}
+    for rule in ACHIEVEMENT_RULES:
+        metrics[rule.metric] = max(metrics.get(rule.metric, 0), rule.threshold)
+
+    earned = []
+    for profile_id in profile_ids:
+        for metric, highest_threshold in metrics.items():
+            dates = list(_event_dates(metric, profile_id)[:highest_threshold])
+            for rule in ACHIEVEMENT_RULES:
+                if rule.metric == metric and len(dates) >= rule.threshold:
+                    earned.append(UserAchievement(
+                        user_id=profile_id, key=rule.key, date_earned=dates[rule.threshold - 1]
+                    ))
+
+    UserAchievement.objects.bulk_create(earned, ignore_conflicts=True, batch_size=500)
+    return len(earned)
+
+
+def achievements_for(profile_id):
+    """Earned achievements of a user, oldest first
+
+    Returns:
+        List of achievements
+    """
+    entries = UserAchievement.objects.filter(user_id=profile_id).order_by("date_earned", "id")
+    return [
+        {
+            "name": RULES_BY_KEY[entry.key].name,
+            "description": RULES_BY_KEY[entry.key].description,
+            "date_earned": entry.date_earned,
+        }
+        for entry in entries
+        if entry.key in RULES_BY_KEY
+    ]
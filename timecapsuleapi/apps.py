@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class TimecapsuleapiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'timecapsuleapi'
+
+    def ready(self):
+        # Connect signal receivers
+        from timecapsuleapi import signals
@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import DEFERRED
+from timecapsuleapi.models import UserProfile
+
+# Tokens and users are checked against the database on every request by
+# DRF's TokenAuthentication, so revoking a token or deactivating a user
+# takes effect at once in every worker. Only the id of each user's profile
+# is cached, for AUTH_PROFILE_CACHE_TTL seconds.
+
+
+def _key(user_id):
+    return f"auth-profile:{user_id}"
+
+
+def profile_for(user):
+    """The profile of an authenticated user, without querying it when cached
+
+    Only id and user are loaded. Other fields are deferred and read from
+    the database on first access, like a queryset with only("id").
+
+    Returns:
+        UserProfile -- Or None for anonymous users and users without one
+    """
+    if user is None or not user.is_authenticated:
+        return None
+
+    profile_id = cache.get(_key(user.pk))
+    if profile_id is None:
+        profile_id = UserProfile.objects.filter(user_id=user.pk).values_list("id", flat=True).first()
+        if profile_id is None:
+            return None
+        cache.set(_key(user.pk), profile_id, settings.AUTH_PROFILE_CACHE_TTL)
+
+    names = [field.attname for field in UserProfile._meta.concrete_fields]
+    values = [
+        profile_id if name == "id" else user.pk if name == "user_id" else DEFERRED
+        for name in names
+    ]
+    profile = UserProfile.from_db(DEFAULT_DB_ALIAS, names, values)
+    profile.user = user
+    return profile
+
+
+def invalidate(*user_ids):
+    """Forget the cached profile id of every given user"""
+    keys = [_key(user_id) for user_id in user_ids if user_id is not None]
+    if keys:
+        cache.delete_many(keys)
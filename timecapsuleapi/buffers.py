@@ -0,0 +1,291 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from timecapsuleapi import comment_hub, counters, hotness, stats_cache
+from timecapsuleapi.models import (
+    CapsuleDiscovery, DiscussionComment, DiscussionThread, QueuedComment, StoryChoice, StoryChoiceDay,
+    TimeCapsule,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBuffer:
+    """Collects writes in memory and commits them to the database in batches
+
+    A batch is written as soon as the size setting is reached, or by a timer
+    thread once the oldest pending item is older than the delay setting.
+    Subclasses name their settings and implement write(items). A size of 1
+    or less writes every item straight away.
+
+    With single_writer set, requests never write: one long-lived thread
+    writes every batch, so batches never compete with each other for the
+    database write lock.
+    """
+
+    size_setting = None
+    delay_setting = None
+    single_writer = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._pending = []
+        self._oldest_at = None
+        self._timer = None
+        self._writer = None
+        atexit.register(self.flush)
+
+    @property
+    def max_size(self):
+        return getattr(settings, self.size_setting)
+
+    @property
+    def max_delay(self):
+        return getattr(settings, self.delay_setting)
+
+    def add(self, item):
+        """Queue one item, writing the batch if it is now full"""
+        with self._lock:
+            self._pending.append(item)
+            full = len(self._pending) >= self.max_size
+            if self.single_writer:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._run_writer, daemon=True)
+                    self._writer.start()
+                if len(self._pending) == 1:
+                    self._oldest_at = time.monotonic()
+                    self._wake.notify()
+                elif full:
+                    self._wake.notify()
+                return
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self.max_delay, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+
+        if full:
+            self.flush()
+
+    def pending(self):
+        """Items queued but not written yet"""
+        with self._lock:
+            return list(self._pending)
+
+    def flush(self):
+        """Write everything that is pending
+
+        Returns:
+            int -- Number of items handed to write()
+        """
+        with self._lock:
+            items, self._pending = self._pending, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        if not items:
+            return 0
+
+        try:
+            self.write(items)
+        except Exception as ex:
+            logger.error(
+                f"Error writing {len(items)} buffered item(s) in {type(self).__name__}: {str(ex)}",
+                exc_info=True,
+            )
+        return len(items)
+
+    def write(self, items):
+        raise NotImplementedError
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            # The timer thread has its own database connection
+            connection.close()
+
+    def _run_writer(self):
+        while True:
+            with self._lock:
+                while True:
+                    if len(self._pending) >= self.max_size:
+                        break
+                    if self._pending:
+                        remaining = self._oldest_at + self.max_delay - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._wake.wait(remaining)
+                    else:
+                        self._wake.wait()
+
+            try:
+                self.flush()
+            finally:
+                connection.close()
+
+
+class DiscoveryBuffer(WriteBuffer):
+    """Buffers CapsuleDiscovery rows from POST /capsules/<id>/discover"""
+
+    size_setting = "DISCOVERY_BUFFER_SIZE"
+    delay_setting = "DISCOVERY_BUFFER_SECONDS"
+
+    def write(self, items):
+        # Capsules deleted since the discovery was queued would fail the
+        # foreign key check for the whole batch, so drop them first
+        capsule_ids = {item.capsule_id for item in items}
+        existing = set(TimeCapsule.objects.filter(pk__in=capsule_ids).values_list("id", flat=True))
+        items = [item for item in items if item.capsule_id in existing]
+
+        CapsuleDiscovery.objects.bulk_create(items, ignore_conflicts=True)
+
+
+class StoryChoiceBuffer(WriteBuffer):
+    """Buffers (choice id, day) clicks from POST /storychoices/<id>/record
+
+    Clicks are summed per choice and day, so a batch costs one upsert per
+    distinct pair rather than one row per click.
+    """
+
+    size_setting = "STORY_CHOICE_BUFFER_SIZE"
+    delay_setting = "STORY_CHOICE_BUFFER_SECONDS"
+
+    def write(self, items):
+        counts = Counter(items)
+        existing = set(
+            StoryChoice.objects.filter(pk__in={choice_id for choice_id, _ in counts}).values_list("id", flat=True)
+        )
+
+        with transaction.atomic():
+            for (choice_id, day), amount in counts.items():
+                if choice_id not in existing:
+                    continue
+                rows = StoryChoiceDay.objects.filter(choice_id=choice_id, day=day)
+                if rows.update(count=F("count") + amount):
+                    continue
+                # Create the row first so concurrent writers both increment it
+                StoryChoiceDay.objects.bulk_create([StoryChoiceDay(choice_id=choice_id, day=day)], ignore_conflicts=True)
+                rows.update(count=F("count") + amount)
+
+
+class _BatchTaken(Exception):
+    """Another writer committed part of a batch first"""
+
+
+class CommentBuffer(WriteBuffer):
+    """Write-behind writer for POST /discussioncomments with COMMENT_WRITE_BEHIND
+
+    The view stages every accepted comment as a QueuedComment row before it
+    answers 202, then adds the row id here to wake the writer. One writer
+    thread moves due rows into DiscussionComment, one transaction per batch.
+    Rows left by a crash or staged by another worker are picked up the same
+    way, and so is `ingest_queued_comments`.
+
+    A failed batch stays staged and is retried with backoff. Once a row has
+    failed COMMENT_INGEST_MAX_ATTEMPTS times, it is kept with failed_at set.
+    bulk_create sends no post_save, so a batch also does what the comment
+    receivers and the create view would have done per comment.
+    """
+
+    size_setting = "COMMENT_BUFFER_SIZE"
+    delay_setting = "COMMENT_BUFFER_SECONDS"
+    single_writer = True
+
+    def write(self, items):
+        self.drain()
+
+    def drain(self):
+        """Commit every staged comment that is due
+
+        Returns:
+            int -- Number of comments committed
+        """
+        committed = 0
+        while True:
+            due = QueuedComment.objects.filter(failed_at=None, retry_at__lte=timezone.now()).order_by("id")
+            batch = list(due[:max(self.max_size, 1)])
+            if not batch:
+                return committed
+
+            try:
+                self._commit(batch)
+            except _BatchTaken:
+                continue
+            except Exception as ex:
+                logger.error(
+                    f"Error committing {len(batch)} queued comment(s): {str(ex)}",
+                    exc_info=True,
+                )
+                self._retry_later(batch, ex)
+                return committed
+            committed += len(batch)
+
+    def _commit(self, batch):
+        comments = [
+            DiscussionComment(
+                thread_id=queued.thread_id,
+                author_id=queued.author_id,
+                content=queued.content,
+                ingest_key=queued.ingest_key,
+            )
+            for queued in batch
+        ]
+
+        with transaction.atomic():
+            # Claim the rows first. Rows already gone were committed by a
+            # writer in another process, or dropped with their thread.
+            claimed, _ = QueuedComment.objects.filter(pk__in=[queued.pk for queued in batch]).delete()
+            if claimed != len(batch):
+                raise _BatchTaken()
+
+            DiscussionComment.objects.bulk_create(comments)
+            by_thread = {}
+            for comment in comments:
+                by_thread.setdefault(comment.thread_id, []).append(comment.created_at)
+            for thread_id, created_ats in by_thread.items():
+                counters.adjust(DiscussionThread, thread_id, "comment_count", len(created_ats))
+                hotness.comments_added(thread_id, created_ats)
+
+        stats_cache.invalidate(*{comment.author_id for comment in comments})
+        for comment in comments:
+            comment_hub.publish(comment.thread_id, comment_hub.comment_event(comment))
+
+    def _retry_later(self, batch, ex):
+        """Count a failed attempt on every row of a batch and schedule the retry"""
+        now = timezone.now()
+        delay = None
+        for queued in batch:
+            queued.attempts += 1
+            queued.error = str(ex)
+            if queued.attempts >= settings.COMMENT_INGEST_MAX_ATTEMPTS:
+                queued.failed_at = now
+            else:
+                backoff = settings.COMMENT_INGEST_RETRY_SECONDS * 2 ** (queued.attempts - 1)
+                queued.retry_at = now + timedelta(seconds=backoff)
+                delay = backoff if delay is None else min(delay, backoff)
+
+        try:
+            QueuedComment.objects.bulk_update(batch, ["attempts", "retry_at", "failed_at", "error"])
+        except Exception as update_ex:
+            # The rows stay due as they were and are retried on the next wake
+            logger.error(f"Error recording failed comment batch: {str(update_ex)}", exc_info=True)
+            delay = settings.COMMENT_INGEST_RETRY_SECONDS
+
+        if delay is not None:
+            timer = threading.Timer(delay, self.add, (None,))
+            timer.daemon = True
+            timer.start()
+
+
+discoveries = DiscoveryBuffer()
+story_choices = StoryChoiceBuffer()
+comments = CommentBuffer()
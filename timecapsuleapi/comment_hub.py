@@ -0,0 +1,110 @@
+import asyncio
+import threading
+from django.conf import settings
+from django.core import signing
+
+# In-process publish/subscribe for new discussion comments. Subscribers are
+# SSE streams waiting on an asyncio queue in their own event loop; publishers
+# are synchronous views, so events are handed over with call_soon_threadsafe.
+# Readers connected to another process only see the comment on reconnect,
+# when the stream replays everything after their last event id.
+
+_lock = threading.Lock()
+_subscribers = {}
+
+
+class Subscription:
+    """One stream's queue of comment events for one thread"""
+
+    def __init__(self, thread_id, maxsize):
+        self.thread_id = thread_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def _deliver(self, event):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A reader this far behind reconnects and replays from the
+            # database instead of holding events in memory
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def get(self, timeout):
+        """Next event, None once the subscription overflowed
+
+        Raises:
+            asyncio.TimeoutError -- When nothing arrived within timeout seconds
+        """
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+def subscribe(thread_id, maxsize=100):
+    """Start receiving events published for a thread; call from async code"""
+    subscription = Subscription(thread_id, maxsize)
+    with _lock:
+        _subscribers.setdefault(thread_id, set()).add(subscription)
+    return subscription
+
+
+def unsubscribe(subscription):
+    with _lock:
+        subscribers = _subscribers.get(subscription.thread_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del _subscribers[subscription.thread_id]
+
+
+def publish(thread_id, event):
+    """Send an event to every stream subscribed to a thread, from any thread"""
+    with _lock:
+        subscribers = list(_subscribers.get(thread_id, ()))
+
+    for subscription in subscribers:
+        try:
+            subscription.loop.call_soon_threadsafe(subscription._deliver, event)
+        except RuntimeError:
+            # The stream's event loop has closed
+            unsubscribe(subscription)
+
+
+def comment_event(comment):
+    """Compact JSON-ready form of a comment pushed to streams"""
+    return {
+        "id": comment.id,
+        "thread": comment.thread_id,
+        "content": comment.content,
+        "author": comment.author_id,
+        "created_at": comment.created_at.isoformat(),
+    }
+
+
+# Stream tickets. EventSource cannot send an Authorization header, so
+# browsers open a stream with a ticket in the query string instead of their
+# API token. A ticket is signed, names one user and one thread, and expires
+# after COMMENT_STREAM_TICKET_SECONDS, so one that ends up in an access log
+# is of little use.
+
+_TICKET_SALT = "timecapsuleapi.comment_stream"
+
+
+def stream_ticket(user_id, thread_id):
+    """Signed ticket letting a user open the comment stream of one thread"""
+    return signing.dumps({"user": user_id, "thread": thread_id}, salt=_TICKET_SALT)
+
+
+def ticket_user_id(ticket, thread_id):
+    """The user a ticket was issued to, or None if it is invalid, expired or for another thread"""
+    try:
+        claims = signing.loads(ticket, salt=_TICKET_SALT, max_age=settings.COMMENT_STREAM_TICKET_SECONDS)
+    except signing.BadSignature:
+        return None
+    if not isinstance(claims, dict) or claims.get("thread") != thread_id:
+        return None
+    return claims.get("user")
@@ -0,0 +1,46 @@
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from timecapsuleapi.models import (
+    TimeCapsule, TimeCapsuleContent, DiscussionThread, DiscussionComment, UserProfile, Prediction
+)
+
+# (model holding the counter, counter field, counted model, foreign key on the counted model)
+COUNTERS = (
+    (TimeCapsule, "discussion_count", DiscussionThread, "capsule"),
+    (TimeCapsule, "content_count", TimeCapsuleContent, "capsule"),
+    (DiscussionThread, "comment_count", DiscussionComment, "thread"),
+    (UserProfile, "created_capsules_count", TimeCapsule, "creator"),
+    (UserProfile, "verified_predictions_count", Prediction, "verification_user"),
+)
+
+
+def adjust(model, pk, field, amount):
+    """Atomically add amount to a counter column on a single row"""
+    if pk is not None and amount:
+        model.objects.filter(pk=pk).update(**{field: F(field) + amount})
+
+
+def actual_count(counted_model, foreign_key):
+    """Correlated subquery counting the rows that point at the outer row"""
+    counted = (
+        counted_model.objects.filter(**{foreign_key: OuterRef("pk")})
+        .order_by()
+        .values(foreign_key)
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    return Coalesce(Subquery(counted), Value(0))
+
+
+def rebuild_counters():
+    """Recompute every counter column and fix the rows that drifted
+
+    Returns:
+        dict -- Number of repaired rows per "Model.field"
+    """
+    repaired = {}
+    for model, field, counted_model, foreign_key in COUNTERS:
+        actual = actual_count(counted_model, foreign_key)
+        rows = model.objects.exclude(**{field: actual}).update(**{field: actual})
+        repaired[f"{model.__name__}.{field}"] = rows
+    return repaired
@@ -0,0 +1,98 @@
+import math
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from timecapsuleapi.models import DiscussionComment, DiscussionThread
+
+# A thread's hotness is its number of comments, each weighted down by half
+# for every THREAD_HOTNESS_HALF_LIFE_HOURS of age. Every thread's weights
+# decay at the same rate, so instead of decaying to now the stored score is
+# log2 of the weights measured from the Unix epoch: a comment made n
+# half-lives after 1970 adds 2 ** n. Comparing scores compares the threads'
+# hotness at any moment, and nothing needs rewriting as time passes.
+# A thread without comments scores 0.
+
+
+def half_lives(created_at):
+    """A single comment's score: half-lives from the Unix epoch to created_at"""
+    return created_at.timestamp() / (settings.THREAD_HOTNESS_HALF_LIFE_HOURS * 3600)
+
+
+def combine(score, created_ats):
+    """Score after adding comments made at created_ats"""
+    for created_at in created_ats:
+        exponent = half_lives(created_at)
+        if not score:
+            score = exponent
+        else:
+            high, low = max(score, exponent), min(score, exponent)
+            score = high + math.log2(1 + 2 ** (low - high))
+    return score
+
+
+def comment_added(thread_id, created_at):
+    """Count a new comment towards its thread's activity"""
+    comments_added(thread_id, [created_at])
+
+
+def comments_added(thread_id, created_ats):
+    """Count several new comments of one thread with a single row update"""
+    with transaction.atomic():
+        thread = DiscussionThread.objects.select_for_update().filter(pk=thread_id).first()
+        if thread is None or not created_ats:
+            return
+
+        thread.hot_score = combine(thread.hot_score, created_ats)
+        thread.last_comment_at = max(thread.last_comment_at, *created_ats)
+        thread.save(update_fields=["hot_score", "last_comment_at", "updated_at"])
+
+
+def comment_removed(thread_id, created_at):
+    """Take a deleted or moved comment out of its thread's activity"""
+    with transaction.atomic():
+        thread = DiscussionThread.objects.select_for_update().filter(pk=thread_id).first()
+        if thread is None:
+            return
+
+        remaining = 1 - 2 ** (half_lives(created_at) - thread.hot_score) if thread.hot_score else 0
+        if remaining > 1e-6:
+            thread.hot_score += math.log2(remaining)
+        else:
+            # The comment carried (nearly) all of the weight; subtracting it
+            # would leave rounding error, so score what is left directly
+            thread.hot_score = combine(
+                0, DiscussionComment.objects.filter(thread_id=thread_id).values_list("created_at", flat=True)
+            )
+        if created_at >= thread.last_comment_at:
+            latest = DiscussionComment.objects.filter(thread_id=thread_id).aggregate(latest=Max("created_at"))
+            thread.last_comment_at = latest["latest"] or thread.created_at
+        thread.save(update_fields=["hot_score", "last_comment_at", "updated_at"])
+
+
+def rebuild(batch_size=500):
+    """Recompute last_comment_at and the hot score of every thread from its comments
+
+    Returns:
+        int -- Number of threads updated
+    """
+    now = timezone.now()
+    scores = {}
+    latest = {}
+    for thread_id, created_at in DiscussionComment.objects.values_list("thread", "created_at").iterator():
+        scores[thread_id] = combine(scores.get(thread_id, 0), [created_at])
+        latest[thread_id] = max(latest.get(thread_id, created_at), created_at)
+
+    threads = [
+        DiscussionThread(
+            pk=pk,
+            hot_score=scores.get(pk, 0),
+            last_comment_at=latest.get(pk, created_at),
+            updated_at=now,
+        )
+        for pk, created_at in DiscussionThread.objects.values_list("id", "created_at").iterator()
+    ]
+    DiscussionThread.objects.bulk_update(
+        threads, ["hot_score", "last_comment_at", "updated_at"], batch_size=batch_size
+    )
+    return len(threads)
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from timecapsuleapi import story_analysis, story_graph
+
+
+class Command(BaseCommand):
+    help = "Check story graphs for loops, unreachable nodes, dead ends and their longest path"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--content", type=int, action="append", dest="contents",
+                            help="Only analyze this capsule content id (can be repeated)")
+        parser.add_argument("--all", action="store_true",
+                            help="Also list stories without problems")
+
+    def handle(self, *args, **options):
+        graphs = story_graph.load_many(options["contents"])
+
+        invalid = 0
+        for capsule_content_id, graph in sorted(graphs.items()):
+            result = story_analysis.analyze(graph)
+            if result["valid"]:
+                if not options["all"]:
+                    continue
+            else:
+                invalid += 1
+
+            self.stdout.write(
+                f"capsule content {capsule_content_id}: {len(graph['nodes'])} node(s), "
+                f"{len(result['cycles'])} cycle(s), {len(result['traps'])} trap(s), "
+                f"{len(result['unreachable'])} unreachable, {len(result['dead_ends'])} dead end(s), "
+                f"{len(result['external_choices'])} external choice(s), "
+                f"longest path {len(result['longest_path'])}"
+            )
+
+        self.stdout.write(f"{invalid} of {len(graphs)} story graph(s) need attention")
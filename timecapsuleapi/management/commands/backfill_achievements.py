@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from timecapsuleapi import achievements, stats_cache
+from timecapsuleapi.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = "Award achievements to existing users from their capsule, thread and verification history"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, action="append", dest="users",
+                            help="Only backfill this user profile id (can be repeated)")
+
+    def handle(self, *args, **options):
+        profile_ids = options["users"] or list(UserProfile.objects.values_list("id", flat=True))
+
+        earned = achievements.backfill(profile_ids)
+        stats_cache.invalidate(*profile_ids)
+
+        self.stdout.write(f"{earned} achievement(s) reached by {len(profile_ids)} user(s)")
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from timecapsuleapi import hotness
+
+
+class Command(BaseCommand):
+    help = (
+        "Hot scores are relative to the Unix epoch and no longer need decaying; "
+        "with --rebuild, recompute them from the comments"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rebuild", action="store_true",
+                            help="Recompute scores and last_comment_at from the comments")
+
+    def handle(self, *args, **options):
+        if not options["rebuild"]:
+            # Kept so existing schedules keep working
+            self.stdout.write("0 thread(s) updated; hot scores no longer decay")
+            return
+
+        with transaction.atomic():
+            updated = hotness.rebuild()
+
+        self.stdout.write(f"{updated} thread(s) updated")
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from timecapsuleapi import similarity
+
+
+class Command(BaseCommand):
+    help = "Recompute the near-duplicate signatures and clusters of every prediction"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            indexed, grouped = similarity.rebuild()
+
+        self.stdout.write(f"{indexed} prediction(s) indexed, {grouped} grouped as near-duplicates")
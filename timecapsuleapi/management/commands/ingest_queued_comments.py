@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from timecapsuleapi import buffers
+from timecapsuleapi.models import QueuedComment
+
+
+class Command(BaseCommand):
+    help = "Commit write-behind comments still staged, e.g. after a worker stopped before writing them"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--retry-failed", action="store_true",
+                            help="Queue comments that ran out of attempts again first")
+
+    def handle(self, *args, **options):
+        if options["retry_failed"]:
+            requeued = QueuedComment.objects.exclude(failed_at=None).update(
+                failed_at=None, attempts=0, retry_at=timezone.now(), error=""
+            )
+            self.stdout.write(f"{requeued} failed comment(s) queued again")
+
+        committed = buffers.comments.drain()
+        waiting = QueuedComment.objects.filter(failed_at=None).count()
+        failed = QueuedComment.objects.exclude(failed_at=None).count()
+        self.stdout.write(f"{committed} comment(s) committed, {waiting} waiting for a retry, {failed} failed")
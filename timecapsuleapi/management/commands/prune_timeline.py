@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from timecapsuleapi import timeline
+
+
+class Command(BaseCommand):
+    help = "Delete timeline entries for shared capsules whose access has expired"
+
+    def handle(self, *args, **options):
+        deleted = timeline.prune_expired()
+        self.stdout.write(f"{deleted} expired timeline entry(s) deleted")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from timecapsuleapi.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized counter columns and repair any drift"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            repaired = rebuild_counters()
+
+        for counter, rows in repaired.items():
+            self.stdout.write(f"{counter}: {rows} row(s) repaired")
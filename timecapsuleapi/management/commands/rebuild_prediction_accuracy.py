@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from timecapsuleapi import accuracy
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily prediction accuracy rollups per category and per verifier"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            category_rows, verifier_rows = accuracy.rebuild()
+
+        self.stdout.write(f"{category_rows} category day(s) and {verifier_rows} verifier day(s) written")
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from timecapsuleapi import rollups
+
+
+class Command(BaseCommand):
+    help = "Recount predictions per category and verification status and repair the rollup table"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            repaired = rollups.reconcile()
+
+        self.stdout.write(f"{repaired} prediction rollup row(s) repaired")
@@ -0,0 +1,28 @@
+from asgiref.sync import iscoroutinefunction
+from django.utils.decorators import sync_and_async_middleware
+from django.utils.functional import SimpleLazyObject
+from timecapsuleapi import authentication
+
+
+@sync_and_async_middleware
+def profile_middleware(get_response):
+    """Give every request a lazy request.profile for the authenticated user
+
+    DRF authenticates inside the view and sets the user on the underlying
+    request, so the profile is resolved on first use, from whichever
+    authentication class (or force_authenticate in tests) ran.
+    """
+
+    def attach(request):
+        request.profile = SimpleLazyObject(lambda: authentication.profile_for(getattr(request, "user", None)))
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            attach(request)
+            return await get_response(request)
+    else:
+        def middleware(request):
+            attach(request)
+            return get_response(request)
+
+    return middleware
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timecapsuleapi', '0003_alter_timecapsule_created_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='discussioncomment',
+            index=models.Index(fields=['created_at', 'id'], name='timecapsule_created_2d4636_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='discussionthread',
+            index=models.Index(fields=['created_at', 'id'], name='timecapsule_created_58a1eb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prediction',
+            index=models.Index(fields=['created_at', 'id'], name='timecapsule_created_23f0ee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='storychoice',
+            index=models.Index(fields=['created_at', 'id'], name='timecapsule_created_8dd949_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='storynode',
+            index=models.Index(fields=['created_at', 'id'], name='timecapsule_created_42da9c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timecapsule',
+            index=models.Index(fields=['created_at', 'id'], name='timecapsule_created_d00336_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timecapsule',
+            index=models.Index(fields=['creator', 'created_at', 'id'], name='timecapsule_creator_1cd15b_idx'),
+        ),
+    ]
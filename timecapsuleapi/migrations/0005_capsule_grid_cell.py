@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:05
+
+import math
+
+from django.db import migrations, models
+
+# Frozen copy of timecapsuleapi.models.capsule.grid_cell as of this migration
+GRID_CELL_SIZE = 0.01
+
+
+def grid_cell(location_x, location_y):
+    return (
+        math.floor(float(location_x) / GRID_CELL_SIZE),
+        math.floor(float(location_y) / GRID_CELL_SIZE),
+    )
+
+
+def populate_grid_cells(apps, schema_editor):
+    TimeCapsule = apps.get_model('timecapsuleapi', 'TimeCapsule')
+    capsules = list(TimeCapsule.objects.only('id', 'location_x', 'location_y'))
+    for capsule in capsules:
+        capsule.grid_x, capsule.grid_y = grid_cell(capsule.location_x, capsule.location_y)
+    TimeCapsule.objects.bulk_update(capsules, ['grid_x', 'grid_y'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timecapsuleapi', '0004_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timecapsule',
+            name='grid_x',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='timecapsule',
+            name='grid_y',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_grid_cells, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='timecapsule',
+            index=models.Index(fields=['grid_x', 'grid_y'], name='timecapsule_grid_x_feceec_idx'),
+        ),
+    ]
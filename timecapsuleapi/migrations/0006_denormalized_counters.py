@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:08
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    counters = (
+        ('TimeCapsule', 'discussion_count', 'DiscussionThread', 'capsule'),
+        ('TimeCapsule', 'content_count', 'TimeCapsuleContent', 'capsule'),
+        ('DiscussionThread', 'comment_count', 'DiscussionComment', 'thread'),
+        ('UserProfile', 'created_capsules_count', 'TimeCapsule', 'creator'),
+        ('UserProfile', 'verified_predictions_count', 'Prediction', 'verification_user'),
+    )
+    for model_name, field, counted_name, foreign_key in counters:
+        model = apps.get_model('timecapsuleapi', model_name)
+        counted = apps.get_model('timecapsuleapi', counted_name)
+        total = (
+            counted.objects.filter(**{foreign_key: OuterRef('pk')})
+            .order_by()
+            .values(foreign_key)
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        model.objects.update(**{field: Coalesce(Subquery(total), Value(0))})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timecapsuleapi', '0005_capsule_grid_cell'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='discussionthread',
+            name='comment_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='timecapsule',
+            name='content_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='timecapsule',
+            name='discussion_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='created_capsules_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='verified_predictions_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
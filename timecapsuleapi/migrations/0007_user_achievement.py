@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timecapsuleapi', '0006_denormalized_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserAchievement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=50)),
+                ('date_earned', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='achievements', to='timecapsuleapi.userprofile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'date_earned'], name='timecapsule_user_id_068e12_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'key'), name='unique_user_achievement')],
+            },
+        ),
+    ]
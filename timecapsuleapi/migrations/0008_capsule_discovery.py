@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:11
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timecapsuleapi', '0007_user_achievement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CapsuleDiscovery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('discovered_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('capsule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='discoveries', to='timecapsuleapi.timecapsule')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='discoveries', to='timecapsuleapi.userprofile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'discovered_at', 'id'], name='timecapsule_user_id_c10590_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'capsule'), name='unique_capsule_discovery')],
+            },
+        ),
+    ]
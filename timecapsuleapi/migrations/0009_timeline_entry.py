@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:12
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def populate_timeline(apps, schema_editor):
+    TimeCapsule = apps.get_model('timecapsuleapi', 'TimeCapsule')
+    AccessControl = apps.get_model('timecapsuleapi', 'AccessControl')
+    TimelineEntry = apps.get_model('timecapsuleapi', 'TimelineEntry')
+
+    entries = [
+        TimelineEntry(user_id=creator_id, capsule_id=capsule_id, created_at=created_at)
+        for capsule_id, creator_id, created_at
+        in TimeCapsule.objects.values_list('id', 'creator_id', 'created_at')
+    ]
+    entries += [
+        TimelineEntry(
+            user_id=grant.user_id, capsule_id=grant.capsule_id, access_control_id=grant.id,
+            expires_at=grant.expires_at, created_at=grant.capsule.created_at,
+        )
+        # Longest-lasting grant first, so it is the one the entry keeps
+        for grant in AccessControl.objects.select_related('capsule').order_by(
+            models.F('expires_at').desc(nulls_first=True), 'id'
+        )
+    ]
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timecapsuleapi', '0008_capsule_discovery'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('access_control', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='timecapsuleapi.accesscontrol')),
+                ('capsule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='timecapsuleapi.timecapsule')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='timecapsuleapi.userprofile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'created_at', 'id'], name='timecapsule_user_id_7a5a25_idx'), models.Index(fields=['expires_at'], name='timecapsule_expires_9f9403_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'capsule'), name='unique_timeline_entry')],
+            },
+        ),
+        migrations.RunPython(populate_timeline, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_rollups(apps, schema_editor):
+    Prediction = apps.get_model('timecapsuleapi', 'Prediction')
+    PredictionRollup = apps.get_model('timecapsuleapi', 'PredictionRollup')
+
+    totals = {}
+    rows = (
+        Prediction.objects.order_by()
+        .values_list(Coalesce('category', Value('')), 'verification_status')
+        .annotate(total=Count('id'))
+    )
+    for category, verification_status_id, total in rows:
+        key = (category, verification_status_id)
+        totals[key] = totals.get(key, 0) + total
+
+    PredictionRollup.objects.bulk_create([
+        PredictionRollup(category=category, verification_status_id=verification_status_id, count=total)
+        for (category, verification_status_id), total in totals.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timecapsuleapi', '0009_timeline_entry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PredictionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(blank=True, max_length=50)),
+                ('count', models.IntegerField(default=0)),
+                ('verification_status', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='prediction_rollups', to='timecapsuleapi.verificationstatus')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('category', 'verification_status'), name='unique_prediction_rollup')],
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timecapsuleapi', '0010_prediction_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PredictionCategoryDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('category', models.CharField(blank=True, max_length=50)),
+                ('verified', models.IntegerField(default=0)),
+                ('disproved', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='timecapsule_day_ad73d5_idx')],
+                'constraints': [models.UniqueConstraint(fields=('category', 'day'), name='unique_prediction_category_day')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PredictionVerifierDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('verified', models.IntegerField(default=0)),
+                ('disproved', models.IntegerField(default=0)),
+                ('verification_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='verification_days', to='timecapsuleapi.userprofile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='timecapsule_day_4972fd_idx')],
+                'constraints': [models.UniqueConstraint(fields=('verification_user', 'day'), name='unique_prediction_verifier_day')],
+            },
+        ),
+    ]
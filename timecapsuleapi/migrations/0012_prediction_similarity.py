@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timecapsuleapi', '0011_prediction_accuracy_days'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prediction',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='timecapsuleapi.prediction'),
+        ),
+        migrations.AddField(
+            model_name='prediction',
+            name='text_signature',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='PredictionBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField()),
+                ('bucket', models.BigIntegerField()),
+                ('prediction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bands', to='timecapsuleapi.prediction')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['band', 'bucket'], name='timecapsule_band_0bd40d_idx')],
+                'constraints': [models.UniqueConstraint(fields=('prediction', 'band'), name='unique_prediction_band')],
+            },
+        ),
+    ]
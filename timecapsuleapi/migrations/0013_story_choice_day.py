@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timecapsuleapi', '0012_prediction_similarity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoryChoiceDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('choice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_counts', to='timecapsuleapi.storychoice')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('choice', 'day'), name='unique_story_choice_day')],
+            },
+        ),
+    ]
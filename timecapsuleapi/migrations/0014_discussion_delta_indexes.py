@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timecapsuleapi', '0013_story_choice_day'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='discussioncomment',
+            index=models.Index(fields=['thread', 'created_at', 'id'], name='timecapsule_thread__ef6824_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='discussionthread',
+            index=models.Index(fields=['capsule', 'created_at', 'id'], name='timecapsule_capsule_9dfc93_idx'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:25
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_activity(apps, schema_editor):
+    DiscussionThread = apps.get_model('timecapsuleapi', 'DiscussionThread')
+    DiscussionComment = apps.get_model('timecapsuleapi', 'DiscussionComment')
+
+    latest = (
+        DiscussionComment.objects.filter(thread=OuterRef('pk'))
+        .order_by()
+        .values('thread')
+        .annotate(latest=Max('created_at'))
+        .values('latest')
+    )
+    DiscussionThread.objects.update(last_comment_at=Coalesce(Subquery(latest), F('created_at')))
+
+    now = django.utils.timezone.now()
+    half_life = settings.THREAD_HOTNESS_HALF_LIFE_HOURS * 3600
+    scores = {}
+    for thread_id, created_at in DiscussionComment.objects.values_list('thread', 'created_at').iterator():
+        age = max((now - created_at).total_seconds(), 0)
+        scores[thread_id] = scores.get(thread_id, 0) + 0.5 ** (age / half_life)
+
+    DiscussionThread.objects.bulk_update(
+        [DiscussionThread(pk=pk, hot_score=score, hot_score_at=now) for pk, score in scores.items()],
+        ['hot_score', 'hot_score_at'],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timecapsuleapi', '0014_discussion_delta_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='discussionthread',
+            name='hot_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='discussionthread',
+            name='hot_score_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='discussionthread',
+            name='last_comment_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='discussionthread',
+            index=models.Index(fields=['hot_score', 'id'], name='timecapsule_hot_sco_8785fa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='discussionthread',
+            index=models.Index(fields=['last_comment_at', 'id'], name='timecapsule_last_co_27977c_idx'),
+        ),
+        migrations.RunPython(populate_activity, migrations.RunPython.noop),
+    ]
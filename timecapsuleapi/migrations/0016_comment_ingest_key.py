@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timecapsuleapi', '0015_thread_activity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='discussioncomment',
+            name='ingest_key',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timecapsuleapi', '0016_comment_ingest_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedComment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ingest_key', models.UUIDField(editable=False, unique=True)),
+                ('content', models.TextField()),
+                ('accepted_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attempts', models.IntegerField(default=0)),
+                ('retry_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('failed_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, default='')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='queued_comments', to='timecapsuleapi.userprofile')),
+                ('thread', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='queued_comments', to='timecapsuleapi.discussionthread')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['failed_at', 'retry_at', 'id'], name='timecapsule_failed__549a0d_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:40
+
+import math
+from django.conf import settings
+from django.db import migrations
+
+
+def epoch_scores(apps, schema_editor):
+    DiscussionThread = apps.get_model('timecapsuleapi', 'DiscussionThread')
+    DiscussionComment = apps.get_model('timecapsuleapi', 'DiscussionComment')
+
+    half_life = settings.THREAD_HOTNESS_HALF_LIFE_HOURS * 3600
+    scores = {}
+    for thread_id, created_at in DiscussionComment.objects.values_list('thread', 'created_at').iterator():
+        exponent = created_at.timestamp() / half_life
+        score = scores.get(thread_id)
+        if score is None:
+            scores[thread_id] = exponent
+        else:
+            high, low = max(score, exponent), min(score, exponent)
+            scores[thread_id] = high + math.log2(1 + 2 ** (low - high))
+
+    DiscussionThread.objects.update(hot_score=0)
+    DiscussionThread.objects.bulk_update(
+        [DiscussionThread(pk=pk, hot_score=score) for pk, score in scores.items()],
+        ['hot_score'],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timecapsuleapi', '0018_discussion_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(epoch_scores, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='discussionthread',
+            name='hot_score_at',
+        ),
+    ]
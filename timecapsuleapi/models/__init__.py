@@ -13,3 +13,12 @@ from .discussion_comment import DiscussionComment
 from .permission_level import PermissionLevel
 from .access_control import AccessControl
 from .location_zone import LocationZone
+from .user_achievement import UserAchievement
+from .capsule_discovery import CapsuleDiscovery
+from .timeline_entry import TimelineEntry
+from .prediction_rollup import PredictionRollup
+from .prediction_category_day import PredictionCategoryDay
+from .prediction_verifier_day import PredictionVerifierDay
+from .prediction_band import PredictionBand
+from .story_choice_day import StoryChoiceDay
+from .queued_comment import QueuedComment
@@ -1,5 +1,18 @@
+import math
 from django.db import models
 
+# Width of one spatial grid cell, in the same units as location_x/location_y
+GRID_CELL_SIZE = 0.01
+
+
+def grid_cell(location_x, location_y):
+    """Return the (grid_x, grid_y) cell that contains a point"""
+    return (
+        math.floor(float(location_x) / GRID_CELL_SIZE),
+        math.floor(float(location_y) / GRID_CELL_SIZE),
+    )
+
+
 class TimeCapsule(models.Model):
     creator = models.ForeignKey("UserProfile", on_delete=models.CASCADE, related_name="timecapsules")
     status = models.ForeignKey("CapsuleStatus", on_delete=models.CASCADE, related_name="timecapsules")
@@ -10,4 +23,27 @@ class TimeCapsule(models.Model):
     location_x = models.FloatField()
     location_y = models.FloatField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # Denormalized counters, maintained by the receivers in signals.py
+    discussion_count = models.IntegerField(default=0)
+    content_count = models.IntegerField(default=0)
+    # Denormalized grid cell of (location_x, location_y), kept in sync on save
+    grid_x = models.IntegerField(default=0, editable=False)
+    grid_y = models.IntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"]),
+            models.Index(fields=["creator", "created_at", "id"]),
+            models.Index(fields=["grid_x", "grid_y"]),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.update_grid_cell()
+        super().save(*args, **kwargs)
+
+    def update_grid_cell(self):
+        """Recompute the grid cell from the current location
 
+        Call this before bulk_create/bulk_update, which skip save()
+        """
+        self.grid_x, self.grid_y = grid_cell(self.location_x, self.location_y)
@@ -0,0 +1,16 @@
+from django.db import models
+from django.utils import timezone
+
+class CapsuleDiscovery(models.Model):
+    user = models.ForeignKey("UserProfile", on_delete=models.CASCADE, related_name="discoveries")
+    capsule = models.ForeignKey("TimeCapsule", on_delete=models.CASCADE, related_name="discoveries")
+    # Set when the discovery happens, not when the buffered row is written
+    discovered_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "capsule"], name="unique_capsule_discovery"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "discovered_at", "id"]),
+        ]
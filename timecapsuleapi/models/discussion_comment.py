@@ -4,4 +4,15 @@ class DiscussionComment(models.Model):
     thread = models.ForeignKey("DiscussionThread", on_delete=models.CASCADE, related_name="comments")
     content = models.TextField()
     author = models.ForeignKey("UserProfile", on_delete=models.CASCADE, related_name="discussion_comments")
-    created_at = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Part of the list ETag, so an edit invalidates clients' cached pages
+    updated_at = models.DateTimeField(auto_now=True)
+    # Handed out when the comment is accepted by the write-behind queue,
+    # before it has an id (see QueuedComment)
+    ingest_key = models.UUIDField(null=True, blank=True, unique=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"]),
+            models.Index(fields=["thread", "created_at", "id"]),
+        ]
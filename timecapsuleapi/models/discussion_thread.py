@@ -1,7 +1,25 @@
 from django.db import models
+from django.utils import timezone
 
 class DiscussionThread(models.Model):
     capsule = models.ForeignKey("TimeCapsule", on_delete=models.CASCADE, related_name="discussion_threads")
     title = models.CharField(max_length=255)
     created_by = models.ForeignKey("UserProfile", on_delete=models.CASCADE, related_name="discussion_threads")
-    created_at = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Part of the list ETag; hotness.py saves it with every activity change
+    updated_at = models.DateTimeField(auto_now=True)
+    # Denormalized counter, maintained by the receivers in signals.py
+    comment_count = models.IntegerField(default=0)
+    # Activity ranking, maintained by the comment views through
+    # timecapsuleapi/hotness.py. hot_score is relative to the Unix epoch, so
+    # scores stay comparable without being decayed to a common time.
+    last_comment_at = models.DateTimeField(default=timezone.now)
+    hot_score = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"]),
+            models.Index(fields=["capsule", "created_at", "id"]),
+            models.Index(fields=["hot_score", "id"]),
+            models.Index(fields=["last_comment_at", "id"]),
+        ]
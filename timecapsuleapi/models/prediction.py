@@ -7,4 +7,13 @@ class Prediction(models.Model):
     verification_status = models.ForeignKey("VerificationStatus", on_delete=models.CASCADE, related_name="predictions")
     verification_date = models.DateTimeField(null=True, blank=True)
     verification_user = models.ForeignKey("UserProfile", on_delete=models.SET_NULL, related_name="verified_predictions", null=True, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    created_at = models.DateTimeField(auto_now_add=True)
+    # MinHash of the normalized text and the oldest near-duplicate this
+    # prediction was grouped under, see timecapsuleapi/similarity.py
+    text_signature = models.JSONField(null=True, blank=True, editable=False)
+    duplicate_of = models.ForeignKey("self", on_delete=models.SET_NULL, related_name="duplicates", null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"]),
+        ]
@@ -0,0 +1,17 @@
+from django.db import models
+
+# Locality-sensitive hash buckets of a prediction's text signature, one row
+# per band. Predictions sharing any (band, bucket) are near-duplicate
+# candidates.
+class PredictionBand(models.Model):
+    prediction = models.ForeignKey("Prediction", on_delete=models.CASCADE, related_name="bands")
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["prediction", "band"], name="unique_prediction_band"),
+        ]
+        indexes = [
+            models.Index(fields=["band", "bucket"]),
+        ]
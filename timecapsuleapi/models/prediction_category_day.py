@@ -0,0 +1,18 @@
+from django.db import models
+
+# Verified and disproved predictions per category and day of verification,
+# kept up to date by the prediction write paths. Predictions without a
+# category are counted under category "".
+class PredictionCategoryDay(models.Model):
+    day = models.DateField()
+    category = models.CharField(max_length=50, blank=True)
+    verified = models.IntegerField(default=0)
+    disproved = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["category", "day"], name="unique_prediction_category_day"),
+        ]
+        indexes = [
+            models.Index(fields=["day"]),
+        ]
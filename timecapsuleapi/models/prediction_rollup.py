@@ -0,0 +1,13 @@
+from django.db import models
+
+# Number of predictions per (category, verification status), kept up to date
+# by the prediction write paths. Predictions without a category use "".
+class PredictionRollup(models.Model):
+    category = models.CharField(max_length=50, blank=True)
+    verification_status = models.ForeignKey("VerificationStatus", on_delete=models.CASCADE, related_name="prediction_rollups")
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["category", "verification_status"], name="unique_prediction_rollup"),
+        ]
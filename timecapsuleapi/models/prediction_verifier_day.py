@@ -0,0 +1,17 @@
+from django.db import models
+
+# Verified and disproved predictions per verifier and day of verification,
+# kept up to date by the prediction write paths
+class PredictionVerifierDay(models.Model):
+    day = models.DateField()
+    verification_user = models.ForeignKey("UserProfile", on_delete=models.CASCADE, related_name="verification_days")
+    verified = models.IntegerField(default=0)
+    disproved = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["verification_user", "day"], name="unique_prediction_verifier_day"),
+        ]
+        indexes = [
+            models.Index(fields=["day"]),
+        ]
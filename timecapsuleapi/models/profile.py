@@ -6,3 +6,6 @@ class UserProfile(models.Model):
     bio = models.TextField()
     location_x = models.FloatField()
     location_y = models.FloatField()
+    # Denormalized counters, maintained by the receivers in signals.py
+    created_capsules_count = models.IntegerField(default=0)
+    verified_predictions_count = models.IntegerField(default=0)
@@ -0,0 +1,23 @@
+from django.db import models
+from django.utils import timezone
+
+# A comment accepted by POST /discussioncomments with COMMENT_WRITE_BEHIND
+# and not turned into a DiscussionComment yet. Staging it here before the
+# 202 keeps it through crashes and makes it visible to every worker.
+class QueuedComment(models.Model):
+    ingest_key = models.UUIDField(unique=True, editable=False)
+    thread = models.ForeignKey("DiscussionThread", on_delete=models.CASCADE, related_name="queued_comments")
+    author = models.ForeignKey("UserProfile", on_delete=models.CASCADE, related_name="queued_comments")
+    content = models.TextField()
+    accepted_at = models.DateTimeField(default=timezone.now)
+    # Failed writes are retried with backoff from retry_at; after
+    # COMMENT_INGEST_MAX_ATTEMPTS the row is kept with failed_at and the error
+    attempts = models.IntegerField(default=0)
+    retry_at = models.DateTimeField(default=timezone.now)
+    failed_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["failed_at", "retry_at", "id"]),
+        ]
@@ -4,4 +4,9 @@ class StoryChoice(models.Model):
     node = models.ForeignKey("StoryNode", on_delete=models.CASCADE, related_name="choices")
     choice_text = models.TextField()
     next_node = models.ForeignKey("StoryNode", on_delete=models.CASCADE, related_name="incoming_choices")
-    created_at = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"]),
+        ]
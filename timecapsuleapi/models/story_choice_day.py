@@ -0,0 +1,13 @@
+from django.db import models
+
+# Number of times readers took a story choice per day, written in batches by
+# the story choice buffer (see timecapsuleapi/buffers.py)
+class StoryChoiceDay(models.Model):
+    choice = models.ForeignKey("StoryChoice", on_delete=models.CASCADE, related_name="daily_counts")
+    day = models.DateField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["choice", "day"], name="unique_story_choice_day"),
+        ]
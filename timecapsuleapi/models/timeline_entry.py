@@ -0,0 +1,22 @@
+from django.db import models
+from django.utils import timezone
+
+# One row per capsule on a user's timeline, written when the capsule is
+# created or shared with them so the timeline is read without joins
+class TimelineEntry(models.Model):
+    user = models.ForeignKey("UserProfile", on_delete=models.CASCADE, related_name="timeline_entries")
+    capsule = models.ForeignKey("TimeCapsule", on_delete=models.CASCADE, related_name="timeline_entries")
+    # The grant that put the capsule here, or None for the creator's own capsules
+    access_control = models.ForeignKey("AccessControl", on_delete=models.CASCADE, related_name="timeline_entries", null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    # Creation date of the capsule, whether it was created or shared
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "capsule"], name="unique_timeline_entry"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "created_at", "id"]),
+            models.Index(fields=["expires_at"]),
+        ]
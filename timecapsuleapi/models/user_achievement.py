@@ -0,0 +1,15 @@
+from django.db import models
+
+class UserAchievement(models.Model):
+    user = models.ForeignKey("UserProfile", on_delete=models.CASCADE, related_name="achievements")
+    # Key of the rule in timecapsuleapi/achievements.py that was met
+    key = models.CharField(max_length=50)
+    date_earned = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="unique_user_achievement"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "date_earned"]),
+        ]
@@ -0,0 +1,196 @@
+import base64
+import binascii
+import json
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class InvalidCursor(Exception):
+    """Raised when a client sends a cursor that cannot be decoded"""
+
+
+class InvalidDelta(Exception):
+    """Raised when a client sends an unusable after_id or since"""
+
+
+def created_after(queryset, request):
+    """Narrow a queryset to rows created after ?after_id= or ?since=
+
+    after_id is turned into a (created_at, id) position so the filter is a
+    range on the same indexes keyset pagination uses. A deleted after_id
+    falls back to comparing ids.
+
+    Only creation is tracked: rows edited or deleted after the position do
+    not show up in the delta. With nothing new, the page is simply empty;
+    see list_etag for revalidating a page without downloading it again.
+
+    Returns:
+        tuple -- The queryset, and whether a delta was asked for
+    """
+    after_id = request.query_params.get("after_id", None)
+    since = request.query_params.get("since", None)
+    if not after_id and not since:
+        return queryset, False
+
+    if after_id:
+        try:
+            after_id = int(after_id)
+        except ValueError:
+            raise InvalidDelta("after_id must be an integer")
+
+        position = queryset.model.objects.filter(pk=after_id).values_list("created_at", flat=True).first()
+        if position is None:
+            queryset = queryset.filter(id__gt=after_id)
+        else:
+            queryset = queryset.filter(created_at__gte=position).exclude(created_at=position, id__lte=after_id)
+
+    if since:
+        position = parse_datetime(since)
+        if position is None:
+            raise InvalidDelta("since must be an ISO 8601 datetime")
+        if timezone.is_naive(position):
+            position = timezone.make_aware(position)
+        queryset = queryset.filter(created_at__gt=position)
+
+    return queryset, True
+
+
+def list_etag(queryset, **aggregates):
+    """Weak ETag over a list's row count, newest id and latest updated_at
+
+    Creating, editing or deleting a row changes at least one of the three.
+    aggregates adds values such as denormalized counters that can change
+    without touching updated_at. Related rows nested in the response are
+    not covered.
+
+    Returns:
+        str -- The quoted ETag
+    """
+    summary = queryset.order_by().aggregate(
+        count=Count("id"), last_id=Max("id"), last_edit=Max("updated_at"), **aggregates
+    )
+    if summary["last_edit"] is not None:
+        summary["last_edit"] = summary["last_edit"].timestamp()
+    return 'W/"%s"' % "-".join(str(summary[key]) for key in sorted(summary))
+
+
+def not_modified(request, etag):
+    """304 response if the request's If-None-Match matches etag
+
+    Returns:
+        HttpResponseNotModified -- Or None when the page should be sent
+    """
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        response["ETag"] = etag
+    return response
+
+
+class KeysetPagination:
+    """Opaque cursor pagination over (created_at, id)
+
+    Every page is a single range query on an indexed (created_at, id) pair,
+    so page 1000 costs the same as page 1. Another non-null field can stand
+    in for created_at; parse turns its cursor value back into a field value.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+
+    def __init__(self, descending=True, field="created_at", parse=parse_datetime):
+        self.descending = descending
+        self.field = field
+        self.parse = parse
+        self.page_size = getattr(settings, "API_PAGE_SIZE", 50)
+        self.max_page_size = getattr(settings, "API_MAX_PAGE_SIZE", 200)
+        self.next_cursor = None
+        self.request = None
+
+    def paginate_queryset(self, queryset, request):
+        """Return one page of the queryset starting after the request cursor
+
+        Returns:
+            list -- Model instances for the current page
+        """
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        if self.descending:
+            queryset = queryset.order_by(f"-{self.field}", "-id")
+        else:
+            queryset = queryset.order_by(self.field, "id")
+
+        encoded = request.query_params.get(self.cursor_query_param, None)
+        if encoded:
+            position, pk = self.decode_cursor(encoded)
+            # Expressed as a range on the leading column so SQLite can walk
+            # the (created_at, id) index instead of evaluating an OR per row
+            if self.descending:
+                queryset = queryset.filter(**{f"{self.field}__lte": position}).exclude(
+                    **{self.field: position, "id__gte": pk}
+                )
+            else:
+                queryset = queryset.filter(**{f"{self.field}__gte": position}).exclude(
+                    **{self.field: position, "id__lte": pk}
+                )
+
+        # Fetch one extra row to find out whether there is a next page
+        page = list(queryset[:page_size + 1])
+        self.next_cursor = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            last = page[-1]
+            self.next_cursor = self.encode_cursor(getattr(last, self.field), last.pk)
+
+        return page
+
+    def get_paginated_response(self, data):
+        """Wrap serialized page data with the link to the next page
+
+        Returns:
+            Response -- JSON with next link and results
+        """
+        return Response({
+            "next": self.get_next_link(),
+            "results": data,
+        })
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def encode_cursor(self, position, pk):
+        if hasattr(position, "isoformat"):
+            position = position.isoformat()
+        raw = json.dumps([position, pk]).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii")
+
+    def decode_cursor(self, encoded):
+        try:
+            raw = base64.urlsafe_b64decode(encoded.encode("ascii"))
+            position, pk = json.loads(raw.decode("utf-8"))
+            position = self.parse(position)
+            pk = int(pk)
+        except (binascii.Error, UnicodeError, ValueError, TypeError):
+            raise InvalidCursor(encoded)
+
+        if position is None:
+            raise InvalidCursor(encoded)
+        return position, pk
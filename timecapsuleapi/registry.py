@@ -0,0 +1,90 @@
+import threading
+import time
+from django.conf import settings
+from timecapsuleapi.models import CapsuleStatus, CapsuleType, VerificationStatus, ContentType, PermissionLevel
+
+
+class LookupRegistry:
+    """Process-local cache of a small, nearly static lookup table
+
+    Rows are loaded once and kept in memory keyed by id and by name.
+    Saving or deleting a row clears the cache through the receivers in
+    signals.py, and LOOKUP_REGISTRY_TTL bounds how long another worker
+    process can keep serving its own stale copy.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self._lock = threading.Lock()
+        self._by_id = None
+        self._by_name = None
+        self._loaded_at = 0
+
+    def _load(self):
+        ttl = getattr(settings, "LOOKUP_REGISTRY_TTL", 300)
+        with self._lock:
+            if self._by_id is None or time.monotonic() - self._loaded_at > ttl:
+                rows = list(self.model.objects.order_by("id"))
+                self._by_id = {row.id: row for row in rows}
+                self._by_name = {row.name: row for row in rows}
+                self._loaded_at = time.monotonic()
+            return self._by_id, self._by_name
+
+    def invalidate(self, **kwargs):
+        """Drop the cached rows so the next lookup reloads them"""
+        with self._lock:
+            self._by_id = None
+            self._by_name = None
+
+    def get(self, pk):
+        """Look up a row by primary key
+
+        Raises:
+            DoesNotExist -- The model's own exception, like objects.get
+        """
+        by_id, _ = self._load()
+        try:
+            return by_id[int(pk)]
+        except (KeyError, TypeError, ValueError):
+            raise self.model.DoesNotExist(
+                f"{self.model.__name__} matching id {pk} does not exist"
+            ) from None
+
+    def get_by_name(self, name):
+        """Look up a row by its name
+
+        Raises:
+            DoesNotExist -- The model's own exception, like objects.get
+        """
+        _, by_name = self._load()
+        try:
+            return by_name[name]
+        except KeyError:
+            raise self.model.DoesNotExist(
+                f"{self.model.__name__} matching name {name!r} does not exist"
+            ) from None
+
+    def in_bulk(self, pks):
+        """Return a dict of the rows matching pks, like objects.in_bulk"""
+        by_id, _ = self._load()
+        return {pk: by_id[pk] for pk in pks if pk in by_id}
+
+    def all(self):
+        """Return every row ordered by id"""
+        by_id, _ = self._load()
+        return list(by_id.values())
+
+
+capsule_statuses = LookupRegistry(CapsuleStatus)
+capsule_types = LookupRegistry(CapsuleType)
+verification_statuses = LookupRegistry(VerificationStatus)
+content_types = LookupRegistry(ContentType)
+permission_levels = LookupRegistry(PermissionLevel)
+
+registries = (
+    capsule_statuses,
+    capsule_types,
+    verification_statuses,
+    content_types,
+    permission_levels,
+)
@@ -0,0 +1,71 @@
+from django.db.models import Count, F, Value
+from django.db.models.functions import Coalesce
+from timecapsuleapi.models import Prediction, PredictionRollup
+
+
+def adjust(category, verification_status_id, amount):
+    """Atomically add amount to the rollup row of one (category, status) pair"""
+    if not amount:
+        return
+
+    rollup = PredictionRollup.objects.filter(
+        category=category or "", verification_status_id=verification_status_id
+    )
+    if rollup.update(count=F("count") + amount):
+        return
+
+    # First prediction in this pair. Creating with ignore_conflicts and then
+    # incrementing keeps concurrent first writers from losing a count.
+    PredictionRollup.objects.bulk_create([
+        PredictionRollup(category=category or "", verification_status_id=verification_status_id, count=0)
+    ], ignore_conflicts=True)
+    rollup.update(count=F("count") + amount)
+
+
+def move(previous, current):
+    """Move one prediction from one (category, status) pair to another"""
+    if previous != current:
+        adjust(*previous, -1)
+        adjust(*current, 1)
+
+
+def actual_totals():
+    """Count predictions per (category, status) straight from the table
+
+    Returns:
+        dict -- Count per (category, verification_status_id)
+    """
+    totals = {}
+    rows = (
+        Prediction.objects.order_by()
+        .values_list(Coalesce("category", Value("")), "verification_status")
+        .annotate(total=Count("id"))
+    )
+    for category, verification_status_id, total in rows:
+        key = (category, verification_status_id)
+        totals[key] = totals.get(key, 0) + total
+    return totals
+
+
+def reconcile():
+    """Rewrite the rollup rows that drifted from the prediction table
+
+    Returns:
+        int -- Number of rollup rows repaired
+    """
+    totals = actual_totals()
+    repaired = 0
+
+    for rollup in PredictionRollup.objects.all():
+        total = totals.pop((rollup.category, rollup.verification_status_id), 0)
+        if rollup.count != total:
+            rollup.count = total
+            rollup.save(update_fields=["count"])
+            repaired += 1
+
+    # Pairs that have predictions but no rollup row yet
+    PredictionRollup.objects.bulk_create([
+        PredictionRollup(category=category, verification_status_id=verification_status_id, count=total)
+        for (category, verification_status_id), total in totals.items()
+    ])
+    return repaired + len(totals)
@@ -0,0 +1,169 @@
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from timecapsuleapi import (
+    accuracy, achievements, authentication, counters, rollups, similarity, stats_cache, story_graph, timeline
+)
+from timecapsuleapi.models import (
+    TimeCapsule, TimeCapsuleContent, DiscussionThread, DiscussionComment, UserProfile, Prediction,
+    AccessControl, StoryNode, StoryChoice
+)
+from timecapsuleapi.registry import registries
+
+
+# Keep the in-process lookup registries in step with their tables
+for registry in registries:
+    post_save.connect(registry.invalidate, sender=registry.model, weak=False)
+    post_delete.connect(registry.invalidate, sender=registry.model, weak=False)
+
+
+# Denormalized counters. Fixture loads (raw) carry their own counts and
+# QuerySet.update/bulk_create bypass these, so callers of those adjust the
+# counters themselves. `rebuild_counters` repairs any drift.
+
+@receiver(post_save, sender=TimeCapsule)
+def capsule_created(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        counters.adjust(UserProfile, instance.creator_id, "created_capsules_count", 1)
+        achievements.award(instance.creator_id, "capsules_created", instance.created_at)
+
+
+@receiver(post_delete, sender=TimeCapsule)
+def capsule_deleted(sender, instance, **kwargs):
+    counters.adjust(UserProfile, instance.creator_id, "created_capsules_count", -1)
+
+
+@receiver(post_save, sender=TimeCapsuleContent)
+def content_created(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        counters.adjust(TimeCapsule, instance.capsule_id, "content_count", 1)
+
+
+@receiver(post_delete, sender=TimeCapsuleContent)
+def content_deleted(sender, instance, **kwargs):
+    counters.adjust(TimeCapsule, instance.capsule_id, "content_count", -1)
+
+
+@receiver(post_save, sender=DiscussionThread)
+def thread_created(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        counters.adjust(TimeCapsule, instance.capsule_id, "discussion_count", 1)
+        achievements.award(instance.created_by_id, "discussions_started", instance.created_at)
+
+
+@receiver(post_delete, sender=DiscussionThread)
+def thread_deleted(sender, instance, **kwargs):
+    counters.adjust(TimeCapsule, instance.capsule_id, "discussion_count", -1)
+
+
+@receiver(post_save, sender=DiscussionComment)
+def comment_created(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        counters.adjust(DiscussionThread, instance.thread_id, "comment_count", 1)
+
+
+@receiver(post_delete, sender=DiscussionComment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.adjust(DiscussionThread, instance.thread_id, "comment_count", -1)
+
+
+@receiver(post_delete, sender=Prediction)
+def prediction_deleted(sender, instance, **kwargs):
+    counters.adjust(UserProfile, instance.verification_user_id, "verified_predictions_count", -1)
+    rollups.adjust(instance.category, instance.verification_status_id, -1)
+    accuracy.move(accuracy.prediction_contribution(instance), None)
+
+
+@receiver(pre_delete, sender=Prediction)
+def prediction_deleting(sender, instance, **kwargs):
+    # Keep the near-duplicate cluster together under a new representative
+    similarity.detach(instance)
+
+
+@receiver(post_save, sender=Prediction)
+def prediction_created(sender, instance, created, raw, **kwargs):
+    # Verification and category changes are moved between rollup rows by
+    # the views that make them, which know the previous values
+    if created and not raw:
+        rollups.adjust(instance.category, instance.verification_status_id, 1)
+        accuracy.move(None, accuracy.prediction_contribution(instance))
+
+
+# Per-user statistics cache. Any write that changes a number shown on
+# /usertimeline/statistics clears the affected user's entry.
+
+@receiver(post_save, sender=TimeCapsule)
+@receiver(post_delete, sender=TimeCapsule)
+def capsule_statistics_changed(sender, instance, **kwargs):
+    stats_cache.invalidate(instance.creator_id)
+
+
+@receiver(post_save, sender=DiscussionThread)
+@receiver(post_delete, sender=DiscussionThread)
+def thread_statistics_changed(sender, instance, **kwargs):
+    stats_cache.invalidate(instance.created_by_id)
+
+
+@receiver(post_save, sender=DiscussionComment)
+@receiver(post_delete, sender=DiscussionComment)
+def comment_statistics_changed(sender, instance, **kwargs):
+    stats_cache.invalidate(instance.author_id)
+
+
+@receiver(post_save, sender=Prediction)
+@receiver(post_delete, sender=Prediction)
+def prediction_statistics_changed(sender, instance, **kwargs):
+    stats_cache.invalidate(instance.verification_user_id)
+
+
+# Fan-out timeline. Entries of deleted capsules and grants go away through
+# the foreign key cascade.
+
+@receiver(post_save, sender=TimeCapsule)
+def capsule_added_to_timeline(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        timeline.add_created([instance])
+
+
+@receiver(post_save, sender=AccessControl)
+def access_control_saved(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        timeline.add_shared(instance)
+    else:
+        timeline.update_shared(instance)
+
+
+@receiver(post_delete, sender=AccessControl)
+def access_control_deleted(sender, instance, **kwargs):
+    timeline.remove_shared(instance)
+
+
+# Compiled story graphs. Views that move a node or choice to another story
+# also invalidate the story it left.
+
+@receiver(post_save, sender=StoryNode)
+@receiver(post_delete, sender=StoryNode)
+def story_node_changed(sender, instance, **kwargs):
+    story_graph.invalidate(instance.capsule_content_id)
+
+
+@receiver(post_save, sender=StoryChoice)
+@receiver(post_delete, sender=StoryChoice)
+def story_choice_changed(sender, instance, **kwargs):
+    if StoryChoice._meta.get_field("node").is_cached(instance):
+        capsule_content_id = instance.node.capsule_content_id
+    else:
+        capsule_content_id = (
+            StoryNode.objects.filter(pk=instance.node_id).values_list("capsule_content", flat=True).first()
+        )
+    story_graph.invalidate(capsule_content_id)
+
+
+# Cached profile ids behind request.profile
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def request_profile_changed(sender, instance, created=True, **kwargs):
+    if created:
+        authentication.invalidate(instance.user_id)
@@ -0,0 +1,177 @@
+import hashlib
+import random
+import re
+import zlib
+from collections import Counter
+from django.conf import settings
+from django.db.models import Count, Q
+from timecapsuleapi.models import Prediction, PredictionBand
+
+# 64 MinHash values split into 16 bands of 4. Two predictions share at least
+# one band bucket with probability 1 - (1 - s^4)^16: about 99% at a
+# similarity of 0.7 and 12% at 0.3.
+BANDS = 16
+ROWS = 4
+SHINGLE_SIZE = 4
+
+# Candidates compared per lookup, the ones sharing the most bands first
+MAX_CANDIDATES = 200
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240101)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(BANDS * ROWS)]
+_NOT_WORD = re.compile(r"[^\w]+")
+
+
+def shingles(text):
+    """Character shingles of the text with case, punctuation and spacing removed"""
+    normalized = _NOT_WORD.sub(" ", (text or "").lower()).strip()
+    if len(normalized) <= SHINGLE_SIZE:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+
+
+def signature(text):
+    """MinHash signature of a prediction text
+
+    Returns:
+        list -- BANDS * ROWS integers, or None for text without any words
+    """
+    hashes = [zlib.crc32(shingle.encode("utf-8")) for shingle in shingles(text)]
+    if not hashes:
+        return None
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def band_buckets(signature):
+    """(band, bucket) pairs of a signature for the PredictionBand index"""
+    if not signature:
+        return []
+
+    buckets = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS:(band + 1) * ROWS]
+        digest = hashlib.blake2b(repr(rows).encode("ascii"), digest_size=8).digest()
+        buckets.append((band, int.from_bytes(digest, "big", signed=True)))
+    return buckets
+
+
+def estimate(first, second):
+    """Estimated Jaccard similarity of the texts behind two signatures"""
+    if not first or not second:
+        return 0
+    return sum(1 for a, b in zip(first, second) if a == b) / len(first)
+
+
+def _best_match(text_signature, candidates):
+    """Cluster representative of the most similar candidate above the threshold
+
+    candidates are (id, signature, duplicate_of id) tuples.
+    """
+    threshold = settings.PREDICTION_SIMILARITY_THRESHOLD
+    best, best_score = None, threshold
+    for pk, candidate_signature, duplicate_of_id in candidates:
+        score = estimate(text_signature, candidate_signature)
+        if score >= best_score and (best is None or score > best_score or pk < best[0]):
+            best, best_score = (pk, duplicate_of_id), score
+
+    if best is None:
+        return None
+    pk, duplicate_of_id = best
+    return duplicate_of_id or pk
+
+
+def index(prediction):
+    """Store the signature and bands of a saved prediction and group it
+
+    The prediction joins the cluster of its closest near-duplicate, if any.
+    Clusters stay one level deep: duplicate_of always names a representative.
+
+    Returns:
+        int -- Id of the representative, or None
+    """
+    text_signature = signature(prediction.prediction_text)
+    buckets = band_buckets(text_signature)
+
+    representative_id = None
+    if buckets:
+        matches = Q()
+        for band, bucket in buckets:
+            matches |= Q(band=band, bucket=bucket)
+        candidate_ids = (
+            PredictionBand.objects.filter(matches)
+            .exclude(prediction_id=prediction.pk)
+            .values("prediction_id")
+            .annotate(shared=Count("id"))
+            .order_by("-shared", "prediction_id")
+            .values_list("prediction_id", flat=True)[:MAX_CANDIDATES]
+        )
+        candidates = (
+            Prediction.objects.filter(pk__in=list(candidate_ids))
+            .values_list("id", "text_signature", "duplicate_of")
+        )
+        representative_id = _best_match(text_signature, candidates)
+
+    prediction.text_signature = text_signature
+    prediction.duplicate_of_id = representative_id
+    prediction.save(update_fields=["text_signature", "duplicate_of"])
+
+    PredictionBand.objects.filter(prediction_id=prediction.pk).delete()
+    PredictionBand.objects.bulk_create(
+        [PredictionBand(prediction_id=prediction.pk, band=band, bucket=bucket) for band, bucket in buckets]
+    )
+    return representative_id
+
+
+def detach(prediction):
+    """Hand the cluster a prediction represents over to its oldest duplicate
+
+    Called before the prediction is deleted or its text is replaced.
+    """
+    successor = (
+        Prediction.objects.filter(duplicate_of_id=prediction.pk)
+        .order_by("id")
+        .values_list("id", flat=True)
+        .first()
+    )
+    if successor is None:
+        return
+
+    Prediction.objects.filter(duplicate_of_id=prediction.pk).exclude(pk=successor).update(duplicate_of_id=successor)
+    Prediction.objects.filter(pk=successor).update(duplicate_of_id=None)
+
+
+def rebuild():
+    """Recompute signatures, bands and clusters of every prediction, oldest first
+
+    Returns:
+        tuple -- Number of predictions indexed and number grouped as duplicates
+    """
+    seen = {}
+    indexed = {}
+    bands = []
+    for pk, text in Prediction.objects.order_by("id").values_list("id", "prediction_text").iterator():
+        text_signature = signature(text)
+        buckets = band_buckets(text_signature)
+
+        shared = Counter()
+        for key in buckets:
+            shared.update(seen.get(key, ()))
+        candidates = [
+            (candidate_id, *indexed[candidate_id])
+            for candidate_id, _ in sorted(shared.items(), key=lambda item: (-item[1], item[0]))[:MAX_CANDIDATES]
+        ]
+        indexed[pk] = (text_signature, _best_match(text_signature, candidates))
+
+        for key in buckets:
+            seen.setdefault(key, []).append(pk)
+        bands.extend(PredictionBand(prediction_id=pk, band=band, bucket=bucket) for band, bucket in buckets)
+
+    predictions = [
+        Prediction(pk=pk, text_signature=text_signature, duplicate_of_id=representative_id)
+        for pk, (text_signature, representative_id) in indexed.items()
+    ]
+    PredictionBand.objects.all().delete()
+    Prediction.objects.bulk_update(predictions, ["text_signature", "duplicate_of"], batch_size=500)
+    PredictionBand.objects.bulk_create(bands, batch_size=500)
+    return len(predictions), sum(1 for p in predictions if p.duplicate_of_id)
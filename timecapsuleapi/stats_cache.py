@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _key(profile_id):
+    return f"user-statistics:{profile_id}"
+
+
+def get(profile_id):
+    """Return the cached statistics for a user, or None"""
+    if not settings.USER_STATISTICS_CACHE_TTL:
+        return None
+    return cache.get(_key(profile_id))
+
+
+def store(profile_id, statistics):
+    """Cache the statistics for a user until a write invalidates them"""
+    if settings.USER_STATISTICS_CACHE_TTL:
+        cache.set(_key(profile_id), statistics, settings.USER_STATISTICS_CACHE_TTL)
+
+
+def invalidate(*profile_ids):
+    """Forget the cached statistics of every given user"""
+    keys = [_key(profile_id) for profile_id in profile_ids if profile_id is not None]
+    if keys:
+        cache.delete_many(keys)
@@ -0,0 +1,152 @@
+from collections import deque
+
+# Every pass below visits each node and choice a constant number of times,
+# so analysing a story is linear in its size. The input is a graph as
+# returned by story_graph.load() or story_graph.compiled().
+
+
+def analyze(graph):
+    """Find the structural problems of one story graph
+
+    Returns:
+        dict -- cycles (strongly connected components that can loop), traps
+        (cycles no choice leads out of), unreachable nodes, dead ends (nodes
+        without choices), external choices (leading into another story) and
+        the longest path from a root
+    """
+    node_ids = [node["id"] for node in graph["nodes"]]
+    known = set(node_ids)
+    edges = {pk: [] for pk in node_ids}
+    external = []
+    for choice in graph["choices"]:
+        if choice["next_node"] in known:
+            edges[choice["node"]].append(choice["next_node"])
+        else:
+            external.append(choice["id"])
+
+    roots = [node["id"] for node in graph["nodes"] if node["parent_node"] is None]
+    components, component_of = strongly_connected_components(node_ids, edges)
+
+    cycles = [
+        component for component in components
+        if len(component) > 1 or component[0] in edges[component[0]]
+    ]
+    traps = [
+        component for component in cycles
+        if all(component_of[target] == component_of[component[0]]
+               for pk in component for target in edges[pk])
+    ]
+
+    reachable = _reachable(roots, edges)
+    result = {
+        "capsule_content": graph["capsule_content"],
+        "cycles": cycles,
+        "traps": traps,
+        "unreachable": [pk for pk in node_ids if pk not in reachable],
+        "dead_ends": [pk for pk in node_ids if not edges[pk]],
+        "external_choices": external,
+        "longest_path": longest_path(roots, edges, components, component_of),
+    }
+    result["valid"] = not (traps or result["unreachable"] or external)
+    return result
+
+
+def strongly_connected_components(node_ids, edges):
+    """Tarjan's algorithm without recursion, so deep stories cannot overflow
+
+    Returns:
+        tuple -- Components in reverse topological order (every component
+        only leads to components listed before it), and the component
+        index of every node
+    """
+    index_of = {}
+    lowlink = {}
+    on_stack = set()
+    stack = []
+    components = []
+    component_of = {}
+
+    for start in node_ids:
+        if start in index_of:
+            continue
+        index_of[start] = lowlink[start] = len(index_of)
+        stack.append(start)
+        on_stack.add(start)
+        work = [(start, iter(edges[start]))]
+
+        while work:
+            pk, targets = work[-1]
+            advanced = False
+            for target in targets:
+                if target not in index_of:
+                    index_of[target] = lowlink[target] = len(index_of)
+                    stack.append(target)
+                    on_stack.add(target)
+                    work.append((target, iter(edges[target])))
+                    advanced = True
+                    break
+                if target in on_stack:
+                    lowlink[pk] = min(lowlink[pk], index_of[target])
+            if advanced:
+                continue
+
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[pk])
+
+            if lowlink[pk] == index_of[pk]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component_of[member] = len(components)
+                    component.append(member)
+                    if member == pk:
+                        break
+                components.append(sorted(component))
+
+    return components, component_of
+
+
+def longest_path(roots, edges, components, component_of):
+    """Longest chain of choices a reader can follow from a root without
+    revisiting a node, with every cycle counted as a single step
+
+    Returns:
+        list -- Node ids along the path, one per component
+    """
+    # Components come out of Tarjan in reverse topological order, so the
+    # best path out of every component is known before anything leading in
+    best = [1] * len(components)
+    following = [None] * len(components)
+    for position, component in enumerate(components):
+        for pk in component:
+            for target in edges[pk]:
+                target_component = component_of[target]
+                if target_component != position and best[target_component] + 1 > best[position]:
+                    best[position] = best[target_component] + 1
+                    following[position] = (pk, target)
+
+    starts = [component_of[pk] for pk in roots]
+    if not starts:
+        return []
+
+    position = max(starts, key=lambda start: best[start])
+    path = [min(roots, key=lambda pk: (component_of[pk] != position, pk))]
+    while following[position] is not None:
+        _, target = following[position]
+        path.append(target)
+        position = component_of[target]
+    return path
+
+
+def _reachable(roots, edges):
+    seen = set(roots)
+    queue = deque(roots)
+    while queue:
+        for target in edges[queue.popleft()]:
+            if target not in seen:
+                seen.add(target)
+                queue.append(target)
+    return seen
@@ -0,0 +1,125 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from timecapsuleapi.models import StoryChoice, StoryNode, TimeCapsuleContent
+
+# Compiled graphs are cached under the current version of their capsule
+# content. Writes bump the version once committed, so a graph compiled from
+# data older than the write is stored under a version nobody reads again.
+
+
+def load(capsule_content_id):
+    """Every node and choice of one story as plain ids, in two queries
+
+    Returns:
+        dict -- nodes and choices ordered by id
+    """
+    return load_many([capsule_content_id])[capsule_content_id]
+
+
+def load_many(capsule_content_ids=None):
+    """Every node and choice of many stories, still in two queries
+
+    Choices are filed under the story of the node they start from. Leaving
+    capsule_content_ids out loads every story that has nodes.
+
+    Returns:
+        dict -- Graphs as returned by load(), by capsule content id
+    """
+    nodes = StoryNode.objects.order_by("id")
+    choices = StoryChoice.objects.order_by("id")
+    graphs = {}
+    if capsule_content_ids is not None:
+        nodes = nodes.filter(capsule_content_id__in=capsule_content_ids)
+        choices = choices.filter(node__capsule_content_id__in=capsule_content_ids)
+        graphs = {pk: _empty(pk) for pk in capsule_content_ids}
+
+    for pk, capsule_content_id, parent_node_id, content in nodes.values_list(
+        "id", "capsule_content", "parent_node", "content"
+    ):
+        graph = graphs.get(capsule_content_id)
+        if graph is None:
+            graph = graphs[capsule_content_id] = _empty(capsule_content_id)
+        graph["nodes"].append({"id": pk, "parent_node": parent_node_id, "content": content})
+
+    for pk, capsule_content_id, node_id, next_node_id, choice_text in choices.values_list(
+        "id", "node__capsule_content", "node", "next_node", "choice_text"
+    ):
+        graphs[capsule_content_id]["choices"].append(
+            {"id": pk, "node": node_id, "next_node": next_node_id, "choice_text": choice_text}
+        )
+
+    return graphs
+
+
+def _empty(capsule_content_id):
+    return {"capsule_content": capsule_content_id, "nodes": [], "choices": []}
+
+
+def compile_graph(capsule_content_id):
+    """Load a story and precompute the sets readers navigate by
+
+    Roots are nodes without a parent node, leaves are nodes without choices.
+
+    Returns:
+        dict -- The loaded graph plus roots and leaves, or None when the
+        capsule content does not exist
+    """
+    graph = load(capsule_content_id)
+    if not graph["nodes"] and not TimeCapsuleContent.objects.filter(pk=capsule_content_id).exists():
+        return None
+
+    with_choices = {choice["node"] for choice in graph["choices"]}
+    graph["roots"] = [node["id"] for node in graph["nodes"] if node["parent_node"] is None]
+    graph["leaves"] = [node["id"] for node in graph["nodes"] if node["id"] not in with_choices]
+    return graph
+
+
+def compiled(capsule_content_id):
+    """The compiled graph of a story, from the cache when it is current
+
+    Returns:
+        dict -- See compile_graph(), or None when the capsule content does not exist
+    """
+    key = f"story-graph:{capsule_content_id}:{version(capsule_content_id)}"
+    graph = cache.get(key)
+    if graph is None:
+        graph = compile_graph(capsule_content_id)
+        if graph is not None:
+            cache.set(key, graph, settings.STORY_GRAPH_CACHE_TTL)
+    return graph
+
+
+def _version_key(capsule_content_id):
+    return f"story-graph-version:{capsule_content_id}"
+
+
+def version(capsule_content_id):
+    """Current cache version of a story
+
+    A version evicted from the cache restarts from the clock, above every
+    version handed out before, so stale entries are never read again.
+    """
+    key = _version_key(capsule_content_id)
+    current = cache.get(key)
+    if current is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        current = cache.get(key)
+    return current
+
+
+def invalidate(*capsule_content_ids):
+    """Bump the version of every given story once the transaction commits"""
+    keys = {_version_key(pk) for pk in capsule_content_ids if pk is not None}
+
+    def bump():
+        for key in keys:
+            try:
+                cache.incr(key)
+            except ValueError:
+                # Not cached, the next reader starts a fresh version
+                pass
+
+    if keys:
+        transaction.on_commit(bump)
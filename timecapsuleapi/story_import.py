@@ -0,0 +1,146 @@
+from django.db import transaction
+from timecapsuleapi import story_graph
+from timecapsuleapi.models import StoryChoice, StoryNode
+
+
+class InvalidStory(Exception):
+    """Raised with every problem found in an import document"""
+
+    def __init__(self, errors):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+
+def _is_reference(value):
+    """Whether a value can be a temporary id: a string or an integer"""
+    return isinstance(value, (str, int)) and not isinstance(value, bool)
+
+
+def _temporary_ids(items, kind, errors):
+    """Index items by their temporary id, reporting malformed ones"""
+    by_id = {}
+    for position, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append(f"{kind}[{position}] is not an object")
+            continue
+        temporary_id = item.get("id")
+        if not _is_reference(temporary_id):
+            errors.append(f"{kind}[{position}] needs a string or integer id")
+        elif temporary_id in by_id:
+            errors.append(f"{kind}[{position}] repeats id {temporary_id!r}")
+        else:
+            by_id[temporary_id] = item
+    return by_id
+
+
+def _levels(nodes, errors):
+    """Group node temporary ids so every parent sits in an earlier level
+
+    Nodes on a parent_node loop never reach a level and are reported.
+    """
+    children = {}
+    level = []
+    for temporary_id, node in nodes.items():
+        parent = node.get("parent_node")
+        if parent is None:
+            level.append(temporary_id)
+        else:
+            children.setdefault(parent, []).append(temporary_id)
+
+    levels = []
+    placed = set()
+    while level:
+        levels.append(level)
+        placed.update(level)
+        level = [child for parent in level for child in children.get(parent, ())]
+
+    if len(placed) < len(nodes):
+        looping = sorted(str(pk) for pk in nodes if pk not in placed)
+        errors.append(f"nodes {', '.join(looping)} form a parent_node loop")
+    return levels
+
+
+def plan(document):
+    """Validate an import document and work out the insert order
+
+    Returns:
+        tuple -- Node levels (lists of temporary ids, parents first), nodes
+        and choices by temporary id
+
+    Raises:
+        InvalidStory -- With every problem found
+    """
+    errors = []
+    if not isinstance(document.get("nodes"), list) or not document["nodes"]:
+        raise InvalidStory(["nodes must be a non-empty array"])
+    if not isinstance(document.get("choices", []), list):
+        raise InvalidStory(["choices must be an array"])
+
+    nodes = _temporary_ids(document["nodes"], "nodes", errors)
+    choices = _temporary_ids(document.get("choices", []), "choices", errors)
+
+    for temporary_id, node in nodes.items():
+        if not isinstance(node.get("content"), str):
+            errors.append(f"node {temporary_id!r} needs content")
+        parent = node.get("parent_node")
+        if parent is not None and not _is_reference(parent):
+            errors.append(f"node {temporary_id!r} needs a string or integer parent_node")
+        elif parent is not None and parent not in nodes:
+            errors.append(f"node {temporary_id!r} has unknown parent_node {parent!r}")
+
+    for temporary_id, choice in choices.items():
+        if not isinstance(choice.get("choice_text"), str):
+            errors.append(f"choice {temporary_id!r} needs choice_text")
+        for field in ("node", "next_node"):
+            if not _is_reference(choice.get(field)):
+                errors.append(f"choice {temporary_id!r} needs a string or integer {field}")
+            elif choice.get(field) not in nodes:
+                errors.append(f"choice {temporary_id!r} has unknown {field} {choice.get(field)!r}")
+
+    if errors:
+        raise InvalidStory(errors)
+
+    levels = _levels(nodes, errors)
+    if errors:
+        raise InvalidStory(errors)
+    return levels, nodes, choices
+
+
+def import_story(capsule_content, document):
+    """Create every node and choice of a validated document in one transaction
+
+    Nodes are inserted one bulk_create per tree level so parents have their
+    ids before their children, choices in a single bulk_create at the end.
+
+    Returns:
+        tuple -- Database ids of nodes and of choices, by temporary id
+    """
+    levels, nodes, choices = plan(document)
+
+    node_ids = {}
+    with transaction.atomic():
+        for level in levels:
+            created = StoryNode.objects.bulk_create([
+                StoryNode(
+                    capsule_content=capsule_content,
+                    parent_node_id=node_ids.get(nodes[temporary_id].get("parent_node")),
+                    content=nodes[temporary_id]["content"],
+                )
+                for temporary_id in level
+            ])
+            node_ids.update((temporary_id, node.id) for temporary_id, node in zip(level, created))
+
+        created = StoryChoice.objects.bulk_create([
+            StoryChoice(
+                node_id=node_ids[choice["node"]],
+                next_node_id=node_ids[choice["next_node"]],
+                choice_text=choice["choice_text"],
+            )
+            for choice in choices.values()
+        ])
+        choice_ids = {temporary_id: choice.id for temporary_id, choice in zip(choices, created)}
+
+        # bulk_create does not send post_save
+        story_graph.invalidate(capsule_content.id)
+
+    return node_ids, choice_ids
@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.db import connection
+from timecapsuleapi.models import StoryNode
+
+# Both walks follow parent_node one level per recursion step, seeking on its
+# foreign key index. The depth column bounds the recursion, which also stops
+# a parent_node cycle written before cycles were rejected from looping.
+
+_ANCESTORS = """
+WITH RECURSIVE ancestry (id, parent_node_id, depth) AS (
+    SELECT id, parent_node_id, 0 FROM {table} WHERE id = %s
+    UNION ALL
+    SELECT node.id, node.parent_node_id, ancestry.depth + 1
+    FROM {table} node JOIN ancestry ON node.id = ancestry.parent_node_id
+    WHERE ancestry.depth < %s
+)
+SELECT node.*, ancestry.depth AS depth
+FROM {table} node JOIN ancestry ON node.id = ancestry.id
+ORDER BY ancestry.depth
+"""
+
+_SUBTREE = """
+WITH RECURSIVE subtree (id, depth) AS (
+    SELECT id, 0 FROM {table} WHERE id = %s
+    UNION ALL
+    SELECT node.id, subtree.depth + 1
+    FROM {table} node JOIN subtree ON node.parent_node_id = subtree.id
+    WHERE subtree.depth < %s
+)
+SELECT node.*, subtree.depth AS depth
+FROM {table} node JOIN subtree ON node.id = subtree.id
+ORDER BY subtree.depth, node.id
+"""
+
+
+def _walk(sql, node_id, max_depth):
+    table = connection.ops.quote_name(StoryNode._meta.db_table)
+    return list(StoryNode.objects.raw(sql.format(table=table), [node_id, max_depth]))
+
+
+def ancestors(node_id, max_depth):
+    """A node followed by its ancestors up to max_depth levels, nearest first
+
+    Every node carries a depth attribute, 0 for the node itself.
+
+    Returns:
+        list -- Empty when the node does not exist
+    """
+    return _walk(_ANCESTORS, node_id, max_depth)
+
+
+def subtree(node_id, max_depth):
+    """A node followed by its descendants up to max_depth levels, level by level
+
+    Every node carries a depth attribute, 0 for the node itself.
+
+    Returns:
+        list -- Empty when the node does not exist
+    """
+    return _walk(_SUBTREE, node_id, max_depth)
+
+
+def would_cycle(node_id, parent_node_id):
+    """Whether making parent_node_id the parent of node_id closes a loop"""
+    if parent_node_id is None:
+        return False
+    return any(node.id == node_id for node in ancestors(parent_node_id, settings.STORY_TREE_MAX_DEPTH))
@@ -1,3 +1,1808 @@
-from django.test import TestCase
+import asyncio
+import base64
+import json
+import math
+import random
+import time
+import uuid
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from timecapsuleapi import (
+    accuracy, achievements, buffers, comment_hub, hotness, registry, rollups, similarity,
+    story_analysis, story_graph, timeline
+)
+from timecapsuleapi.counters import rebuild_counters
+from timecapsuleapi.models import (
+    UserProfile, TimeCapsule, CapsuleStatus, ContentType, TimeCapsuleContent, Prediction,
+    VerificationStatus, StoryNode, DiscussionThread, DiscussionComment, CapsuleDiscovery,
+    AccessControl, PermissionLevel, TimelineEntry, PredictionRollup, PredictionCategoryDay,
+    PredictionVerifierDay, StoryChoice, StoryChoiceDay, QueuedComment,
+    UserAchievement
+)
 
-# Create your tests here.
+
+class CapsuleRetrieveTests(TestCase):
+    fixtures = ["statuses", "types"]
+
+    def setUp(self):
+        user = User.objects.create_user(username="reader@example.com", password="password")
+        self.profile = UserProfile.objects.create(user=user, bio="", location_x=0, location_y=0)
+        self.client = APIClient()
+        self.client.force_authenticate(user=user)
+
+        self.content_type = ContentType.objects.create(name="story")
+        self.pending = VerificationStatus.objects.create(name="pending")
+        self.capsule = TimeCapsule.objects.create(
+            creator=self.profile,
+            status_id=1,
+            type_id=1,
+            title="Capsule",
+            descriptions="Description",
+            opening_date=timezone.now(),
+            location_x=0,
+            location_y=0,
+        )
+
+    def add_children(self, count):
+        for _ in range(count):
+            content = TimeCapsuleContent.objects.create(
+                capsule=self.capsule, content_type=self.content_type, content="Content"
+            )
+            for _ in range(count):
+                Prediction.objects.create(
+                    capsule_content=content, prediction_text="Prediction", verification_status=self.pending
+                )
+                StoryNode.objects.create(capsule_content=content, content="Node")
+            thread = DiscussionThread.objects.create(capsule=self.capsule, title="Thread", created_by=self.profile)
+            for _ in range(count):
+                DiscussionComment.objects.create(thread=thread, content="Comment", author=self.profile)
+
+    def test_query_count_does_not_grow_with_children(self):
+        url = f"/capsules/{self.capsule.id}?include=contents,predictions,story_nodes,discussion_threads"
+
+        self.add_children(1)
+        with self.assertNumQueries(5):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        self.add_children(4)
+        with self.assertNumQueries(5):
+            response = self.client.get(url)
+
+        self.assertEqual(len(response.data["contents"]), 5)
+        self.assertEqual(len(response.data["contents"][1]["predictions"]), 4)
+        self.assertEqual(len(response.data["contents"][1]["story_nodes"]), 4)
+        self.assertEqual(response.data["contents"][1]["content_type"], "story")
+        self.assertEqual(len(response.data["discussion_threads"]), 5)
+        self.assertEqual(response.data["discussion_threads"][0]["comment_count"], 4)
+
+    def test_without_include_only_loads_the_capsule(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/capsules/{self.capsule.id}")
+        self.assertEqual(response.data["title"], "Capsule")
+        self.assertNotIn("contents", response.data)
+
+    def test_unknown_include_is_rejected(self):
+        response = self.client.get(f"/capsules/{self.capsule.id}?include=everything")
+        self.assertEqual(response.status_code, 400)
+
+    def test_missing_capsule_returns_404(self):
+        response = self.client.get("/capsules/999")
+        self.assertEqual(response.status_code, 404)
+
+
+class ApiTestCase(TestCase):
+    """One authenticated user with a capsule, and empty process-local caches"""
+
+    fixtures = ["statuses", "types"]
+
+    def setUp(self):
+        cache.clear()
+        for lookup in registry.registries:
+            lookup.invalidate()
+
+        self.user = User.objects.create_user(username="reader@example.com", password="password")
+        self.profile = UserProfile.objects.create(user=self.user, bio="", location_x=0, location_y=0)
+        self.client = self.create_client(self.user)
+        self.capsule = self.create_capsule()
+
+    def create_client(self, user):
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        return client
+
+    def create_profile(self, username):
+        user = User.objects.create_user(username=username, password="password")
+        return UserProfile.objects.create(user=user, bio="", location_x=0, location_y=0)
+
+    def create_capsule(self, creator=None):
+        return TimeCapsule.objects.create(
+            creator=creator or self.profile,
+            status_id=1,
+            type_id=1,
+            title="Capsule",
+            descriptions="Description",
+            opening_date=timezone.now(),
+            location_x=0,
+            location_y=0,
+        )
+
+
+class KeysetPaginationTests(ApiTestCase):
+    def walk(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(row["id"] for row in response.data["results"])
+            url = response.data["next"]
+        return seen
+
+    def test_pages_neither_repeat_nor_skip_tied_rows(self):
+        capsules = [self.capsule] + [self.create_capsule() for _ in range(6)]
+        TimeCapsule.objects.update(created_at=timezone.now())
+
+        seen = self.walk("/capsules?page_size=2")
+
+        self.assertEqual(seen, sorted((capsule.id for capsule in capsules), reverse=True))
+
+    def test_ascending_story_nodes_pages(self):
+        content_type = ContentType.objects.create(name="story")
+        content = TimeCapsuleContent.objects.create(capsule=self.capsule, content_type=content_type, content="Content")
+        nodes = [StoryNode.objects.create(capsule_content=content, content=f"Node {i}") for i in range(5)]
+        StoryNode.objects.filter(pk__in=[node.id for node in nodes[1:4]]).update(created_at=nodes[1].created_at)
+
+        seen = self.walk(f"/storynodes?capsule_content={content.id}&page_size=2")
+
+        self.assertEqual(seen, [node.id for node in nodes])
+
+    def test_page_size_is_clamped(self):
+        for _ in range(4):
+            self.create_capsule()
+
+        with self.settings(API_PAGE_SIZE=2, API_MAX_PAGE_SIZE=3):
+            self.assertEqual(len(self.client.get("/capsules?page_size=1000").data["results"]), 3)
+            self.assertEqual(len(self.client.get("/capsules?page_size=0").data["results"]), 2)
+            self.assertEqual(len(self.client.get("/capsules?page_size=many").data["results"]), 2)
+
+    def test_forged_cursors_are_rejected(self):
+        def encode(value):
+            return base64.urlsafe_b64encode(json.dumps(value).encode("utf-8")).decode("ascii")
+
+        cursors = (
+            "not base64!",
+            encode("just one value"),
+            encode(["yesterday", 1]),
+            encode([timezone.now().isoformat(), "x"]),
+        )
+        for cursor in cursors:
+            response = self.client.get("/capsules", {"cursor": cursor})
+            self.assertEqual(response.status_code, 400, cursor)
+
+
+class NearbyTests(ApiTestCase):
+    def place(self, x, y):
+        capsule = self.create_capsule()
+        capsule.location_x, capsule.location_y = x, y
+        capsule.save()
+        return capsule
+
+    def nearby(self, x, y, radius, **params):
+        response = self.client.get("/capsules/nearby", {"x": x, "y": y, "radius": radius, **params})
+        self.assertEqual(response.status_code, 200)
+        return [capsule["id"] for capsule in response.data]
+
+    def test_radius_cuts_the_corners_of_the_box(self):
+        edge = self.place(0.03, 0.04)
+        self.place(0.04, 0.04)
+        self.place(0.2, 0)
+
+        self.assertEqual(self.nearby(0, 0, 0.05), [self.capsule.id, edge.id])
+
+    def test_sorted_by_distance_then_id(self):
+        east = self.place(0.03, 0)
+        west = self.place(-0.03, 0)
+        near = self.place(0, 0.01)
+
+        response = self.client.get("/capsules/nearby", {"x": 0, "y": 0, "radius": 1, "limit": 3})
+
+        self.assertEqual([capsule["id"] for capsule in response.data], [self.capsule.id, near.id, east.id])
+        self.assertEqual([capsule["distance"] for capsule in response.data], [0, 0.01, 0.03])
+        self.assertEqual(self.nearby(0, 0, 1)[-1], west.id)
+
+    def test_grid_cells_across_negative_coordinates_and_boundaries(self):
+        below = self.place(-0.005, -0.005)
+        boundary = self.place(0.01, 0)
+        self.assertEqual((below.grid_x, below.grid_y), (-1, -1))
+        self.assertEqual((boundary.grid_x, boundary.grid_y), (1, 0))
+
+        self.assertEqual(self.nearby(-0.001, 0, 0.0111), [self.capsule.id, below.id, boundary.id])
+        self.assertEqual(self.nearby(-0.015, -0.015, 0.025), [below.id, self.capsule.id])
+
+    def test_wide_circles_scan_the_columns_as_one_range(self):
+        far = [self.place(x, 0) for x in (-0.9, -0.5, 0.4, 0.7)]
+        expected = self.nearby(0, 0, 1)
+        self.assertEqual(set(expected), {self.capsule.id, *(capsule.id for capsule in far)})
+
+        with mock.patch("timecapsuleapi.views.timecapsule_view.NEARBY_MAX_COLUMNS", 1):
+            self.assertEqual(self.nearby(0, 0, 1), expected)
+            self.assertEqual(self.nearby(0, 0, 0.6), expected[:3])
+
+    def test_invalid_input_is_rejected(self):
+        for params in (
+            {"x": "nan", "y": 0, "radius": 1},
+            {"x": 0, "y": "inf", "radius": 1},
+            {"x": 0, "y": 0, "radius": "1e308"},
+            {"x": "1e307", "y": 0, "radius": 1},
+            {"x": 0, "y": 0, "radius": 0},
+            {"x": 0, "y": 0, "radius": -1},
+            {"x": 0, "y": 0, "radius": 1, "limit": 0},
+            {"x": "here", "y": 0, "radius": 1},
+            {"y": 0, "radius": 1},
+        ):
+            response = self.client.get("/capsules/nearby", params)
+            self.assertEqual(response.status_code, 400, params)
+
+
+class CapsuleBatchTests(ApiTestCase):
+    def item(self, **fields):
+        return {
+            "status": 1,
+            "type": 1,
+            "title": "Imported",
+            "descriptions": "Description",
+            "opening_date": "2030-01-01T00:00:00Z",
+            "location_x": 0.5,
+            "location_y": -0.5,
+            **fields,
+        }
+
+    def batch(self, items):
+        return self.client.post("/capsules/batch", items, format="json")
+
+    def test_mixed_items_get_one_result_each(self):
+        response = self.batch([
+            self.item(),
+            self.item(id=self.capsule.id, title="Renamed", location_x=0.123),
+            self.item(status=999),
+            self.item(location_x="nan"),
+            self.item(location_y="inf"),
+            self.item(location_x=1e307),
+            self.item(id=999),
+            {"title": "Incomplete"},
+            "not a capsule",
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        results = response.data
+        self.assertEqual([result["result"] for result in results], ["created", "updated"] + ["error"] * 7)
+        self.assertEqual(results[1]["id"], self.capsule.id)
+        self.assertTrue(all(result["reason"] for result in results[2:]))
+
+        created = TimeCapsule.objects.get(pk=results[0]["id"])
+        self.assertEqual((created.creator_id, created.grid_x, created.grid_y), (self.profile.id, 50, -50))
+        self.capsule.refresh_from_db()
+        self.assertEqual((self.capsule.title, self.capsule.grid_x), ("Renamed", 12))
+        self.assertEqual(TimeCapsule.objects.count(), 2)
+
+    def test_batch_is_written_in_one_transaction(self):
+        with mock.patch.object(type(TimeCapsule.objects), "bulk_update", side_effect=RuntimeError("disk full")), \
+                self.assertLogs("timecapsuleapi.views.timecapsule_view", "ERROR"):
+            response = self.batch([self.item(), self.item(id=self.capsule.id, title="Renamed")])
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(TimeCapsule.objects.count(), 1)
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.created_capsules_count, 1)
+        self.assertEqual(TimelineEntry.objects.count(), 1)
+
+    def test_created_capsules_update_counters_and_timeline(self):
+        response = self.batch([self.item(title=f"Imported {n}") for n in range(5)])
+
+        ids = [result["id"] for result in response.data]
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.created_capsules_count, 6)
+        self.assertEqual(set(rebuild_counters().values()), {0})
+        timeline_ids = TimelineEntry.objects.filter(user=self.profile).values_list("capsule_id", flat=True)
+        self.assertTrue(set(ids) <= set(timeline_ids))
+        self.assertIn("capsule_enthusiast", UserAchievement.objects.filter(user=self.profile).values_list("key", flat=True))
+
+    def test_queries_do_not_grow_with_the_batch(self):
+        self.batch([self.item()])
+
+        with CaptureQueriesContext(connection) as small:
+            self.batch([self.item(), self.item(id=self.capsule.id)])
+        with CaptureQueriesContext(connection) as large:
+            self.batch([self.item() for _ in range(50)] + [self.item(id=self.capsule.id)])
+
+        self.assertEqual(len(large), len(small))
+
+
+class LookupRegistryTests(ApiTestCase):
+    def test_lookups_are_served_from_memory(self):
+        draft = registry.capsule_statuses.get(1)
+
+        with self.assertNumQueries(0):
+            self.assertIs(registry.capsule_statuses.get("1"), draft)
+            self.assertIs(registry.capsule_statuses.get_by_name(draft.name), draft)
+            self.assertEqual(registry.capsule_statuses.in_bulk([1, 999]), {1: draft})
+            self.assertEqual(registry.capsule_statuses.all()[0], draft)
+
+    def test_unknown_rows_raise_does_not_exist(self):
+        for lookup in (
+            lambda: registry.capsule_statuses.get(999),
+            lambda: registry.capsule_statuses.get("draft"),
+            lambda: registry.capsule_statuses.get(None),
+            lambda: registry.capsule_statuses.get_by_name("Missing"),
+        ):
+            with self.assertRaises(CapsuleStatus.DoesNotExist):
+                lookup()
+
+    def test_saved_and_deleted_rows_are_seen_at_once(self):
+        registry.capsule_statuses.all()
+
+        sealed = CapsuleStatus.objects.create(name="Sealed")
+        self.assertEqual(registry.capsule_statuses.get_by_name("Sealed"), sealed)
+        capsule = {
+            "status": sealed.id,
+            "type": 1,
+            "title": "Sealed capsule",
+            "descriptions": "Description",
+            "opening_date": "2030-01-01T00:00:00Z",
+            "location_x": 0,
+            "location_y": 0,
+        }
+        response = self.client.put(f"/capsules/{self.capsule.id}", capsule, format="json")
+        self.assertEqual(response.status_code, 204)
+        self.capsule.refresh_from_db()
+        self.assertEqual(self.capsule.status_id, sealed.id)
+
+        self.capsule.delete()
+        sealed.delete()
+        with self.assertRaises(CapsuleStatus.DoesNotExist):
+            registry.capsule_statuses.get(sealed.id)
+        response = self.client.put(f"/capsules/{self.create_capsule().id}", capsule, format="json")
+        self.assertEqual(response.status_code, 404)
+
+    def test_writes_that_skip_signals_are_seen_after_the_ttl(self):
+        registry.capsule_statuses.get(1)
+        CapsuleStatus.objects.filter(pk=1).update(name="Renamed")
+        self.assertNotEqual(registry.capsule_statuses.get(1).name, "Renamed")
+
+        with self.settings(LOOKUP_REGISTRY_TTL=0):
+            self.assertEqual(registry.capsule_statuses.get(1).name, "Renamed")
+
+
+class CounterTests(ApiTestCase):
+    def test_counters_match_a_recount_after_writes(self):
+        content_type = ContentType.objects.create(name="story")
+        TimeCapsuleContent.objects.create(capsule=self.capsule, content_type=content_type, content="Content")
+        thread = DiscussionThread.objects.create(capsule=self.capsule, title="Thread", created_by=self.profile)
+        comments = [
+            DiscussionComment.objects.create(thread=thread, content="Comment", author=self.profile)
+            for _ in range(3)
+        ]
+        comments[0].delete()
+        self.create_capsule()
+
+        self.assertEqual(set(rebuild_counters().values()), {0})
+
+        thread.refresh_from_db()
+        self.capsule.refresh_from_db()
+        self.profile.refresh_from_db()
+        self.assertEqual(thread.comment_count, 2)
+        self.assertEqual(self.capsule.discussion_count, 1)
+        self.assertEqual(self.capsule.content_count, 1)
+        self.assertEqual(self.profile.created_capsules_count, 2)
+
+    def test_rebuild_repairs_drifted_counters(self):
+        thread = DiscussionThread.objects.create(capsule=self.capsule, title="Thread", created_by=self.profile)
+        DiscussionComment.objects.create(thread=thread, content="Comment", author=self.profile)
+        DiscussionThread.objects.filter(pk=thread.pk).update(comment_count=40)
+        TimeCapsule.objects.filter(pk=self.capsule.pk).update(discussion_count=0)
+
+        call_command("rebuild_counters", stdout=StringIO())
+
+        thread.refresh_from_db()
+        self.capsule.refresh_from_db()
+        self.assertEqual(thread.comment_count, 1)
+        self.assertEqual(self.capsule.discussion_count, 1)
+
+
+class StatisticsCacheTests(ApiTestCase):
+    def statistics(self):
+        response = self.client.get("/usertimeline/statistics")
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_statistics_are_served_from_the_cache(self):
+        first = self.statistics()
+
+        # Only the token lookup is left
+        with self.assertNumQueries(1):
+            self.assertEqual(self.statistics(), first)
+
+        with self.settings(USER_STATISTICS_CACHE_TTL=0), self.assertNumQueries(6):
+            self.assertEqual(self.statistics(), first)
+
+    def test_writes_invalidate_the_cached_statistics(self):
+        self.assertEqual(self.statistics()["total_created"], 1)
+
+        archived = self.create_capsule()
+        self.assertEqual(self.statistics()["total_created"], 2)
+
+        archived.status_id = 4
+        archived.save()
+        self.assertEqual(self.statistics()["status_stats"]["Archived"], 1)
+
+        response = self.client.post("/discussionthreads", {"capsule": self.capsule.id, "title": "Thread"}, format="json")
+        self.assertEqual(self.statistics()["total_discussions"], 1)
+
+        self.client.post("/discussioncomments", {"thread": response.data["id"], "content": "Comment"}, format="json")
+        self.assertEqual(self.statistics()["total_comments"], 1)
+
+        verified = VerificationStatus.objects.create(name="verified")
+        content_type = ContentType.objects.create(name="prediction")
+        content = TimeCapsuleContent.objects.create(capsule=self.capsule, content_type=content_type, content="Content")
+        prediction = Prediction.objects.create(
+            capsule_content=content, prediction_text="Prediction", verification_status=verified
+        )
+        self.client.post(f"/predictions/{prediction.id}/verify", {"verification_status": verified.id}, format="json")
+        statistics = self.statistics()
+        self.assertEqual(statistics["total_verified"], 1)
+        self.assertIn("Prediction Verifier", [achievement["name"] for achievement in statistics["achievements"]])
+
+        # Another verifier taking the prediction over clears both users
+        other = self.create_profile("other@example.com")
+        other_client = self.create_client(other.user)
+        other_client.get("/usertimeline/statistics")
+        other_client.post(f"/predictions/{prediction.id}/verify", {"verification_status": verified.id}, format="json")
+        self.assertEqual(self.statistics()["total_verified"], 0)
+        self.assertEqual(other_client.get("/usertimeline/statistics").data["total_verified"], 1)
+
+        with self.settings(USER_STATISTICS_CACHE_TTL=0):
+            uncached = self.statistics()
+        self.assertEqual(self.statistics(), uncached)
+
+
+class AchievementTests(ApiTestCase):
+    def ledger(self):
+        return dict(UserAchievement.objects.filter(user=self.profile).values_list("key", "date_earned"))
+
+    def test_backfill_matches_what_writes_awarded(self):
+        capsules = [self.capsule] + [self.create_capsule() for _ in range(5)]
+        thread = DiscussionThread.objects.create(capsule=self.capsule, title="Thread", created_by=self.profile)
+        verified = VerificationStatus.objects.create(name="verified")
+        content_type = ContentType.objects.create(name="prediction")
+        content = TimeCapsuleContent.objects.create(capsule=self.capsule, content_type=content_type, content="Content")
+        prediction = Prediction.objects.create(
+            capsule_content=content, prediction_text="Prediction", verification_status=verified
+        )
+        self.client.post(f"/predictions/{prediction.id}/verify", {"verification_status": verified.id}, format="json")
+        prediction.refresh_from_db()
+
+        awarded = self.ledger()
+        self.assertEqual(awarded, {
+            "capsule_creator": capsules[0].created_at,
+            "capsule_enthusiast": capsules[4].created_at,
+            "discussion_starter": thread.created_at,
+            "prediction_verifier": prediction.verification_date,
+        })
+
+        UserAchievement.objects.all().delete()
+        self.assertEqual(achievements.backfill([self.profile.id]), 4)
+        self.assertEqual(self.ledger(), awarded)
+
+    def test_backfill_dates_each_achievement_at_its_threshold(self):
+        start = timezone.now() - timedelta(days=30)
+        capsules = [self.capsule] + [self.create_capsule() for _ in range(10)]
+        for day, capsule in enumerate(reversed(capsules)):
+            TimeCapsule.objects.filter(pk=capsule.pk).update(created_at=start + timedelta(days=day))
+        UserAchievement.objects.all().delete()
+
+        call_command("backfill_achievements", "--user", str(self.profile.id), stdout=StringIO())
+
+        self.assertEqual(self.ledger(), {
+            "capsule_creator": start,
+            "capsule_enthusiast": start + timedelta(days=4),
+            "capsule_master": start + timedelta(days=9),
+        })
+
+    def test_backfill_and_award_are_idempotent(self):
+        for _ in range(4):
+            self.create_capsule()
+        UserAchievement.objects.filter(key="capsule_enthusiast").delete()
+        creator_date = self.ledger()["capsule_creator"]
+
+        achievements.backfill([self.profile.id])
+        achievements.backfill([self.profile.id])
+        achievements.award(self.profile.id, "capsules_created")
+
+        ledger = self.ledger()
+        self.assertEqual(UserAchievement.objects.count(), 2)
+        self.assertEqual(ledger["capsule_creator"], creator_date)
+        self.assertEqual(ledger["capsule_enthusiast"], TimeCapsule.objects.order_by("created_at")[4].created_at)
+
+
+@override_settings(DISCOVERY_BUFFER_SIZE=100, DISCOVERY_BUFFER_SECONDS=60)
+class DiscoveryBufferTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(buffers.discoveries.flush)
+
+    def discover(self, capsule):
+        response = self.client.post(f"/capsules/{capsule.id}/discover")
+        self.assertEqual(response.status_code, 202)
+
+    def test_discoveries_are_written_on_flush_once_per_capsule(self):
+        self.discover(self.capsule)
+        self.discover(self.capsule)
+        self.assertFalse(CapsuleDiscovery.objects.exists())
+
+        self.assertEqual(buffers.discoveries.flush(), 2)
+
+        response = self.client.get("/usertimeline/discovery_history")
+        self.assertEqual([entry["capsule"]["id"] for entry in response.data["results"]], [self.capsule.id])
+
+    def test_full_buffer_is_written_straight_away(self):
+        other = self.create_capsule()
+        with self.settings(DISCOVERY_BUFFER_SIZE=2):
+            self.discover(self.capsule)
+            self.discover(other)
+
+        self.assertEqual(CapsuleDiscovery.objects.filter(user=self.profile).count(), 2)
+        self.assertEqual(buffers.discoveries.pending(), [])
+
+    def test_discoveries_of_deleted_capsules_are_dropped(self):
+        other = self.create_capsule()
+        self.discover(self.capsule)
+        self.discover(other)
+        other.delete()
+
+        buffers.discoveries.flush()
+
+        self.assertEqual(
+            list(CapsuleDiscovery.objects.values_list("capsule_id", flat=True)), [self.capsule.id]
+        )
+
+    def test_unknown_capsule_is_not_queued(self):
+        response = self.client.post("/capsules/999/discover")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(buffers.discoveries.pending(), [])
+
+
+class TimelineGrantTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = self.create_profile("owner@example.com")
+        self.shared = self.create_capsule(creator=self.owner)
+        self.level = PermissionLevel.objects.create(name="viewer")
+        self.now = timezone.now()
+
+    def grant(self, hours=None):
+        expires_at = None if hours is None else self.now + timedelta(hours=hours)
+        return AccessControl.objects.create(
+            capsule=self.shared, user=self.profile, permission_level=self.level, expires_at=expires_at
+        )
+
+    def timeline_ids(self, hours_later=0):
+        with mock.patch("django.utils.timezone.now", return_value=self.now + timedelta(hours=hours_later)):
+            response = self.client.get("/usertimeline")
+        return [capsule["id"] for capsule in response.data["results"]]
+
+    def entry(self):
+        return TimelineEntry.objects.get(user=self.profile, capsule=self.shared)
+
+    def test_entry_follows_the_longest_grant(self):
+        self.grant(hours=1)
+        longer = self.grant(hours=72)
+        self.grant(hours=24)
+
+        self.assertEqual(self.entry().access_control_id, longer.id)
+        self.assertIn(self.shared.id, self.timeline_ids(hours_later=2))
+        self.assertNotIn(self.shared.id, self.timeline_ids(hours_later=73))
+
+    def test_prune_moves_expired_entries_to_a_remaining_grant(self):
+        shorter = self.grant(hours=1)
+        longer = self.grant(hours=72)
+        # Put the entry back on the short grant, as an older deployment left it
+        TimelineEntry.objects.filter(user=self.profile).exclude(access_control=None).update(
+            access_control=shorter, expires_at=shorter.expires_at
+        )
+
+        with mock.patch("django.utils.timezone.now", return_value=self.now + timedelta(hours=2)):
+            self.assertEqual(timeline.prune_expired(), 0)
+        self.assertEqual(self.entry().access_control_id, longer.id)
+
+        with mock.patch("django.utils.timezone.now", return_value=self.now + timedelta(hours=73)):
+            self.assertEqual(timeline.prune_expired(), 1)
+        self.assertFalse(TimelineEntry.objects.filter(user=self.profile, capsule=self.shared).exists())
+
+    def test_deleting_a_grant_falls_back_to_another(self):
+        forever = self.grant()
+        limited = self.grant(hours=5)
+        self.assertEqual(self.entry().access_control_id, forever.id)
+
+        forever.delete()
+        self.assertEqual(self.entry().access_control_id, limited.id)
+        limited.delete()
+        self.assertNotIn(self.shared.id, self.timeline_ids())
+
+    def test_shared_entries_are_dated_by_the_capsule(self):
+        self.grant(hours=5)
+        self.assertEqual(self.entry().created_at, self.shared.created_at)
+
+    def test_grant_on_own_capsule_keeps_the_creator_entry(self):
+        AccessControl.objects.create(
+            capsule=self.capsule, user=self.profile, permission_level=self.level,
+            expires_at=self.now + timedelta(hours=1),
+        )
+        entry = TimelineEntry.objects.get(user=self.profile, capsule=self.capsule)
+        self.assertIsNone(entry.access_control_id)
+        self.assertIsNone(entry.expires_at)
+
+
+class PredictionTestCase(ApiTestCase):
+    """ApiTestCase with verification statuses and a capsule content to predict on"""
+
+    def setUp(self):
+        super().setUp()
+        self.pending = VerificationStatus.objects.create(name="pending")
+        self.verified = VerificationStatus.objects.create(name="verified")
+        self.disproved = VerificationStatus.objects.create(name="disproved")
+        content_type = ContentType.objects.create(name="prediction")
+        self.content = TimeCapsuleContent.objects.create(
+            capsule=self.capsule, content_type=content_type, content="Content"
+        )
+
+    def predict(self, text, category=None):
+        data = {"capsule_content": self.content.id, "prediction_text": text}
+        if category is not None:
+            data["category"] = category
+        response = self.client.post("/predictions", data, format="json")
+        self.assertEqual(response.status_code, 201)
+        return response.data["id"]
+
+    def verify(self, pk, verification_status):
+        response = self.client.post(
+            f"/predictions/{pk}/verify", {"verification_status": verification_status.id}, format="json"
+        )
+        self.assertEqual(response.status_code, 204)
+
+
+class PredictionRollupTests(PredictionTestCase):
+    def stored_totals(self):
+        return {
+            (category, verification_status_id): count
+            for category, verification_status_id, count
+            in PredictionRollup.objects.values_list("category", "verification_status", "count")
+            if count
+        }
+
+    def test_rollups_match_a_recount_after_writes(self):
+        first = self.predict("Cars will fly", "tech")
+        second = self.predict("It will rain", "weather")
+        third = self.predict("Nobody reads this")
+        self.verify(first, self.verified)
+        self.verify(second, self.disproved)
+        self.client.put(
+            f"/predictions/{third}", {"prediction_text": "Somebody reads this", "category": "tech"}, format="json"
+        )
+        Prediction.objects.get(pk=second).delete()
+
+        self.assertEqual(self.stored_totals(), rollups.actual_totals())
+
+        response = self.client.get("/predictions/statistics")
+        self.assertEqual(response.data["verification_stats"], {"pending": 1, "verified": 1, "disproved": 0})
+        self.assertEqual(response.data["category_stats"], {"tech": 2})
+        self.assertEqual(response.data["accuracy_stats"]["accuracy_percentage"], 100)
+
+    def test_reconcile_repairs_drifted_rollups(self):
+        self.predict("Cars will fly", "tech")
+        PredictionRollup.objects.update(count=7)
+        PredictionRollup.objects.create(category="gone", verification_status=self.verified, count=3)
+
+        call_command("reconcile_prediction_rollups", stdout=StringIO())
+
+        self.assertEqual(self.stored_totals(), {("tech", self.pending.id): 1})
+
+
+class VerifyBulkTests(PredictionTestCase):
+    def test_verifies_found_ids_and_reports_missing_ones(self):
+        other = self.create_profile("other@example.com")
+        other_client = self.create_client(other.user)
+        ids = [self.predict(f"Prediction {n}", "tech") for n in range(3)]
+        other_client.post(f"/predictions/{ids[0]}/verify", {"verification_status": self.verified.id}, format="json")
+
+        response = self.client.post(
+            "/predictions/verify_bulk",
+            {"ids": ids + [999], "verification_status": self.disproved.id},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(response.data["updated"]), ids)
+        self.assertEqual(response.data["missing"], [999])
+        self.assertEqual(
+            Prediction.objects.filter(verification_status=self.disproved, verification_user=self.profile).count(), 3
+        )
+
+        self.assertEqual(set(rebuild_counters().values()), {0})
+        self.profile.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.profile.verified_predictions_count, 3)
+        self.assertEqual(other.verified_predictions_count, 0)
+        stored = {
+            (category, verification_status_id): count
+            for category, verification_status_id, count
+            in PredictionRollup.objects.values_list("category", "verification_status", "count")
+            if count
+        }
+        self.assertEqual(stored, rollups.actual_totals())
+
+    def test_rejects_malformed_bodies(self):
+        prediction = self.predict("Cars will fly")
+        bodies = (
+            [prediction],
+            {"ids": [], "verification_status": self.verified.id},
+            {"ids": ["one"], "verification_status": self.verified.id},
+            {"ids": [prediction] * 1001, "verification_status": self.verified.id},
+        )
+        for body in bodies:
+            response = self.client.post("/predictions/verify_bulk", body, format="json")
+            self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(
+            "/predictions/verify_bulk", {"ids": [prediction], "verification_status": 999}, format="json"
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Prediction.objects.get(pk=prediction).verification_status, self.pending)
+
+
+class PredictionAccuracyTests(PredictionTestCase):
+    def daily_rows(self):
+        categories = {
+            (day, category): (verified, disproved)
+            for day, category, verified, disproved
+            in PredictionCategoryDay.objects.values_list("day", "category", "verified", "disproved")
+            if verified or disproved
+        }
+        verifiers = {
+            (day, verifier): (verified, disproved)
+            for day, verifier, verified, disproved
+            in PredictionVerifierDay.objects.values_list("day", "verification_user", "verified", "disproved")
+            if verified or disproved
+        }
+        return categories, verifiers
+
+    def test_daily_rollups_match_a_rebuild(self):
+        ids = [self.predict(f"Prediction {n}", "tech" if n % 2 else "weather") for n in range(5)]
+        self.verify(ids[0], self.verified)
+        self.verify(ids[1], self.verified)
+        self.verify(ids[2], self.disproved)
+        self.verify(ids[1], self.disproved)
+        self.verify(ids[3], self.pending)
+        self.client.post(
+            "/predictions/verify_bulk", {"ids": ids[3:], "verification_status": self.verified.id}, format="json"
+        )
+        Prediction.objects.get(pk=ids[0]).delete()
+
+        incremental = self.daily_rows()
+        accuracy.rebuild()
+        self.assertEqual(incremental, self.daily_rows())
+
+        today = timezone.localdate()
+        self.assertEqual(incremental[1], {(today, self.profile.id): (2, 2)})
+
+    def test_leaderboard_ranks_categories_by_accuracy(self):
+        ids = [self.predict(f"Prediction {n}", "tech" if n < 2 else "weather") for n in range(4)]
+        self.verify(ids[0], self.verified)
+        self.verify(ids[1], self.verified)
+        self.verify(ids[2], self.verified)
+        self.verify(ids[3], self.disproved)
+
+        response = self.client.get("/predictions/leaderboard?by=category")
+
+        self.assertEqual(
+            [(row["category"], row["accuracy_percentage"]) for row in response.data],
+            [("tech", 100), ("weather", 50)],
+        )
+
+    def test_timeseries_by_category_and_verifier(self):
+        ids = [self.predict(f"Prediction {n}", "tech" if n < 2 else None) for n in range(3)]
+        self.verify(ids[0], self.verified)
+        self.verify(ids[1], self.disproved)
+        self.verify(ids[2], self.verified)
+        today = timezone.localdate()
+
+        def series(query):
+            response = self.client.get(f"/predictions/timeseries?{query}")
+            self.assertEqual(response.status_code, 200)
+            return [(bucket["start"], bucket["verified"], bucket["disproved"]) for bucket in response.data]
+
+        self.assertEqual(series("category=tech"), [(today, 1, 1)])
+        self.assertEqual(series("category="), [(today, 1, 0)])
+        self.assertEqual(series(f"verifier={self.profile.id}"), [(today, 2, 1)])
+        self.assertEqual(series("interval=week"), [(today - timedelta(days=today.weekday()), 2, 1)])
+
+    def test_timeseries_rejects_invalid_filters(self):
+        for query in (
+            "verifier=abc",
+            "verifier=1&category=tech",
+            "interval=month",
+            "start=yesterday",
+            "start=2030-01-02&end=2030-01-01",
+        ):
+            response = self.client.get(f"/predictions/timeseries?{query}")
+            self.assertEqual(response.status_code, 400, query)
+
+
+class PredictionSimilarityTests(PredictionTestCase):
+    WORDS = (
+        "market river engine planet vote city battery robot ocean price school forest "
+        "rocket doctor music garden bridge coffee winter election island camera"
+    ).split()
+
+    def create(self, text):
+        prediction = Prediction.objects.create(
+            capsule_content=self.content, prediction_text=text, verification_status=self.pending
+        )
+        similarity.index(prediction)
+        return prediction
+
+    def test_near_duplicates_are_found(self):
+        generator = random.Random(14)
+        found = compared = 0
+        for _ in range(40):
+            words = [generator.choice(self.WORDS) for _ in range(14)]
+            original = self.create(" ".join(words))
+            words[generator.randrange(len(words))] = generator.choice(self.WORDS)
+            variant_text = " ".join(words) + "!"
+
+            original_shingles = similarity.shingles(original.prediction_text)
+            variant_shingles = similarity.shingles(variant_text)
+            if len(original_shingles & variant_shingles) / len(original_shingles | variant_shingles) < 0.8:
+                continue
+
+            compared += 1
+            variant = self.create(variant_text)
+            if variant.duplicate_of_id in (original.id, original.duplicate_of_id):
+                found += 1
+
+        self.assertGreater(compared, 20)
+        self.assertGreaterEqual(found / compared, 0.9)
+
+    def test_unrelated_predictions_stay_apart(self):
+        first = self.create("The river will flood the old town by spring")
+        second = self.create("Electric planes will cross the Atlantic within a decade")
+        self.assertIsNone(second.duplicate_of_id)
+
+        duplicate = self.create("the river will flood the old town by spring!!")
+        self.assertEqual(duplicate.duplicate_of_id, first.id)
+
+    def test_rebuild_matches_incremental_indexing(self):
+        texts = [
+            "Cars will fly over the city by 2040",
+            "Cars will fly over the city by 2045",
+            "Robots will teach every school class",
+            "cars will fly over the city by 2040.",
+        ]
+        predictions = [self.create(text) for text in texts]
+        incremental = {p.id: Prediction.objects.get(pk=p.id).duplicate_of_id for p in predictions}
+
+        similarity.rebuild()
+
+        self.assertEqual(
+            incremental, dict(Prediction.objects.values_list("id", "duplicate_of"))
+        )
+        self.assertEqual(incremental[predictions[3].id], predictions[0].id)
+
+    def test_clusters_can_be_narrowed_to_a_status(self):
+        original = self.create("The river will flood the old town by spring")
+        duplicates = [self.create("the river will flood the old town by spring" + "!" * n) for n in (1, 2)]
+        self.verify(duplicates[1].id, self.verified)
+
+        response = self.client.get("/predictions/similar")
+        self.assertEqual(response.data[0]["ids"], [original.id] + [duplicate.id for duplicate in duplicates])
+
+        response = self.client.get(f"/predictions/similar?verification_status={self.verified.id}")
+        self.assertEqual(response.data[0]["ids"], [original.id, duplicates[1].id])
+
+        for query in ("verification_status=abc", "limit=ten"):
+            self.assertEqual(self.client.get(f"/predictions/similar?{query}").status_code, 400, query)
+
+
+class StoryTestCase(ApiTestCase):
+    """ApiTestCase with a story capsule content and helpers to build its graph"""
+
+    def setUp(self):
+        super().setUp()
+        self.story_type = ContentType.objects.create(name="story")
+        self.content = self.create_content()
+
+    def create_content(self):
+        return TimeCapsuleContent.objects.create(capsule=self.capsule, content_type=self.story_type, content="Story")
+
+    def node(self, parent=None, content=None):
+        return StoryNode.objects.create(capsule_content=content or self.content, content="Node", parent_node=parent)
+
+    def choice(self, node, next_node):
+        return StoryChoice.objects.create(node=node, next_node=next_node, choice_text="Go on")
+
+    def graph(self, content=None):
+        response = self.client.get(f"/storynodes/graph?capsule_content={(content or self.content).id}")
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+
+class StoryGraphTests(StoryTestCase):
+    def test_graph_lists_nodes_choices_roots_and_leaves(self):
+        start = self.node()
+        left, right = self.node(start), self.node(start)
+        to_left, to_right = self.choice(start, left), self.choice(start, right)
+        back = self.choice(right, start)
+        self.node(content=self.create_content())
+
+        graph = self.graph()
+
+        self.assertEqual([node["id"] for node in graph["nodes"]], [start.id, left.id, right.id])
+        self.assertEqual(graph["nodes"][1], {"id": left.id, "parent_node": start.id, "content": "Node"})
+        self.assertEqual([choice["id"] for choice in graph["choices"]], [to_left.id, to_right.id, back.id])
+        self.assertEqual(
+            graph["choices"][2], {"id": back.id, "node": right.id, "next_node": start.id, "choice_text": "Go on"}
+        )
+        self.assertEqual(graph["roots"], [start.id])
+        self.assertEqual(graph["leaves"], [left.id])
+
+    def test_cold_load_takes_two_queries_whatever_the_size(self):
+        parent = self.node()
+        for _ in range(30):
+            child = self.node(parent)
+            self.choice(parent, child)
+            parent = child
+
+        with self.assertNumQueries(2):
+            graph = story_graph.load(self.content.id)
+        self.assertEqual((len(graph["nodes"]), len(graph["choices"])), (31, 30))
+
+        # Token lookup, then nodes and choices; served from the cache after
+        with self.assertNumQueries(3):
+            cold = self.graph()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.graph(), cold)
+
+    def test_empty_and_unknown_stories(self):
+        self.assertEqual(self.graph(), {
+            "capsule_content": self.content.id, "nodes": [], "choices": [], "roots": [], "leaves": []
+        })
+        self.assertEqual(self.client.get("/storynodes/graph?capsule_content=999").status_code, 404)
+        self.assertEqual(self.client.get("/storynodes/graph").status_code, 400)
+        self.assertEqual(self.client.get("/storynodes/graph?capsule_content=first").status_code, 400)
+
+
+class StoryTreeTests(StoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = self.node()
+        self.a, self.b = self.node(self.root), self.node(self.root)
+        self.a1, self.a2 = self.node(self.a), self.node(self.a)
+        self.leaf = self.node(self.a1)
+
+    def walk(self, node, direction, depth=None):
+        url = f"/storynodes/{node.id}/{direction}"
+        if depth is not None:
+            url += f"?depth={depth}"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [(row["id"], row["depth"]) for row in response.data]
+
+    def reparent(self, node, parent):
+        return self.client.put(
+            f"/storynodes/{node.id}", {"parent_node": parent.id if parent else None, "content": "Node"}, format="json"
+        )
+
+    def test_ancestors_are_listed_parent_first(self):
+        self.assertEqual(self.walk(self.leaf, "ancestors"), [(self.a1.id, 1), (self.a.id, 2), (self.root.id, 3)])
+        self.assertEqual(self.walk(self.leaf, "ancestors", depth=2), [(self.a1.id, 1), (self.a.id, 2)])
+        self.assertEqual(self.walk(self.leaf, "ancestors", depth=0), [])
+        self.assertEqual(self.walk(self.root, "ancestors"), [])
+
+    def test_subtree_is_listed_level_by_level(self):
+        self.assertEqual(self.walk(self.root, "subtree"), [
+            (self.root.id, 0), (self.a.id, 1), (self.b.id, 1), (self.a1.id, 2), (self.a2.id, 2), (self.leaf.id, 3)
+        ])
+        self.assertEqual(self.walk(self.root, "subtree", depth=1), [(self.root.id, 0), (self.a.id, 1), (self.b.id, 1)])
+        self.assertEqual(self.walk(self.a, "subtree", depth=0), [(self.a.id, 0)])
+
+    def test_invalid_depth_and_unknown_nodes(self):
+        for depth in ("-1", "deep", "1.5"):
+            response = self.client.get(f"/storynodes/{self.leaf.id}/ancestors?depth={depth}")
+            self.assertEqual(response.status_code, 400, depth)
+        self.assertEqual(self.client.get("/storynodes/999/subtree").status_code, 404)
+
+    def test_depth_is_capped_by_the_setting(self):
+        with self.settings(STORY_TREE_MAX_DEPTH=2):
+            self.assertEqual(self.walk(self.leaf, "ancestors", depth=10), [(self.a1.id, 1), (self.a.id, 2)])
+
+    def test_node_cannot_become_its_own_ancestor(self):
+        for node, parent in ((self.a, self.leaf), (self.a, self.a), (self.root, self.a2)):
+            response = self.reparent(node, parent)
+            self.assertEqual(response.status_code, 400, (node.id, parent.id))
+        self.assertEqual(StoryNode.objects.get(pk=self.a.id).parent_node_id, self.root.id)
+
+        self.assertEqual(self.reparent(self.a1, self.b).status_code, 204)
+        self.assertEqual(self.walk(self.leaf, "ancestors"), [(self.a1.id, 1), (self.b.id, 2), (self.root.id, 3)])
+        self.assertEqual(self.reparent(self.a, None).status_code, 204)
+        self.assertEqual(self.reparent(self.root, self.a2).status_code, 204)
+
+    @override_settings(STORY_TREE_MAX_DEPTH=5)
+    def test_existing_cycles_do_not_loop_forever(self):
+        StoryNode.objects.filter(pk=self.root.id).update(parent_node=self.a)
+
+        self.assertEqual(len(self.walk(self.a, "ancestors")), 5)
+        self.assertEqual(self.walk(self.a, "subtree", depth=2)[-1][1], 2)
+
+
+class StoryGraphCacheTests(StoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.start = self.node()
+        self.end = self.node(self.start)
+        self.go_on = self.choice(self.start, self.end)
+        self.other = self.create_content()
+
+    def write(self, method, url, data=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(url, data, format="json")
+        self.assertLess(response.status_code, 300, getattr(response, "data", None))
+        return response
+
+    def node_ids(self, content=None):
+        return [node["id"] for node in self.graph(content)["nodes"]]
+
+    def choice_texts(self, content=None):
+        return [choice["choice_text"] for choice in self.graph(content)["choices"]]
+
+    def test_node_writes_refresh_the_graph(self):
+        self.assertEqual(self.node_ids(), [self.start.id, self.end.id])
+
+        response = self.write("post", "/storynodes", {"capsule_content": self.content.id, "content": "New"})
+        added = response.data["id"]
+        self.assertEqual(self.node_ids(), [self.start.id, self.end.id, added])
+
+        self.write("put", f"/storynodes/{added}", {"content": "Edited"})
+        self.assertEqual(self.graph()["nodes"][2]["content"], "Edited")
+
+        self.write("delete", f"/storynodes/{added}")
+        self.assertEqual(self.node_ids(), [self.start.id, self.end.id])
+
+    def test_moving_a_node_refreshes_both_stories(self):
+        self.assertEqual(self.node_ids(self.other), [])
+        self.graph()
+
+        self.write("put", f"/storynodes/{self.end.id}", {"capsule_content": self.other.id, "content": "Moved"})
+
+        self.assertEqual(self.node_ids(), [self.start.id])
+        self.assertEqual(self.node_ids(self.other), [self.end.id])
+
+    def test_choice_writes_refresh_the_graph(self):
+        self.assertEqual(self.choice_texts(), ["Go on"])
+
+        response = self.write(
+            "post", "/storychoices", {"node": self.end.id, "next_node": self.start.id, "choice_text": "Back"}
+        )
+        self.assertEqual(self.choice_texts(), ["Go on", "Back"])
+        self.assertEqual(self.graph()["leaves"], [])
+
+        self.write("put", f"/storychoices/{response.data['id']}", {"choice_text": "Again"})
+        self.assertEqual(self.choice_texts(), ["Go on", "Again"])
+
+        self.write("delete", f"/storychoices/{response.data['id']}")
+        self.assertEqual(self.choice_texts(), ["Go on"])
+
+        elsewhere = self.node(content=self.other)
+        self.assertEqual(self.choice_texts(self.other), [])
+        self.write("put", f"/storychoices/{self.go_on.id}", {"node": elsewhere.id, "choice_text": "Go on"})
+        self.assertEqual(self.choice_texts(), [])
+        self.assertEqual(self.choice_texts(self.other), ["Go on"])
+
+    def test_import_refreshes_the_graph(self):
+        self.graph()
+
+        self.write("post", "/storynodes/import", {
+            "capsule_content": self.content.id,
+            "nodes": [{"id": "epilogue", "content": "Epilogue"}],
+            "choices": [],
+        })
+
+        self.assertEqual(len(self.node_ids()), 3)
+
+    def test_uncommitted_writes_leave_the_cached_graph_alone(self):
+        cached = self.graph()
+        self.node()
+        self.assertEqual(self.graph(), cached)
+
+    def test_evicted_versions_restart_above_every_older_one(self):
+        before = story_graph.version(self.content.id)
+        cache.clear()
+        self.assertGreater(story_graph.version(self.content.id), before)
+        self.assertEqual(self.node_ids(), [self.start.id, self.end.id])
+
+
+class StoryAnalysisTests(SimpleTestCase):
+    def analyze(self, parents, choices):
+        """parents maps node id to parent id, choices are (node, next_node) pairs"""
+        return story_analysis.analyze({
+            "capsule_content": 1,
+            "nodes": [{"id": pk, "parent_node": parent} for pk, parent in parents.items()],
+            "choices": [
+                {"id": index, "node": node, "next_node": next_node}
+                for index, (node, next_node) in enumerate(choices, start=1)
+            ],
+        })
+
+    def test_tree_without_problems_is_valid(self):
+        result = self.analyze({1: None, 2: 1, 3: 1, 4: 2}, [(1, 2), (1, 3), (2, 4)])
+
+        self.assertTrue(result["valid"])
+        self.assertEqual((result["cycles"], result["traps"], result["unreachable"]), ([], [], []))
+        self.assertEqual(result["dead_ends"], [3, 4])
+        self.assertEqual(result["longest_path"], [1, 2, 4])
+
+    def test_self_loop_is_a_cycle_and_a_trap_only_without_a_way_out(self):
+        escapable = self.analyze({1: None, 2: 1}, [(1, 1), (1, 2)])
+        self.assertEqual((escapable["cycles"], escapable["traps"]), ([[1]], []))
+        self.assertTrue(escapable["valid"])
+
+        trapped = self.analyze({1: None, 2: 1}, [(1, 2), (2, 2)])
+        self.assertEqual((trapped["cycles"], trapped["traps"]), ([[2]], [[2]]))
+        self.assertFalse(trapped["valid"])
+
+    def test_trap_versus_escapable_cycle(self):
+        result = self.analyze(
+            {1: None, 2: 1, 3: 2, 4: 1, 5: 4, 6: 5},
+            [(1, 2), (2, 3), (3, 2), (1, 4), (4, 5), (5, 4), (5, 6)],
+        )
+
+        self.assertEqual(sorted(result["cycles"]), [[2, 3], [4, 5]])
+        self.assertEqual(result["traps"], [[2, 3]])
+        self.assertEqual(result["dead_ends"], [6])
+        self.assertFalse(result["valid"])
+
+    def test_unreachable_nodes_and_external_choices(self):
+        result = self.analyze({1: None, 2: 1, 3: 1, 4: 3}, [(1, 2), (3, 4), (2, 99)])
+
+        self.assertEqual(result["unreachable"], [3, 4])
+        self.assertEqual(result["external_choices"], [3])
+        self.assertEqual(result["dead_ends"], [2, 4])
+        self.assertFalse(result["valid"])
+
+    def test_longest_path_counts_a_cycle_as_one_step(self):
+        result = self.analyze(
+            {1: None, 2: 1, 3: 2, 4: 3, 5: 4, 6: 1},
+            [(1, 6), (1, 2), (2, 3), (3, 2), (3, 4), (4, 5)],
+        )
+
+        self.assertEqual(result["longest_path"], [1, 2, 4, 5])
+
+    def test_deep_stories_do_not_recurse(self):
+        size = 20000
+        parents = {1: None, **{pk: pk - 1 for pk in range(2, size + 1)}}
+        choices = [(pk, pk + 1) for pk in range(1, size)] + [(size, 1)]
+
+        result = self.analyze(parents, choices)
+
+        self.assertEqual(result["traps"], [list(range(1, size + 1))])
+        self.assertEqual(result["longest_path"], [1])
+
+        result = self.analyze(parents, choices[:-1])
+        self.assertEqual(len(result["longest_path"]), size)
+        self.assertTrue(result["valid"])
+
+
+class StoryImportTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        content_type = ContentType.objects.create(name="story")
+        self.content = TimeCapsuleContent.objects.create(
+            capsule=self.capsule, content_type=content_type, content="Content"
+        )
+
+    def import_story(self, nodes, choices=()):
+        return self.client.post(
+            "/storynodes/import",
+            {"capsule_content": self.content.id, "nodes": nodes, "choices": list(choices)},
+            format="json",
+        )
+
+    def test_imports_nodes_and_choices_by_temporary_id(self):
+        response = self.import_story(
+            [
+                {"id": "end", "content": "The end", "parent_node": "start"},
+                {"id": "start", "content": "Once upon a time"},
+            ],
+            [{"id": 1, "node": "start", "next_node": "end", "choice_text": "Go on"}],
+        )
+
+        self.assertEqual(response.status_code, 201)
+        nodes = response.data["nodes"]
+        self.assertEqual(StoryNode.objects.get(pk=nodes["end"]).parent_node_id, nodes["start"])
+        choice = StoryChoice.objects.get(pk=response.data["choices"][1])
+        self.assertEqual((choice.node_id, choice.next_node_id), (nodes["start"], nodes["end"]))
+
+    def test_invalid_documents_create_nothing(self):
+        documents = (
+            ([{"id": "a", "content": "A", "parent_node": "b"}, {"id": "b", "content": "B", "parent_node": "a"}], []),
+            ([{"id": "a", "content": "A", "parent_node": ["b"]}], []),
+            ([{"id": "a", "content": "A"}], [{"id": 1, "node": {"id": "a"}, "next_node": "a", "choice_text": "Go"}]),
+            ([{"id": "a", "content": "A"}, {"id": "a", "content": "Again"}], []),
+            ([{"id": "a", "content": "A"}], [{"id": 1, "node": "a", "next_node": "missing", "choice_text": "Go"}]),
+        )
+        for nodes, choices in documents:
+            response = self.import_story(nodes, choices)
+            self.assertEqual(response.status_code, 400, nodes)
+            self.assertTrue(response.data["errors"])
+
+        self.assertFalse(StoryNode.objects.exists())
+        self.assertFalse(StoryChoice.objects.exists())
+
+    def test_failed_write_rolls_back_the_nodes(self):
+        with mock.patch.object(type(StoryChoice.objects), "bulk_create", side_effect=RuntimeError("disk full")), \
+                self.assertLogs("timecapsuleapi.views.storynode_view", "ERROR"):
+            response = self.import_story(
+                [{"id": "start", "content": "Start"}, {"id": "end", "content": "End", "parent_node": "start"}],
+                [{"id": 1, "node": "start", "next_node": "end", "choice_text": "Go on"}],
+            )
+
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(StoryNode.objects.exists())
+
+
+@override_settings(STORY_CHOICE_BUFFER_SIZE=100, STORY_CHOICE_BUFFER_SECONDS=60)
+class StoryChoiceBufferTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(buffers.story_choices.flush)
+        content_type = ContentType.objects.create(name="story")
+        self.content = TimeCapsuleContent.objects.create(
+            capsule=self.capsule, content_type=content_type, content="Content"
+        )
+        start = StoryNode.objects.create(capsule_content=self.content, content="Start")
+        left = StoryNode.objects.create(capsule_content=self.content, content="Left", parent_node=start)
+        right = StoryNode.objects.create(capsule_content=self.content, content="Right", parent_node=start)
+        self.left = StoryChoice.objects.create(node=start, next_node=left, choice_text="Left")
+        self.right = StoryChoice.objects.create(node=start, next_node=right, choice_text="Right")
+
+    def record(self, choice, times=1):
+        for _ in range(times):
+            response = self.client.post(f"/storychoices/{choice.id}/record")
+            self.assertEqual(response.status_code, 202)
+
+    def counts(self):
+        return dict(StoryChoiceDay.objects.values_list("choice_id", "count"))
+
+    def test_clicks_are_summed_per_choice_on_flush(self):
+        self.record(self.left, 3)
+        self.record(self.right)
+        self.assertFalse(StoryChoiceDay.objects.exists())
+
+        self.assertEqual(buffers.story_choices.flush(), 4)
+
+        self.assertEqual(self.counts(), {self.left.id: 3, self.right.id: 1})
+        response = self.client.get(f"/storynodes/paths?capsule_content={self.content.id}")
+        self.assertEqual(response.data["total"], 4)
+        self.assertEqual([choice["id"] for choice in response.data["choices"]], [self.left.id, self.right.id])
+
+    def test_later_batches_increment_the_same_day(self):
+        self.record(self.left, 2)
+        buffers.story_choices.flush()
+        self.record(self.left)
+        buffers.story_choices.flush()
+
+        self.assertEqual(StoryChoiceDay.objects.count(), 1)
+        self.assertEqual(self.counts(), {self.left.id: 3})
+
+    def test_clicks_on_deleted_choices_are_dropped(self):
+        self.record(self.left)
+        self.record(self.right)
+        self.right.delete()
+
+        buffers.story_choices.flush()
+
+        self.assertEqual(self.counts(), {self.left.id: 1})
+
+    def test_paths_count_back_at_most_the_configured_days(self):
+        today = timezone.localdate()
+        StoryChoiceDay.objects.create(choice=self.left, day=today, count=1)
+        StoryChoiceDay.objects.create(choice=self.right, day=today - timedelta(days=40), count=2)
+        StoryChoiceDay.objects.create(choice=self.right, day=today - timedelta(days=4000), count=4)
+
+        def total(days):
+            response = self.client.get(f"/storynodes/paths?capsule_content={self.content.id}&days={days}")
+            self.assertEqual(response.status_code, 200)
+            return response.data["total"]
+
+        self.assertEqual(total(0), 1)
+        self.assertEqual(total(30), 1)
+        self.assertEqual(total(99999999), 3)
+        with self.settings(STORY_PATHS_MAX_DAYS=100000):
+            self.assertEqual(total(99999999), 7)
+
+    def test_unknown_choice_is_not_queued(self):
+        response = self.client.post("/storychoices/999/record")
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(buffers.story_choices.pending(), [])
+
+
+class CommentStreamTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.thread = DiscussionThread.objects.create(capsule=self.capsule, title="Thread", created_by=self.profile)
+        self.other_thread = DiscussionThread.objects.create(capsule=self.capsule, title="Other", created_by=self.profile)
+        self.comments = [
+            DiscussionComment.objects.create(thread=self.thread, content=f"Comment {i}", author=self.profile)
+            for i in range(3)
+        ]
+        self.token = Token.objects.get(user=self.user).key
+        self.addCleanup(comment_hub._subscribers.clear)
+
+    def open(self, thread=None, ticket=None, headers=None):
+        url = f"/discussionthreads/{(thread or self.thread).id}/stream"
+        if ticket is not None:
+            url += f"?ticket={ticket}"
+        return self.async_client.get(url, headers=headers or {})
+
+    async def read(self, response, count):
+        """The next count chunks of a stream, as text"""
+        chunks = []
+        iterator = aiter(response.streaming_content)
+        while len(chunks) < count:
+            chunks.append((await asyncio.wait_for(anext(iterator), 5)).decode("utf-8"))
+        return chunks
+
+    def event_ids(self, chunks):
+        return [int(chunk.split("\n")[0][len("id: "):]) for chunk in chunks if chunk.startswith("id: ")]
+
+    def test_ticket_names_one_user_and_thread(self):
+        response = self.client.post(f"/discussionthreads/{self.thread.id}/stream_ticket")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["expires_in"], settings.COMMENT_STREAM_TICKET_SECONDS)
+        ticket = response.data["ticket"]
+
+        self.assertEqual(comment_hub.ticket_user_id(ticket, self.thread.id), self.user.id)
+        self.assertIsNone(comment_hub.ticket_user_id(ticket, self.other_thread.id))
+        self.assertIsNone(comment_hub.ticket_user_id(ticket + "x", self.thread.id))
+        self.assertIsNone(comment_hub.ticket_user_id(self.token, self.thread.id))
+        with mock.patch("django.core.signing.time.time", return_value=time.time() + 61):
+            self.assertIsNone(comment_hub.ticket_user_id(ticket, self.thread.id))
+
+        self.assertEqual(self.client.post("/discussionthreads/999/stream_ticket").status_code, 404)
+
+    async def test_stream_refuses_bad_credentials(self):
+        ticket = comment_hub.stream_ticket(self.user.id, self.thread.id)
+        with mock.patch("django.core.signing.time.time", return_value=time.time() - 61):
+            expired = comment_hub.stream_ticket(self.user.id, self.thread.id)
+
+        for response in (
+            await self.open(),
+            await self.open(ticket="forged"),
+            await self.open(ticket=expired),
+            await self.open(thread=self.other_thread, ticket=ticket),
+            await self.open(headers={"Authorization": "Token wrong"}),
+        ):
+            self.assertEqual(response.status_code, 401)
+
+        await User.objects.filter(pk=self.user.id).aupdate(is_active=False)
+        self.assertEqual((await self.open(ticket=ticket)).status_code, 401)
+        self.assertEqual((await self.open(headers={"Authorization": f"Token {self.token}"})).status_code, 401)
+
+    async def test_stream_replays_after_last_event_id_then_goes_live(self):
+        ticket = comment_hub.stream_ticket(self.user.id, self.thread.id)
+        response = await self.open(ticket=ticket, headers={"Last-Event-ID": str(self.comments[0].id)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+
+        chunks = await self.read(response, 3)
+        self.assertEqual(chunks[0], f"retry: {settings.COMMENT_STREAM_RETRY_MS}\n\n")
+        self.assertEqual(self.event_ids(chunks), [comment.id for comment in self.comments[1:]])
+
+        # Events already replayed are skipped, newer ones are pushed
+        live = await DiscussionComment.objects.acreate(thread=self.thread, content="Live", author=self.profile)
+        comment_hub.publish(self.thread.id, comment_hub.comment_event(self.comments[2]))
+        comment_hub.publish(self.thread.id, comment_hub.comment_event(live))
+        chunks = await self.read(response, 1)
+        self.assertEqual(self.event_ids(chunks), [live.id])
+        self.assertIn('"content": "Live"', chunks[0])
+
+        # A client going away cancels the read, which ends the subscription
+        reader = asyncio.ensure_future(self.read(response, 1))
+        await asyncio.sleep(0.01)
+        reader.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await reader
+        self.assertNotIn(self.thread.id, comment_hub._subscribers)
+
+    async def test_stream_accepts_the_api_token_header(self):
+        response = await self.open(headers={"Authorization": f"Token {self.token}"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.event_ids(await self.read(response, 4)), [comment.id for comment in self.comments])
+
+    def test_stream_is_refused_over_wsgi(self):
+        response = self.client.get(f"/discussionthreads/{self.thread.id}/stream")
+        self.assertEqual(response.status_code, 501)
+
+    async def test_overflowing_subscription_asks_the_reader_to_reconnect(self):
+        subscription = comment_hub.subscribe(self.thread.id, maxsize=2)
+        self.addCleanup(comment_hub.unsubscribe, subscription)
+
+        for comment in self.comments:
+            subscription._deliver(comment_hub.comment_event(comment))
+        subscription._deliver({"id": 999})
+
+        self.assertTrue(subscription.overflowed)
+        self.assertIsNone(await subscription.get(1))
+        with self.assertRaises(asyncio.TimeoutError):
+            await subscription.get(0.01)
+
+
+class DeltaTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.thread = DiscussionThread.objects.create(capsule=self.capsule, title="Thread", created_by=self.profile)
+        self.comments = [
+            DiscussionComment.objects.create(thread=self.thread, content=f"Comment {i}", author=self.profile)
+            for i in range(4)
+        ]
+
+    def delta(self, query, **headers):
+        return self.client.get(f"/discussioncomments?thread={self.thread.id}&{query}", **headers)
+
+    def ids(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [comment["id"] for comment in response.data["results"]]
+
+    def other_thread(self):
+        return DiscussionThread.objects.create(capsule=self.capsule, title="Other", created_by=self.profile)
+
+    def test_after_id_returns_newer_comments_oldest_first(self):
+        response = self.delta(f"after_id={self.comments[1].id}")
+
+        self.assertEqual(self.ids(response), [self.comments[2].id, self.comments[3].id])
+
+    def test_deleted_after_id_falls_back_to_ids(self):
+        after = self.comments[1].id
+        self.comments[1].delete()
+
+        self.assertEqual(self.ids(self.delta(f"after_id={after}")), [self.comments[2].id, self.comments[3].id])
+
+    def test_since_returns_comments_created_later(self):
+        now = timezone.now()
+        DiscussionComment.objects.filter(pk__in=[c.id for c in self.comments[:2]]).update(
+            created_at=now - timedelta(hours=1)
+        )
+        since = (now - timedelta(minutes=30)).isoformat().replace("+00:00", "Z")
+
+        self.assertEqual(self.ids(self.delta(f"since={since}")), [self.comments[2].id, self.comments[3].id])
+
+    def test_nothing_new_is_an_empty_page_not_304(self):
+        response = self.delta(f"after_id={self.comments[-1].id}")
+
+        self.assertEqual(self.ids(response), [])
+        self.assertIsNone(response.data["next"])
+
+        response = self.client.get(f"/discussionthreads?capsule={self.capsule.id}&after_id={self.thread.id}")
+        self.assertEqual(self.ids(response), [])
+
+    def test_matching_etag_is_answered_with_304(self):
+        etag = self.delta("")["ETag"]
+
+        response = self.delta("", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], etag)
+
+        self.assertEqual(self.delta("", HTTP_IF_NONE_MATCH='W/"stale"').status_code, 200)
+
+    def test_every_write_changes_the_etag(self):
+        etags = [self.delta("")["ETag"]]
+
+        response = self.client.put(
+            f"/discussioncomments/{self.comments[0].id}", {"content": "Edited"}, format="json"
+        )
+        self.assertEqual(response.status_code, 204)
+        etags.append(self.delta("")["ETag"])
+
+        self.assertEqual(self.client.delete(f"/discussioncomments/{self.comments[1].id}").status_code, 204)
+        etags.append(self.delta("")["ETag"])
+
+        DiscussionComment.objects.create(thread=self.thread, content="New", author=self.profile)
+        etags.append(self.delta("")["ETag"])
+
+        self.assertEqual(len(set(etags)), len(etags))
+        self.assertEqual(self.delta("", HTTP_IF_NONE_MATCH=etags[0]).status_code, 200)
+
+    def test_empty_delta_revalidates_until_a_comment_arrives(self):
+        query = f"after_id={self.comments[-1].id}"
+        etag = self.delta(query)["ETag"]
+        self.assertEqual(self.delta(query, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        comment = DiscussionComment.objects.create(thread=self.thread, content="New", author=self.profile)
+        self.assertEqual(self.ids(self.delta(query, HTTP_IF_NONE_MATCH=etag)), [comment.id])
+
+    def test_thread_etag_follows_comment_activity(self):
+        url = f"/discussionthreads?capsule={self.capsule.id}"
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Only the denormalized comment_count moves
+        DiscussionComment.objects.create(thread=self.thread, content="New", author=self.profile)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+        etag = response["ETag"]
+        response = self.client.put(
+            f"/discussioncomments/{self.comments[0].id}",
+            {"content": "Moved", "thread": self.other_thread().id},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertNotEqual(self.client.get(url)["ETag"], etag)
+
+    def test_invalid_positions_are_rejected(self):
+        self.assertEqual(self.delta("after_id=latest").status_code, 400)
+        self.assertEqual(self.delta("since=yesterday").status_code, 400)
+        self.assertEqual(self.client.get("/discussionthreads?after_id=latest").status_code, 400)
+
+
+class ThreadOrderingTests(ApiTestCase):
+    def create_thread(self, title):
+        return DiscussionThread.objects.create(capsule=self.capsule, title=title, created_by=self.profile)
+
+    def comment(self, thread):
+        response = self.client.post("/discussioncomments", {"thread": thread.id, "content": "Comment"}, format="json")
+        self.assertEqual(response.status_code, 201)
+        return response.data["id"]
+
+    def titles(self, ordering):
+        response = self.client.get(f"/discussionthreads?capsule={self.capsule.id}&ordering={ordering}")
+        self.assertEqual(response.status_code, 200)
+        return [thread["title"] for thread in response.data["results"]]
+
+    def test_hot_orders_by_recent_comments(self):
+        busy, quiet, idle = self.create_thread("busy"), self.create_thread("quiet"), self.create_thread("idle")
+        for _ in range(3):
+            self.comment(busy)
+        self.comment(quiet)
+
+        self.assertEqual(self.titles("hot"), ["busy", "quiet", "idle"])
+
+        # Comments lose half their weight every half-life
+        DiscussionComment.objects.filter(thread=busy).update(
+            created_at=timezone.now() - timedelta(hours=10 * settings.THREAD_HOTNESS_HALF_LIFE_HOURS)
+        )
+        hotness.rebuild()
+        self.assertEqual(self.titles("hot"), ["quiet", "busy", "idle"])
+
+    def test_old_scores_stay_comparable_without_rewrites(self):
+        old, fresh = self.create_thread("old"), self.create_thread("fresh")
+        long_ago = timezone.now() - timedelta(hours=10 * settings.THREAD_HOTNESS_HALF_LIFE_HOURS)
+        hotness.comments_added(old.id, [long_ago] * 100)
+        old.refresh_from_db()
+
+        self.comment(fresh)
+        self.assertEqual(self.titles("hot"), ["fresh", "old"])
+
+        # 100 comments ten half-lives ago weigh 100 / 1024 of one comment now
+        fresh.refresh_from_db()
+        self.assertAlmostEqual(old.hot_score - fresh.hot_score, math.log2(100 / 1024), places=2)
+        self.assertEqual(DiscussionThread.objects.get(pk=old.id).hot_score, old.hot_score)
+
+        out = StringIO()
+        call_command("decay_thread_hotness", stdout=out)
+        self.assertIn("0 thread(s) updated", out.getvalue())
+        self.assertEqual(DiscussionThread.objects.get(pk=old.id).hot_score, old.hot_score)
+
+    def test_removing_the_heaviest_comment_rescores_the_rest(self):
+        thread = self.create_thread("thread")
+        only = self.comment(thread)
+        self.client.delete(f"/discussioncomments/{only}")
+        thread.refresh_from_db()
+        self.assertEqual(thread.hot_score, 0)
+
+        DiscussionComment.objects.create(thread=thread, content="Old", author=self.profile)
+        DiscussionComment.objects.filter(thread=thread).update(
+            created_at=timezone.now() - timedelta(hours=100 * settings.THREAD_HOTNESS_HALF_LIFE_HOURS)
+        )
+        hotness.rebuild()
+        thread.refresh_from_db()
+        expected = thread.hot_score
+
+        self.client.delete(f"/discussioncomments/{self.comment(thread)}")
+        thread.refresh_from_db()
+        self.assertAlmostEqual(thread.hot_score, expected, places=6)
+
+    def test_active_orders_by_latest_comment(self):
+        first, second = self.create_thread("first"), self.create_thread("second")
+        self.comment(second)
+        latest = self.comment(first)
+
+        self.assertEqual(self.titles("active"), ["first", "second"])
+
+        response = self.client.delete(f"/discussioncomments/{latest}")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.titles("active"), ["second", "first"])
+
+    def test_incremental_scores_match_a_rebuild(self):
+        threads = [self.create_thread(f"thread {i}") for i in range(3)]
+        for i, thread in enumerate(threads):
+            for _ in range(i + 1):
+                self.comment(thread)
+        self.client.delete(f"/discussioncomments/{self.comment(threads[0])}")
+
+        incremental = dict(DiscussionThread.objects.values_list("id", "hot_score"))
+        hotness.rebuild()
+        for pk, hot_score in DiscussionThread.objects.values_list("id", "hot_score"):
+            self.assertAlmostEqual(incremental[pk], hot_score, places=3)
+
+    def test_cursor_pages_neither_repeat_nor_skip(self):
+        threads = [self.create_thread(f"thread {i}") for i in range(7)]
+        for thread in threads[::2]:
+            self.comment(thread)
+
+        for ordering in ("hot", "active", "new"):
+            seen = []
+            url = f"/discussionthreads?capsule={self.capsule.id}&ordering={ordering}&page_size=2"
+            while url:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                seen.extend(thread["id"] for thread in response.data["results"])
+                if len(seen) == 2:
+                    # Ties and rows added mid-walk must not shift later pages
+                    self.create_thread(f"late {ordering}")
+                url = response.data["next"]
+
+            original = [thread.id for thread in threads]
+            self.assertEqual(len(seen), len(set(seen)), ordering)
+            self.assertTrue(set(original) <= set(seen), ordering)
+
+    def test_invalid_ordering_or_cursor_is_rejected(self):
+        self.assertEqual(self.client.get("/discussionthreads?ordering=oldest").status_code, 400)
+        self.assertEqual(self.client.get("/discussionthreads?ordering=hot&cursor=nonsense").status_code, 400)
+
+
+@override_settings(COMMENT_WRITE_BEHIND=True, COMMENT_INGEST_MAX_ATTEMPTS=2)
+class CommentWriteBehindTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.thread = DiscussionThread.objects.create(capsule=self.capsule, title="Thread", created_by=self.profile)
+        # Drain by hand instead of through the writer thread and retry timers
+        self.wake = mock.patch.object(buffers.comments, "add").start()
+        self.retry = mock.patch("timecapsuleapi.buffers.threading.Timer").start()
+        self.addCleanup(mock.patch.stopall)
+
+    def accept(self, content="Comment"):
+        response = self.client.post("/discussioncomments", {"thread": self.thread.id, "content": content}, format="json")
+        self.assertEqual(response.status_code, 202)
+        return response.data
+
+    def ingested(self, accepted):
+        response = self.client.get(f"/discussioncomments/ingested/{accepted['ingest_id']}")
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_accepted_comment_is_readable_before_and_after_commit(self):
+        accepted = self.accept()
+        self.assertIsNone(accepted["id"])
+        self.assertTrue(accepted["pending"])
+        self.wake.assert_called_once_with(QueuedComment.objects.get().pk)
+        self.assertTrue(self.ingested(accepted)["pending"])
+
+        self.assertEqual(buffers.comments.drain(), 1)
+
+        committed = self.ingested(accepted)
+        self.assertEqual(committed["id"], DiscussionComment.objects.get().id)
+        self.assertEqual(committed["content"], "Comment")
+        self.assertFalse(QueuedComment.objects.exists())
+        self.thread.refresh_from_db()
+        self.assertEqual(self.thread.comment_count, 1)
+        self.assertGreater(self.thread.hot_score, 0)
+
+    def test_failed_batch_is_retried_with_backoff_then_marked_failed(self):
+        accepted = self.accept()
+
+        with mock.patch.object(DiscussionComment.objects, "bulk_create", side_effect=RuntimeError("disk full")), \
+                self.assertLogs("timecapsuleapi.buffers", "ERROR"):
+            self.assertEqual(buffers.comments.drain(), 0)
+            queued = QueuedComment.objects.get()
+            self.assertEqual(queued.attempts, 1)
+            self.assertGreater(queued.retry_at, timezone.now())
+            self.retry.assert_called_once_with(settings.COMMENT_INGEST_RETRY_SECONDS, buffers.comments.add, (None,))
+            self.assertEqual(buffers.comments.drain(), 0)
+            self.assertTrue(self.ingested(accepted)["pending"])
+
+            QueuedComment.objects.update(retry_at=timezone.now())
+            buffers.comments.drain()
+
+        failed = self.ingested(accepted)
+        self.assertTrue(failed["failed"])
+        self.assertEqual(failed["reason"], "disk full")
+        self.assertFalse(DiscussionComment.objects.exists())
+
+        call_command("ingest_queued_comments", "--retry-failed", stdout=StringIO())
+
+        self.assertEqual(self.ingested(accepted)["id"], DiscussionComment.objects.get().id)
+
+    def test_comments_staged_by_another_worker_are_committed(self):
+        QueuedComment.objects.create(
+            ingest_key=uuid.uuid4(), thread=self.thread, author=self.profile, content="Left behind"
+        )
+        self.accept("New")
+
+        self.assertEqual(buffers.comments.drain(), 2)
+        self.assertEqual(
+            list(DiscussionComment.objects.order_by("id").values_list("content", flat=True)), ["Left behind", "New"]
+        )
+
+
+class TokenAuthenticationTests(ApiTestCase):
+    def create_thread(self, client=None):
+        return (client or self.client).post(
+            "/discussionthreads", {"capsule": self.capsule.id, "title": "Thread"}, format="json"
+        )
+
+    def assertCreatedBy(self, response, profile):
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(DiscussionThread.objects.get(pk=response.data["id"]).created_by_id, profile.id)
+
+    def test_token_sets_user_and_profile(self):
+        self.assertCreatedBy(self.create_thread(), self.profile)
+
+        thread = DiscussionThread.objects.get()
+        response = self.client.post(f"/discussionthreads/{thread.id}/stream_ticket")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(comment_hub.ticket_user_id(response.data["ticket"], thread.id), self.user.id)
+
+    def test_revoked_token_is_refused_at_once(self):
+        self.assertEqual(self.client.get("/discussionthreads").status_code, 200)
+
+        Token.objects.filter(user=self.user).delete()
+
+        self.assertEqual(self.client.get("/discussionthreads").status_code, 401)
+
+    def test_deactivated_user_is_refused_at_once(self):
+        self.assertEqual(self.client.get("/discussionthreads").status_code, 200)
+
+        # A queryset update sends no signals
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+
+        self.assertEqual(self.client.get("/discussionthreads").status_code, 401)
+
+    def test_force_authenticate_gets_a_profile(self):
+        other = self.create_profile("writer@example.com")
+        client = APIClient()
+        client.force_authenticate(user=other.user)
+
+        self.assertCreatedBy(self.create_thread(client), other)
+
+    def test_replaced_profile_is_picked_up(self):
+        self.capsule = self.create_capsule(self.create_profile("owner@example.com"))
+        self.assertCreatedBy(self.create_thread(), self.profile)
+
+        self.profile.delete()
+        profile = UserProfile.objects.create(user=self.user, bio="", location_x=0, location_y=0)
+
+        self.assertCreatedBy(self.create_thread(), profile)
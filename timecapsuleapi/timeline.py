@@ -0,0 +1,127 @@
+from datetime import datetime, timezone as dt_timezone
+from django.db.models import Q
+from django.utils import timezone
+from timecapsuleapi.models import AccessControl, TimeCapsule, TimelineEntry
+
+# Sorts after every real expiry date, for grants that never expire
+_FOREVER = datetime.max.replace(tzinfo=dt_timezone.utc)
+
+
+def add_created(capsules):
+    """Put newly created capsules on their creators' timelines"""
+    entries = [
+        TimelineEntry(user_id=capsule.creator_id, capsule_id=capsule.id, created_at=capsule.created_at)
+        for capsule in capsules
+    ]
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+def add_shared(grant):
+    """Put a capsule on the timeline of the user an AccessControl grants it to
+
+    A capsule the user created keeps its own entry. When several grants share
+    the same capsule with the user, the entry follows the one that lasts
+    longest.
+    """
+    _refresh([(grant.user_id, grant.capsule_id)])
+
+
+def update_shared(grant):
+    """Follow a changed AccessControl, including one moved to another user or capsule"""
+    pairs = set(
+        TimelineEntry.objects.filter(access_control=grant).values_list("user_id", "capsule_id")
+    )
+    pairs.add((grant.user_id, grant.capsule_id))
+    _refresh(pairs)
+
+
+def remove_shared(grant):
+    """Clean up after a deleted AccessControl
+
+    Its entry is removed by the foreign key cascade. If another live grant
+    still shares the same capsule with the user, fan out from that one.
+    """
+    _refresh([(grant.user_id, grant.capsule_id)], exclude=grant.pk)
+
+
+def visible_entries(profile):
+    """Timeline entries a user can currently see"""
+    now = timezone.now()
+    return TimelineEntry.objects.filter(user=profile).filter(Q(expires_at=None) | Q(expires_at__gt=now))
+
+
+def prune_expired():
+    """Delete entries whose grant has expired
+
+    Entries whose capsule is still shared with the user by another live
+    grant move over to that grant instead.
+
+    Returns:
+        int -- Number of entries deleted
+    """
+    expired = TimelineEntry.objects.filter(expires_at__lte=timezone.now())
+    return _refresh(expired.values_list("user_id", "capsule_id"))
+
+
+def _live_grants():
+    now = timezone.now()
+    return AccessControl.objects.filter(Q(expires_at=None) | Q(expires_at__gt=now))
+
+
+def _refresh(pairs, exclude=None):
+    """Point the shared entry of each (user id, capsule id) at its longest live grant
+
+    Entries without a live grant left are deleted. Creators' own entries,
+    which have no grant, are never touched. Every entry is dated by its
+    capsule's creation, like the ones written by add_created and by the
+    migration that filled the table.
+
+    Returns:
+        int -- Number of entries deleted
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return 0
+
+    grants = _live_grants().filter(
+        user_id__in={user_id for user_id, _ in pairs},
+        capsule_id__in={capsule_id for _, capsule_id in pairs},
+    )
+    if exclude is not None:
+        grants = grants.exclude(pk=exclude)
+
+    longest = {}
+    for grant in grants.order_by("id"):
+        pair = (grant.user_id, grant.capsule_id)
+        if pair in pairs and (pair not in longest or _lasts(grant) > _lasts(longest[pair])):
+            longest[pair] = grant
+
+    created_at = dict(
+        TimeCapsule.objects.filter(pk__in={capsule_id for _, capsule_id in longest}).values_list("id", "created_at")
+    )
+    TimelineEntry.objects.bulk_create([
+        TimelineEntry(
+            user_id=user_id,
+            capsule_id=capsule_id,
+            access_control=grant,
+            expires_at=grant.expires_at,
+            created_at=created_at[capsule_id],
+        )
+        for (user_id, capsule_id), grant in longest.items()
+        if capsule_id in created_at
+    ], ignore_conflicts=True)
+
+    shared = TimelineEntry.objects.exclude(access_control=None)
+    for (user_id, capsule_id), grant in longest.items():
+        shared.filter(user_id=user_id, capsule_id=capsule_id).exclude(
+            access_control=grant, expires_at=grant.expires_at
+        ).update(access_control=grant, expires_at=grant.expires_at)
+
+    deleted = 0
+    for user_id, capsule_id in pairs.difference(longest):
+        deleted += shared.filter(user_id=user_id, capsule_id=capsule_id).delete()[0]
+    return deleted
+
+
+def _lasts(grant):
+    return grant.expires_at or _FOREVER
@@ -1,4 +1,5 @@
 from .auth import register_user, login_user
+from .comment_stream import comment_stream
 from .timecapsule_view import CapsuleView
 from .capsulestatus_view import CapsuleStatusView
 from .capsuletype_view import CapsuleTypeView
@@ -3,6 +3,7 @@ from rest_framework import serializers, status
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
 from timecapsuleapi.models import CapsuleStatus
+from timecapsuleapi import registry
 
 
 class CapsuleStatusView(ViewSet):
@@ -16,7 +17,7 @@ class CapsuleStatusView(ViewSet):
             Response -- JSON serialized array
         """
         try:
-            capsule_statuss = CapsuleStatus.objects.all()
+            capsule_statuss = registry.capsule_statuses.all()
             serializer = CapsuleStatusSerializer(capsule_statuss, many=True)
             return Response(serializer.data, status=status.HTTP_200_OK)
         except Exception as ex:
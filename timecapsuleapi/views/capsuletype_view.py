@@ -3,6 +3,7 @@ from rest_framework import serializers, status
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
 from timecapsuleapi.models import TimeCapsule, UserProfile, CapsuleStatus, CapsuleType
+from timecapsuleapi import registry
 
 
 class CapsuleTypeView(ViewSet):
@@ -16,7 +17,7 @@ class CapsuleTypeView(ViewSet):
             Response -- JSON serialized array
         """
         try:
-            capsule_types = CapsuleType.objects.all()
+            capsule_types = registry.capsule_types.all()
             serializer = CapsuleTypeSerializer(capsule_types, many=True)
             return Response(serializer.data, status=status.HTTP_200_OK)
         except Exception as ex:
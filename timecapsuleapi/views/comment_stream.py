@@ -0,0 +1,99 @@
+import asyncio
+import json
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.authtoken.models import Token
+from timecapsuleapi import comment_hub
+from timecapsuleapi.models import DiscussionComment, DiscussionThread
+
+
+@require_GET
+async def comment_stream(request, pk):
+    '''Streams new comments of a discussion thread as server-sent events
+
+    Every event carries the comment id as its SSE id. A reconnecting client
+    sends it back as the Last-Event-ID header (or ?last_event_id=) and first
+    receives every comment it missed. The API token goes in the
+    Authorization header. EventSource clients, which cannot set headers,
+    send ?ticket= from POST /discussionthreads/<id>/stream_ticket instead,
+    so the API token never appears in a URL.
+
+    The stream never ends on its own, so it is only served over ASGI. A
+    WSGI worker would be held by one reader for as long as it stays
+    connected.
+
+    Method arguments:
+      request -- The full HTTP request object
+      pk -- Discussion thread id
+    '''
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"reason": "Comment streams are only served over ASGI"}, status=501)
+
+    if not await _authenticated(request, pk):
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+
+    if not await DiscussionThread.objects.filter(pk=pk).aexists():
+        return JsonResponse({"reason": "Invalid thread id sent"}, status=404)
+
+    try:
+        last_event_id = int(request.headers.get("Last-Event-ID") or request.GET.get("last_event_id") or 0)
+    except ValueError:
+        return JsonResponse({"reason": "Invalid last event id"}, status=400)
+
+    response = StreamingHttpResponse(_events(pk, last_event_id), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+async def _authenticated(request, thread_id):
+    header = request.headers.get("Authorization", "")
+    if header.startswith("Token "):
+        return await Token.objects.filter(key=header[len("Token "):], user__is_active=True).aexists()
+
+    user_id = comment_hub.ticket_user_id(request.GET.get("ticket", ""), thread_id)
+    if user_id is None:
+        return False
+    return await User.objects.filter(pk=user_id, is_active=True).aexists()
+
+
+async def _events(thread_id, last_event_id):
+    # Subscribe before replaying so nothing created in between is lost;
+    # comments seen in both are skipped by id
+    subscription = comment_hub.subscribe(thread_id, settings.COMMENT_STREAM_QUEUE_SIZE)
+    try:
+        yield f"retry: {settings.COMMENT_STREAM_RETRY_MS}\n\n"
+
+        page_size = settings.API_MAX_PAGE_SIZE
+        while True:
+            missed = DiscussionComment.objects.filter(thread_id=thread_id, id__gt=last_event_id).order_by("id")
+            page = await sync_to_async(list)(missed[:page_size])
+            for comment in page:
+                last_event_id = comment.id
+                yield _format(comment_hub.comment_event(comment))
+            if len(page) < page_size:
+                break
+
+        while True:
+            try:
+                event = await subscription.get(settings.COMMENT_STREAM_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+
+            if event is None:
+                # Fell too far behind; the client reconnects from last_event_id
+                return
+            if event["id"] > last_event_id:
+                last_event_id = event["id"]
+                yield _format(event)
+    finally:
+        comment_hub.unsubscribe(subscription)
+
+
+def _format(event):
+    return f"id: {event['id']}\nevent: comment\ndata: {json.dumps(event)}\n\n"
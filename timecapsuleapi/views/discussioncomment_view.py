@@ -1,9 +1,15 @@
 import logging
+import uuid
+from django.conf import settings
+from django.db import transaction
 from django.http import HttpResponseServerError
 from rest_framework import serializers, status
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
-from timecapsuleapi.models import DiscussionComment, DiscussionThread, UserProfile
+from rest_framework.decorators import action
+from timecapsuleapi.models import DiscussionComment, DiscussionThread, QueuedComment
+from timecapsuleapi import buffers, comment_hub, counters, hotness
+from timecapsuleapi.pagination import KeysetPagination, InvalidCursor, InvalidDelta, created_after, list_etag, not_modified
 
 logger = logging.getLogger(__name__)
 
@@ -29,13 +35,29 @@ class DiscussionCommentView(ViewSet):
             )
 
         # Set the author to the authenticated user
-        authenticated_user_profile = UserProfile.objects.get(user=request.auth.user)
-        discussion_comment.author = authenticated_user_profile
+        authenticated_user_profile = request.profile
+        discussion_comment.author_id = authenticated_user_profile.id
 
         discussion_comment.content = request.data["content"]
 
         try:
-            discussion_comment.save()
+            if settings.COMMENT_WRITE_BEHIND:
+                # Stage the comment and acknowledge it; the comment buffer's
+                # writer turns it into a DiscussionComment shortly
+                queued = QueuedComment.objects.create(
+                    ingest_key=uuid.uuid4(),
+                    thread_id=discussion_comment.thread_id,
+                    author_id=discussion_comment.author_id,
+                    content=discussion_comment.content,
+                )
+                buffers.comments.add(queued.pk)
+                return Response(_queued_comment(queued), status=status.HTTP_202_ACCEPTED)
+
+            with transaction.atomic():
+                discussion_comment.save()
+                hotness.comment_added(discussion_comment.thread_id, discussion_comment.created_at)
+            event = comment_hub.comment_event(discussion_comment)
+            transaction.on_commit(lambda: comment_hub.publish(event["thread"], event))
             serializer = DiscussionCommentSerializer(discussion_comment, many=False)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         except Exception as ex:
@@ -66,13 +88,15 @@ class DiscussionCommentView(ViewSet):
             discussion_comment = DiscussionComment.objects.get(pk=pk)
 
             # Check if the authenticated user is the author of the comment
-            authenticated_user_profile = UserProfile.objects.get(user=request.auth.user)
-            if discussion_comment.author.id != authenticated_user_profile.id:
+            authenticated_user_profile = request.profile
+            if discussion_comment.author_id != authenticated_user_profile.id:
                 return Response(
                     {"reason": "You are not authorized to update this comment"},
                     status=status.HTTP_403_FORBIDDEN,
                 )
 
+            previous_thread_id = discussion_comment.thread_id
+
             # If thread is provided, update it
             if "thread" in request.data:
                 try:
@@ -85,7 +109,15 @@ class DiscussionCommentView(ViewSet):
                     )
 
             discussion_comment.content = request.data["content"]
-            discussion_comment.save()
+
+            with transaction.atomic():
+                discussion_comment.save()
+                if discussion_comment.thread_id != previous_thread_id:
+                    counters.adjust(DiscussionThread, previous_thread_id, "comment_count", -1)
+                    counters.adjust(DiscussionThread, discussion_comment.thread_id, "comment_count", 1)
+                    hotness.comment_removed(previous_thread_id, discussion_comment.created_at)
+                    hotness.comment_added(discussion_comment.thread_id, discussion_comment.created_at)
+
             return Response(None, status=status.HTTP_204_NO_CONTENT)
 
         except DiscussionComment.DoesNotExist:
@@ -107,14 +139,16 @@ class DiscussionCommentView(ViewSet):
             discussion_comment = DiscussionComment.objects.get(pk=pk)
 
             # Check if the authenticated user is the author of the comment
-            authenticated_user_profile = UserProfile.objects.get(user=request.auth.user)
-            if discussion_comment.author.id != authenticated_user_profile.id:
+            authenticated_user_profile = request.profile
+            if discussion_comment.author_id != authenticated_user_profile.id:
                 return Response(
                     {"reason": "You are not authorized to delete this comment"},
                     status=status.HTTP_403_FORBIDDEN,
                 )
 
-            discussion_comment.delete()
+            with transaction.atomic():
+                discussion_comment.delete()
+                hotness.comment_removed(discussion_comment.thread_id, discussion_comment.created_at)
             return Response(None, status=status.HTTP_204_NO_CONTENT)
 
         except DiscussionComment.DoesNotExist as ex:
@@ -138,7 +172,7 @@ class DiscussionCommentView(ViewSet):
             # Filter by author if provided
             author_id = request.query_params.get('author', None)
 
-            discussion_comments = DiscussionComment.objects.all().order_by('created_at')
+            discussion_comments = DiscussionComment.objects.select_related("thread", "author")
 
             if thread_id:
                 discussion_comments = discussion_comments.filter(thread__id=thread_id)
@@ -146,12 +180,79 @@ class DiscussionCommentView(ViewSet):
             if author_id:
                 discussion_comments = discussion_comments.filter(author__id=author_id)
 
+            # ?after_id= / ?since= return only newer rows, oldest first
+            discussion_comments, _ = created_after(discussion_comments, request)
+
+            paginator = KeysetPagination(descending=False)
+            # A client that still holds this page revalidates with If-None-Match
+            etag = list_etag(discussion_comments)
+            response = not_modified(request, etag)
+            if response is not None:
+                return response
+
+            discussion_comments = paginator.paginate_queryset(discussion_comments, request)
             serializer = DiscussionCommentSerializer(discussion_comments, many=True)
+            response = paginator.get_paginated_response(serializer.data)
+            response["ETag"] = etag
+            return response
+        except InvalidCursor:
+            return Response({"reason": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+        except InvalidDelta as ex:
+            return Response({"reason": str(ex)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as ex:
+            return HttpResponseServerError(ex)
+
+    @action(detail=False, methods=['get'], url_path=r'ingested/(?P<ingest_id>[0-9a-fA-F-]+)')
+    def ingested(self, request, ingest_id=None):
+        """Handle GET requests for a comment accepted by the write-behind queue
+
+        Works from any worker, since accepted comments are staged in the
+        database.
+
+        Returns:
+            Response -- JSON serialized comment once committed, the accepted
+            comment with pending true before that or with failed true if it
+            could not be written, or 404
+        """
+        try:
+            try:
+                ingest_key = uuid.UUID(ingest_id)
+            except ValueError:
+                return Response({"reason": "Invalid ingest id"}, status=status.HTTP_400_BAD_REQUEST)
+
+            # The queue is checked first: a comment leaves it in the same
+            # transaction that creates it, so it is always in one of the two
+            queued = QueuedComment.objects.filter(ingest_key=ingest_key).first()
+            if queued is not None:
+                return Response(_queued_comment(queued), status=status.HTTP_200_OK)
+
+            discussion_comment = DiscussionComment.objects.select_related("thread", "author").get(
+                ingest_key=ingest_key
+            )
+            serializer = DiscussionCommentSerializer(discussion_comment)
             return Response(serializer.data, status=status.HTTP_200_OK)
+        except DiscussionComment.DoesNotExist:
+            return Response(None, status=status.HTTP_404_NOT_FOUND)
         except Exception as ex:
             return HttpResponseServerError(ex)
 
 
+def _queued_comment(queued):
+    """What a client sees of a staged comment before it has an id"""
+    data = {
+        "id": None,
+        "ingest_id": str(queued.ingest_key),
+        "thread": queued.thread_id,
+        "content": queued.content,
+        "author": queued.author_id,
+        "pending": queued.failed_at is None,
+        "failed": queued.failed_at is not None,
+    }
+    if queued.failed_at is not None:
+        data["reason"] = queued.error
+    return data
+
+
 class DiscussionCommentSerializer(serializers.ModelSerializer):
     """JSON serializer for discussion comments"""
 
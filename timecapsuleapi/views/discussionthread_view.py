@@ -1,9 +1,15 @@
 import logging
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
 from django.http import HttpResponseServerError
 from rest_framework import serializers, status
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
-from timecapsuleapi.models import DiscussionThread, TimeCapsule, UserProfile
+from rest_framework.decorators import action
+from timecapsuleapi.models import DiscussionThread, TimeCapsule
+from timecapsuleapi import comment_hub, counters
+from timecapsuleapi.pagination import KeysetPagination, InvalidCursor, InvalidDelta, created_after, list_etag, not_modified
 
 logger = logging.getLogger(__name__)
 
@@ -29,8 +35,8 @@ class DiscussionThreadView(ViewSet):
             )
 
         # Set the created_by to the authenticated user
-        authenticated_user_profile = UserProfile.objects.get(user=request.auth.user)
-        discussion_thread.created_by = authenticated_user_profile
+        authenticated_user_profile = request.profile
+        discussion_thread.created_by_id = authenticated_user_profile.id
 
         discussion_thread.title = request.data["title"]
 
@@ -66,13 +72,15 @@ class DiscussionThreadView(ViewSet):
             discussion_thread = DiscussionThread.objects.get(pk=pk)
 
             # Check if the authenticated user is the creator of the thread
-            authenticated_user_profile = UserProfile.objects.get(user=request.auth.user)
-            if discussion_thread.created_by.id != authenticated_user_profile.id:
+            authenticated_user_profile = request.profile
+            if discussion_thread.created_by_id != authenticated_user_profile.id:
                 return Response(
                     {"reason": "You are not authorized to update this thread"},
                     status=status.HTTP_403_FORBIDDEN,
                 )
 
+            previous_capsule_id = discussion_thread.capsule_id
+
             # If capsule is provided, update it
             if "capsule" in request.data:
                 try:
@@ -85,7 +93,13 @@ class DiscussionThreadView(ViewSet):
                     )
 
             discussion_thread.title = request.data["title"]
-            discussion_thread.save()
+
+            with transaction.atomic():
+                discussion_thread.save()
+                if discussion_thread.capsule_id != previous_capsule_id:
+                    counters.adjust(TimeCapsule, previous_capsule_id, "discussion_count", -1)
+                    counters.adjust(TimeCapsule, discussion_thread.capsule_id, "discussion_count", 1)
+
             return Response(None, status=status.HTTP_204_NO_CONTENT)
 
         except DiscussionThread.DoesNotExist:
@@ -107,8 +121,8 @@ class DiscussionThreadView(ViewSet):
             discussion_thread = DiscussionThread.objects.get(pk=pk)
 
             # Check if the authenticated user is the creator of the thread
-            authenticated_user_profile = UserProfile.objects.get(user=request.auth.user)
-            if discussion_thread.created_by.id != authenticated_user_profile.id:
+            authenticated_user_profile = request.profile
+            if discussion_thread.created_by_id != authenticated_user_profile.id:
                 return Response(
                     {"reason": "You are not authorized to delete this thread"},
                     status=status.HTTP_403_FORBIDDEN,
@@ -138,7 +152,7 @@ class DiscussionThreadView(ViewSet):
             # Filter by created_by if provided
             created_by_id = request.query_params.get('created_by', None)
 
-            discussion_threads = DiscussionThread.objects.all().order_by('-created_at')
+            discussion_threads = DiscussionThread.objects.select_related("capsule", "created_by")
 
             if capsule_id:
                 discussion_threads = discussion_threads.filter(capsule__id=capsule_id)
@@ -146,19 +160,69 @@ class DiscussionThreadView(ViewSet):
             if created_by_id:
                 discussion_threads = discussion_threads.filter(created_by__id=created_by_id)
 
+            # ?after_id= / ?since= return only newer rows, oldest first
+            discussion_threads, delta = created_after(discussion_threads, request)
+
+            # Newest first by default, ?ordering=hot or active walk the
+            # hot_score or last_comment_at index instead
+            ordering = request.query_params.get('ordering', None)
+            if delta or not ordering or ordering == 'new':
+                paginator = KeysetPagination(descending=not delta)
+            elif ordering == 'hot':
+                paginator = KeysetPagination(field="hot_score", parse=float)
+            elif ordering == 'active':
+                paginator = KeysetPagination(field="last_comment_at")
+            else:
+                return Response(
+                    {"reason": "ordering must be one of: new, hot, active"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            # A client that still holds this page revalidates with If-None-Match
+            etag = list_etag(discussion_threads, comments=Sum("comment_count"))
+            response = not_modified(request, etag)
+            if response is not None:
+                return response
+
+            discussion_threads = paginator.paginate_queryset(discussion_threads, request)
             serializer = DiscussionThreadSerializer(discussion_threads, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            response = paginator.get_paginated_response(serializer.data)
+            response["ETag"] = etag
+            return response
+        except InvalidCursor:
+            return Response({"reason": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+        except InvalidDelta as ex:
+            return Response({"reason": str(ex)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as ex:
             return HttpResponseServerError(ex)
 
+    @action(detail=True, methods=['post'])
+    def stream_ticket(self, request, pk=None):
+        """Handle POST requests for a ticket to GET /discussionthreads/<id>/stream
 
-class DiscussionThreadSerializer(serializers.ModelSerializer):
-    """JSON serializer for discussion threads"""
+        Browsers' EventSource cannot send the Authorization header, so they
+        pass this short-lived ticket as ?ticket= instead of the API token.
+
+        Returns:
+            Response -- JSON with the ticket and the seconds it stays valid
+        """
+        try:
+            if not DiscussionThread.objects.filter(pk=pk).exists():
+                return Response(
+                    {"reason": "Invalid thread id sent"},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+
+            ticket = comment_hub.stream_ticket(request.user.pk, int(pk))
+            return Response(
+                {"ticket": ticket, "expires_in": settings.COMMENT_STREAM_TICKET_SECONDS},
+                status=status.HTTP_201_CREATED,
+            )
+        except Exception as ex:
+            return HttpResponseServerError(ex)
 
-    comment_count = serializers.SerializerMethodField()
 
-    def get_comment_count(self, obj):
-        return obj.comments.count()
+class DiscussionThreadSerializer(serializers.ModelSerializer):
+    """JSON serializer for discussion threads"""
 
     class Meta:
         model = DiscussionThread
@@ -169,5 +233,7 @@ class DiscussionThreadSerializer(serializers.ModelSerializer):
             "created_by",
             "created_at",
             "comment_count",
+            "last_comment_at",
+            "hot_score",
         )
         depth = 1
\ No newline at end of file
@@ -1,10 +1,22 @@
 import logging
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
 from django.http import HttpResponseServerError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework import serializers, status
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
 from rest_framework.decorators import action
-from timecapsuleapi.models import Prediction, TimeCapsuleContent, VerificationStatus, UserProfile
+from timecapsuleapi.models import (
+    Prediction, TimeCapsuleContent, VerificationStatus, UserProfile, PredictionRollup,
+    PredictionCategoryDay, PredictionVerifierDay
+)
+from timecapsuleapi.pagination import KeysetPagination, InvalidCursor
+from timecapsuleapi import accuracy, achievements, counters, registry, rollups, similarity, stats_cache
 
 logger = logging.getLogger(__name__)
 
@@ -31,7 +43,7 @@ class PredictionView(ViewSet):
 
         try:
             # Default to 'pending' verification status
-            verification_status = VerificationStatus.objects.get(name="pending")
+            verification_status = registry.verification_statuses.get_by_name("pending")
             prediction.verification_status = verification_status
         except VerificationStatus.DoesNotExist:
             return Response(
@@ -45,7 +57,11 @@ class PredictionView(ViewSet):
             prediction.category = request.data["category"]
 
         try:
-            prediction.save()
+            with transaction.atomic():
+                prediction.save()
+                # Groups the prediction with an existing near-duplicate, which
+                # the response reports as duplicate_of
+                similarity.index(prediction)
             serializer = PredictionSerializer(prediction, many=False)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         except Exception as ex:
@@ -74,6 +90,9 @@ class PredictionView(ViewSet):
         """
         try:
             prediction = Prediction.objects.get(pk=pk)
+            previous_category = prediction.category
+            previous_contribution = accuracy.prediction_contribution(prediction)
+            previous_text = prediction.prediction_text
 
             # If capsule_content is provided, update it
             if "capsule_content" in request.data:
@@ -91,7 +110,17 @@ class PredictionView(ViewSet):
             if "category" in request.data:
                 prediction.category = request.data["category"]
 
-            prediction.save()
+            with transaction.atomic():
+                prediction.save()
+                rollups.move(
+                    (previous_category, prediction.verification_status_id),
+                    (prediction.category, prediction.verification_status_id),
+                )
+                accuracy.move(previous_contribution, accuracy.prediction_contribution(prediction))
+                if prediction.prediction_text != previous_text:
+                    similarity.detach(prediction)
+                    similarity.index(prediction)
+
             return Response(None, status=status.HTTP_204_NO_CONTENT)
 
         except Prediction.DoesNotExist:
@@ -149,8 +178,12 @@ class PredictionView(ViewSet):
             if category:
                 predictions = predictions.filter(category=category)
 
+            paginator = KeysetPagination()
+            predictions = paginator.paginate_queryset(predictions, request)
             serializer = PredictionSerializer(predictions, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return paginator.get_paginated_response(serializer.data)
+        except InvalidCursor:
+            return Response({"reason": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as ex:
             return HttpResponseServerError(ex)
 
@@ -163,11 +196,14 @@ class PredictionView(ViewSet):
         """
         try:
             prediction = Prediction.objects.get(pk=pk)
+            previous_verifier_id = prediction.verification_user_id
+            previous_status_id = prediction.verification_status_id
+            previous_contribution = accuracy.prediction_contribution(prediction)
 
             # Get the verification status
             try:
                 verification_status_id = request.data["verification_status"]
-                verification_status = VerificationStatus.objects.get(pk=verification_status_id)
+                verification_status = registry.verification_statuses.get(verification_status_id)
                 prediction.verification_status = verification_status
             except VerificationStatus.DoesNotExist:
                 return Response(
@@ -176,14 +212,25 @@ class PredictionView(ViewSet):
                 )
 
             # Set the verification user to the authenticated user
-            authenticated_user_profile = UserProfile.objects.get(user=request.auth.user)
-            prediction.verification_user = authenticated_user_profile
+            authenticated_user_profile = request.profile
+            prediction.verification_user_id = authenticated_user_profile.id
 
-            # Set the verification date to now (handled by model save)
-            from django.utils import timezone
+            # Set the verification date to now
             prediction.verification_date = timezone.now()
 
-            prediction.save()
+            with transaction.atomic():
+                prediction.save()
+                rollups.move(
+                    (prediction.category, previous_status_id),
+                    (prediction.category, prediction.verification_status_id),
+                )
+                accuracy.move(previous_contribution, accuracy.prediction_contribution(prediction))
+                if previous_verifier_id != authenticated_user_profile.id:
+                    counters.adjust(UserProfile, previous_verifier_id, "verified_predictions_count", -1)
+                    counters.adjust(UserProfile, authenticated_user_profile.id, "verified_predictions_count", 1)
+                    stats_cache.invalidate(previous_verifier_id)
+                    achievements.award(authenticated_user_profile.id, "predictions_verified", prediction.verification_date)
+
             return Response(None, status=status.HTTP_204_NO_CONTENT)
 
         except Prediction.DoesNotExist:
@@ -195,6 +242,182 @@ class PredictionView(ViewSet):
             )
             return HttpResponseServerError(ex)
 
+    @action(detail=False, methods=['post'])
+    def verify_bulk(self, request):
+        """Handle verification of many predictions with one status
+
+        Expects {"ids": [...], "verification_status": id}. All predictions
+        are updated with a single UPDATE inside one transaction.
+
+        Returns:
+            Response -- JSON with the updated and the missing ids
+        """
+        if not isinstance(request.data, dict):
+            return Response(
+                {"reason": "Expected an object with ids and verification_status"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        ids = request.data.get("ids", None)
+        if not isinstance(ids, list) or not ids:
+            return Response(
+                {"reason": "Expected a non-empty array of prediction ids"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if len(ids) > settings.API_MAX_BATCH_SIZE:
+            return Response(
+                {"reason": f"At most {settings.API_MAX_BATCH_SIZE} predictions can be verified at once"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            ids = [int(pk) for pk in ids]
+        except (TypeError, ValueError):
+            return Response(
+                {"reason": "Prediction ids must be integers"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            verification_status = registry.verification_statuses.get(request.data.get("verification_status"))
+        except VerificationStatus.DoesNotExist:
+            return Response(
+                {"reason": "Invalid verification status id sent"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        try:
+            authenticated_user_profile = request.profile
+            verification_date = timezone.now()
+
+            with transaction.atomic():
+                # The previous values are needed to keep counters and rollups exact
+                previous = list(
+                    Prediction.objects.filter(pk__in=ids)
+                    .values_list("id", "category", "verification_status", "verification_user", "verification_date")
+                )
+                found = [row[0] for row in previous]
+
+                Prediction.objects.filter(pk__in=found).update(
+                    verification_status=verification_status,
+                    verification_user=authenticated_user_profile,
+                    verification_date=verification_date,
+                )
+
+                moved = {}
+                taken_over = {}
+                accuracy_changes = Counter()
+                for _, category, previous_status_id, previous_verifier_id, previous_date in previous:
+                    key = (category, previous_status_id)
+                    moved[key] = moved.get(key, 0) + 1
+                    if previous_verifier_id != authenticated_user_profile.id:
+                        taken_over[previous_verifier_id] = taken_over.get(previous_verifier_id, 0) + 1
+
+                    previous_contribution = accuracy.contribution(
+                        category, previous_status_id, previous_verifier_id, previous_date
+                    )
+                    current_contribution = accuracy.contribution(
+                        category, verification_status.id, authenticated_user_profile.id, verification_date
+                    )
+                    if previous_contribution is not None:
+                        accuracy_changes[previous_contribution] -= 1
+                    if current_contribution is not None:
+                        accuracy_changes[current_contribution] += 1
+
+                for (category, previous_status_id), count in moved.items():
+                    if previous_status_id != verification_status.id:
+                        rollups.adjust(category, previous_status_id, -count)
+                        rollups.adjust(category, verification_status.id, count)
+
+                for previous_verifier_id, count in taken_over.items():
+                    counters.adjust(UserProfile, previous_verifier_id, "verified_predictions_count", -count)
+                counters.adjust(
+                    UserProfile, authenticated_user_profile.id, "verified_predictions_count", sum(taken_over.values())
+                )
+                accuracy.apply(accuracy_changes)
+
+            stats_cache.invalidate(authenticated_user_profile.id, *taken_over)
+            if taken_over:
+                achievements.award(authenticated_user_profile.id, "predictions_verified", verification_date)
+
+            found_ids = set(found)
+            return Response({
+                "updated": found,
+                "missing": [pk for pk in ids if pk not in found_ids],
+            }, status=status.HTTP_200_OK)
+        except Exception as ex:
+            logger.error(
+                f"Error bulk verifying Predictions: {str(ex)}",
+                exc_info=True,
+            )
+            return HttpResponseServerError(ex)
+
+    @action(detail=False, methods=['get'])
+    def similar(self, request):
+        """List clusters of near-duplicate predictions, largest first
+
+        Each cluster is its representative (the oldest prediction) plus the
+        ids of every member, ready to send to POST /predictions/verify_bulk.
+        Query parameters: verification_status to only count members in that
+        status, and limit.
+
+        Returns:
+            Response -- JSON array of clusters
+        """
+        try:
+            try:
+                limit = int(request.query_params.get("limit", 20))
+            except ValueError:
+                return Response({"reason": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+            limit = min(max(limit, 1), settings.API_MAX_PAGE_SIZE)
+
+            duplicates = Prediction.objects.exclude(duplicate_of=None)
+            verification_status_id = request.query_params.get("verification_status", None)
+            if verification_status_id:
+                try:
+                    verification_status_id = int(verification_status_id)
+                except ValueError:
+                    return Response(
+                        {"reason": "verification_status must be an integer"},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+                duplicates = duplicates.filter(verification_status_id=verification_status_id)
+
+            largest = list(
+                duplicates.values("duplicate_of")
+                .annotate(size=Count("id"))
+                .order_by("-size", "duplicate_of")
+                .values_list("duplicate_of", flat=True)[:limit]
+            )
+
+            representatives = Prediction.objects.select_related(
+                "capsule_content", "verification_status", "verification_user"
+            ).in_bulk(largest)
+            members = {representative_id: [representative_id] for representative_id in largest}
+            for representative_id, pk in (
+                duplicates.filter(duplicate_of__in=largest).order_by("id").values_list("duplicate_of", "id")
+            ):
+                members[representative_id].append(pk)
+
+            clusters = [
+                {
+                    "representative": PredictionSerializer(representatives[representative_id]).data,
+                    "size": len(members[representative_id]),
+                    "ids": members[representative_id],
+                }
+                for representative_id in largest
+                if representative_id in representatives
+            ]
+
+            return Response(clusters, status=status.HTTP_200_OK)
+        except Exception as ex:
+            logger.error(
+                f"Error listing similar predictions: {str(ex)}",
+                exc_info=True,
+            )
+            return HttpResponseServerError(ex)
+
     @action(detail=False, methods=['get'])
     def statistics(self, request):
         """Get statistics about predictions
@@ -203,46 +426,40 @@ class PredictionView(ViewSet):
             Response -- JSON with statistics
         """
         try:
-            # Count predictions by verification status
-            verification_stats = {}
-            verification_statuses = VerificationStatus.objects.all()
-
-            for vs in verification_statuses:
-                count = Prediction.objects.filter(verification_status=vs).count()
-                verification_stats[vs.name] = count
+            # Everything below comes from the rollup table, one row per
+            # (category, verification status) pair
+            rows = PredictionRollup.objects.values_list("category", "verification_status", "count")
 
-            # Count predictions by category
+            verification_stats = {vs.name: 0 for vs in registry.verification_statuses.all()}
             category_stats = {}
-            categories = Prediction.objects.values_list('category', flat=True).distinct()
 
-            for category in categories:
-                if category:  # Skip None values
-                    count = Prediction.objects.filter(category=category).count()
-                    category_stats[category] = count
+            for category, verification_status_id, count in rows:
+                try:
+                    verification_status = registry.verification_statuses.get(verification_status_id)
+                    verification_stats[verification_status.name] += count
+                except VerificationStatus.DoesNotExist:
+                    pass
+
+                if category:  # Skip predictions without a category
+                    category_stats[category] = category_stats.get(category, 0) + count
+
+            category_stats = {category: count for category, count in category_stats.items() if count}
 
             # Overall accuracy (verified / total verified+disproved)
-            try:
-                verified = Prediction.objects.filter(verification_status__name="verified").count()
-                disproved = Prediction.objects.filter(verification_status__name="disproved").count()
-                total = verified + disproved
-
-                accuracy = 0
-                if total > 0:
-                    accuracy = (verified / total) * 100
-
-                accuracy_stats = {
-                    "verified": verified,
-                    "disproved": disproved,
-                    "total_verified": total,
-                    "accuracy_percentage": accuracy
-                }
-            except:
-                accuracy_stats = {
-                    "verified": 0,
-                    "disproved": 0,
-                    "total_verified": 0,
-                    "accuracy_percentage": 0
-                }
+            verified = verification_stats.get("verified", 0)
+            disproved = verification_stats.get("disproved", 0)
+            total = verified + disproved
+
+            accuracy_rate = 0
+            if total > 0:
+                accuracy_rate = (verified / total) * 100
+
+            accuracy_stats = {
+                "verified": verified,
+                "disproved": disproved,
+                "total_verified": total,
+                "accuracy_percentage": accuracy_rate
+            }
 
             statistics = {
                 "verification_stats": verification_stats,
@@ -258,10 +475,166 @@ class PredictionView(ViewSet):
             )
             return HttpResponseServerError(ex)
 
+    @action(detail=False, methods=['get'])
+    def leaderboard(self, request):
+        """Rank verifiers or categories by prediction accuracy
+
+        Query parameters: by (verifier or category), start and end dates
+        (YYYY-MM-DD, default the last year) and limit.
+
+        Returns:
+            Response -- JSON array ordered by accuracy, best first
+        """
+        try:
+            by = request.query_params.get("by", "verifier")
+            if by not in LEADERBOARD_GROUPS:
+                return Response(
+                    {"reason": f"by must be one of: {', '.join(LEADERBOARD_GROUPS)}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            try:
+                start, end = _date_range(request)
+                limit = int(request.query_params.get("limit", 10))
+            except ValueError as ex:
+                return Response({"reason": str(ex)}, status=status.HTTP_400_BAD_REQUEST)
+            limit = min(max(limit, 1), settings.API_MAX_PAGE_SIZE)
+
+            model, field = LEADERBOARD_GROUPS[by]
+            rows = (
+                model.objects.filter(day__range=(start, end))
+                .values(field)
+                .annotate(verified=Sum("verified"), disproved=Sum("disproved"))
+                .values_list(field, "verified", "disproved")
+            )
+
+            leaderboard = [
+                {by: key, **_accuracy_totals(verified, disproved)}
+                for key, verified, disproved in rows
+                if verified + disproved
+            ]
+            leaderboard.sort(key=lambda row: (-row["accuracy_percentage"], -row["total_verified"]))
+
+            return Response(leaderboard[:limit], status=status.HTTP_200_OK)
+        except Exception as ex:
+            logger.error(
+                f"Error getting prediction leaderboard: {str(ex)}",
+                exc_info=True,
+            )
+            return HttpResponseServerError(ex)
+
+    @action(detail=False, methods=['get'])
+    def timeseries(self, request):
+        """Prediction accuracy over time
+
+        Query parameters: category or verifier to narrow the series,
+        interval (day or week), start and end dates (YYYY-MM-DD, default the
+        last year). Weeks start on Monday.
+
+        Returns:
+            Response -- JSON array of buckets, oldest first
+        """
+        try:
+            interval = request.query_params.get("interval", "day")
+            if interval not in ("day", "week"):
+                return Response({"reason": "interval must be day or week"}, status=status.HTTP_400_BAD_REQUEST)
+
+            try:
+                start, end = _date_range(request)
+            except ValueError as ex:
+                return Response({"reason": str(ex)}, status=status.HTTP_400_BAD_REQUEST)
+
+            verifier_id = request.query_params.get("verifier", None)
+            category = request.query_params.get("category", None)
+            if verifier_id:
+                try:
+                    verifier_id = int(verifier_id)
+                except ValueError:
+                    return Response({"reason": "verifier must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+            if verifier_id and category:
+                return Response(
+                    {"reason": "Filter by either category or verifier, not both"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            if verifier_id:
+                rows = PredictionVerifierDay.objects.filter(verification_user_id=verifier_id)
+            else:
+                rows = PredictionCategoryDay.objects.all()
+                if category is not None:
+                    rows = rows.filter(category=category)
+
+            rows = (
+                rows.filter(day__range=(start, end))
+                .values("day")
+                .annotate(verified=Sum("verified"), disproved=Sum("disproved"))
+                .values_list("day", "verified", "disproved")
+                .order_by("day")
+            )
+
+            buckets = {}
+            for day, verified, disproved in rows:
+                if interval == "week":
+                    day = day - timedelta(days=day.weekday())
+                bucket = buckets.setdefault(day, [0, 0])
+                bucket[0] += verified
+                bucket[1] += disproved
+
+            series = [
+                {"start": day, **_accuracy_totals(verified, disproved)}
+                for day, (verified, disproved) in buckets.items()
+            ]
+
+            return Response(series, status=status.HTTP_200_OK)
+        except Exception as ex:
+            logger.error(
+                f"Error getting prediction timeseries: {str(ex)}",
+                exc_info=True,
+            )
+            return HttpResponseServerError(ex)
+
+
+# Leaderboard grouping -> (daily rollup table, column to group on)
+LEADERBOARD_GROUPS = {
+    "verifier": (PredictionVerifierDay, "verification_user"),
+    "category": (PredictionCategoryDay, "category"),
+}
+
+
+def _date_range(request):
+    """Inclusive (start, end) dates from the query string, default the last year"""
+    end = request.query_params.get("end", None)
+    end = _parse_day(end, "end") if end else timezone.localdate()
+    start = request.query_params.get("start", None)
+    start = _parse_day(start, "start") if start else end - timedelta(days=364)
+
+    if start > end:
+        raise ValueError("start must not be after end")
+    return start, end
+
+
+def _parse_day(value, name):
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(f"{name} must be a date in YYYY-MM-DD format")
+    return day
+
+
+def _accuracy_totals(verified, disproved):
+    total = verified + disproved
+    return {
+        "verified": verified,
+        "disproved": disproved,
+        "total_verified": total,
+        "accuracy_percentage": (verified / total) * 100 if total else 0,
+    }
+
 
 class PredictionSerializer(serializers.ModelSerializer):
     """JSON serializer for predictions"""
 
+    duplicate_of = serializers.PrimaryKeyRelatedField(read_only=True)
+
     class Meta:
         model = Prediction
         fields = (
@@ -272,6 +645,7 @@ class PredictionSerializer(serializers.ModelSerializer):
             "verification_status",
             "verification_date",
             "verification_user",
+            "duplicate_of",
             "created_at",
         )
         depth = 1
\ No newline at end of file
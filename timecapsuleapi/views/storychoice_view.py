@@ -1,9 +1,13 @@
 import logging
 from django.http import HttpResponseServerError
+from django.utils import timezone
 from rest_framework import serializers, status
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
+from rest_framework.decorators import action
 from timecapsuleapi.models import StoryChoice, StoryNode
+from timecapsuleapi.pagination import KeysetPagination, InvalidCursor
+from timecapsuleapi import buffers, story_graph
 
 logger = logging.getLogger(__name__)
 
@@ -68,7 +72,8 @@ class StoryChoiceView(ViewSet):
             Response -- Empty body with 204 status code
         """
         try:
-            story_choice = StoryChoice.objects.get(pk=pk)
+            story_choice = StoryChoice.objects.select_related("node").get(pk=pk)
+            previous_content_id = story_choice.node.capsule_content_id
 
             # If node is provided, update it
             if "node" in request.data:
@@ -94,6 +99,8 @@ class StoryChoiceView(ViewSet):
 
             story_choice.choice_text = request.data["choice_text"]
             story_choice.save()
+            if story_choice.node.capsule_content_id != previous_content_id:
+                story_graph.invalidate(previous_content_id)
             return Response(None, status=status.HTTP_204_NO_CONTENT)
 
         except StoryChoice.DoesNotExist:
@@ -145,11 +152,34 @@ class StoryChoiceView(ViewSet):
             if next_node_id:
                 story_choices = story_choices.filter(next_node__id=next_node_id)
 
+            paginator = KeysetPagination(descending=False)
+            story_choices = paginator.paginate_queryset(story_choices, request)
             serializer = StoryChoiceSerializer(story_choices, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return paginator.get_paginated_response(serializer.data)
+        except InvalidCursor:
+            return Response({"reason": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as ex:
             return HttpResponseServerError(ex)
 
+    @action(detail=True, methods=['post'])
+    def record(self, request, pk=None):
+        """Handle POST requests recording that a reader took a story choice
+
+        Clicks are counted in memory and added to the daily totals in
+        batches, so they show up in story path analytics within seconds.
+
+        Returns:
+            Response -- Empty body with 202 status code
+        """
+        try:
+            if not StoryChoice.objects.filter(pk=pk).exists():
+                return Response(None, status=status.HTTP_404_NOT_FOUND)
+
+            buffers.story_choices.add((int(pk), timezone.localdate()))
+            return Response(None, status=status.HTTP_202_ACCEPTED)
+        except Exception as ex:
+            return Response({"reason": ex.args[0]}, status=status.HTTP_400_BAD_REQUEST)
+
 
 class StoryChoiceSerializer(serializers.ModelSerializer):
     """JSON serializer for story choices"""
@@ -1,9 +1,17 @@
 import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Sum
 from django.http import HttpResponseServerError
+from django.utils import timezone
 from rest_framework import serializers, status
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
-from timecapsuleapi.models import StoryNode, TimeCapsuleContent
+from rest_framework.decorators import action
+from timecapsuleapi.models import StoryChoiceDay, StoryNode, TimeCapsuleContent
+from timecapsuleapi.pagination import KeysetPagination, InvalidCursor
+from timecapsuleapi import story_analysis, story_graph, story_tree
+from timecapsuleapi.story_import import InvalidStory, import_story
 
 logger = logging.getLogger(__name__)
 
@@ -71,6 +79,7 @@ class StoryNodeView(ViewSet):
         """
         try:
             story_node = StoryNode.objects.get(pk=pk)
+            previous_content_id = story_node.capsule_content_id
 
             # If capsule_content is provided, update it
             if "capsule_content" in request.data:
@@ -94,11 +103,18 @@ class StoryNodeView(ViewSet):
                             {"reason": "Invalid parent node id sent"},
                             status=status.HTTP_404_NOT_FOUND,
                         )
+                    if story_tree.would_cycle(story_node.id, parent_node.id):
+                        return Response(
+                            {"reason": "A story node cannot be its own ancestor"},
+                            status=status.HTTP_400_BAD_REQUEST,
+                        )
                 else:
                     story_node.parent_node = None
 
             story_node.content = request.data["content"]
             story_node.save()
+            if story_node.capsule_content_id != previous_content_id:
+                story_graph.invalidate(previous_content_id)
             return Response(None, status=status.HTTP_204_NO_CONTENT)
 
         except StoryNode.DoesNotExist:
@@ -156,9 +172,263 @@ class StoryNodeView(ViewSet):
             if root_nodes and root_nodes.lower() == 'true':
                 story_nodes = story_nodes.filter(parent_node=None)
 
+            paginator = KeysetPagination(descending=False)
+            story_nodes = paginator.paginate_queryset(story_nodes, request)
             serializer = StoryNodeSerializer(story_nodes, many=True)
+            return paginator.get_paginated_response(serializer.data)
+        except InvalidCursor:
+            return Response({"reason": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as ex:
+            return HttpResponseServerError(ex)
+
+    @action(detail=False, methods=['get'])
+    def graph(self, request):
+        """Handle GET requests for the whole story graph of a capsule content
+
+        Served from the compiled graph cache while the story is unchanged.
+
+        Returns:
+            Response -- JSON with every node and every choice by id, plus
+            root and leaf node ids
+        """
+        try:
+            try:
+                capsule_content_id = int(request.query_params["capsule_content"])
+            except (KeyError, ValueError):
+                return Response(
+                    {"reason": "capsule_content query parameter is required"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            graph = story_graph.compiled(capsule_content_id)
+            if graph is None:
+                return Response(
+                    {"reason": "Invalid capsule content id sent"},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+
+            return Response(graph, status=status.HTTP_200_OK)
+        except Exception as ex:
+            logger.error(
+                f"Error loading story graph: {str(ex)}",
+                exc_info=True,
+            )
+            return HttpResponseServerError(ex)
+
+    @action(detail=False, methods=['get'])
+    def validate(self, request):
+        """Handle GET requests for the structural problems of a story
+
+        Reports loops, loops with no way out, nodes unreachable from a root,
+        dead ends, choices leading into another story and the longest path.
+
+        Returns:
+            Response -- JSON analysis, valid is false when readers can get
+            stuck or miss part of the story
+        """
+        try:
+            try:
+                capsule_content_id = int(request.query_params["capsule_content"])
+            except (KeyError, ValueError):
+                return Response(
+                    {"reason": "capsule_content query parameter is required"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            graph = story_graph.compiled(capsule_content_id)
+            if graph is None:
+                return Response(
+                    {"reason": "Invalid capsule content id sent"},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+
+            return Response(story_analysis.analyze(graph), status=status.HTTP_200_OK)
+        except Exception as ex:
+            logger.error(
+                f"Error validating story graph: {str(ex)}",
+                exc_info=True,
+            )
+            return HttpResponseServerError(ex)
+
+    @action(detail=False, methods=['get'])
+    def paths(self, request):
+        """Handle GET requests for the choices readers take through a story
+
+        Query parameters: capsule_content, days (how far back to count,
+        default 30, at most STORY_PATHS_MAX_DAYS) and limit for the popular
+        choices.
+
+        Returns:
+            Response -- JSON with the most taken choices and the nodes where
+            readers stop before reaching an ending
+        """
+        try:
+            try:
+                capsule_content_id = int(request.query_params["capsule_content"])
+                days = int(request.query_params.get("days", 30))
+                limit = int(request.query_params.get("limit", 20))
+            except (KeyError, ValueError):
+                return Response(
+                    {"reason": "capsule_content is required, days and limit must be integers"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            limit = min(max(limit, 1), settings.API_MAX_PAGE_SIZE)
+            days = min(max(days, 1), settings.STORY_PATHS_MAX_DAYS)
+
+            graph = story_graph.compiled(capsule_content_id)
+            if graph is None:
+                return Response(
+                    {"reason": "Invalid capsule content id sent"},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+
+            since = timezone.localdate() - timedelta(days=days - 1)
+            taken = dict(
+                StoryChoiceDay.objects.filter(choice__node__capsule_content_id=capsule_content_id, day__gte=since)
+                .values("choice")
+                .annotate(total=Sum("count"))
+                .values_list("choice", "total")
+            )
+
+            arrivals = {}
+            departures = {}
+            for choice in graph["choices"]:
+                count = taken.get(choice["id"], 0)
+                departures[choice["node"]] = departures.get(choice["node"], 0) + count
+                arrivals[choice["next_node"]] = arrivals.get(choice["next_node"], 0) + count
+
+            popular = sorted(
+                (choice for choice in graph["choices"] if taken.get(choice["id"])),
+                key=lambda choice: (-taken[choice["id"]], choice["id"]),
+            )[:limit]
+
+            # Readers reaching a node with choices and not taking any of them
+            # dropped off there. Leaves are endings, not drop-offs.
+            drop_off = [
+                {
+                    "node": node_id,
+                    "arrivals": arrived,
+                    "departures": departures[node_id],
+                    "drop_off_rate": max(arrived - departures[node_id], 0) / arrived * 100,
+                }
+                for node_id, arrived in arrivals.items()
+                if arrived and node_id in departures
+            ]
+            drop_off.sort(key=lambda node: (-node["drop_off_rate"], -node["arrivals"], node["node"]))
+
+            return Response({
+                "capsule_content": capsule_content_id,
+                "since": since,
+                "total": sum(taken.values()),
+                "choices": [
+                    {
+                        **choice,
+                        "count": taken[choice["id"]],
+                        "share": taken[choice["id"]] / departures[choice["node"]] * 100,
+                    }
+                    for choice in popular
+                ],
+                "drop_off": drop_off[:limit],
+            }, status=status.HTTP_200_OK)
+        except Exception as ex:
+            logger.error(
+                f"Error getting story paths: {str(ex)}",
+                exc_info=True,
+            )
+            return HttpResponseServerError(ex)
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_graph(self, request):
+        """Handle POST requests that create a whole story at once
+
+        The body names the capsule_content and lists nodes and choices, each
+        with a temporary id. Nodes point at their parent_node and choices at
+        their node and next_node by those temporary ids. Nothing is created
+        unless the whole document is valid.
+
+        Returns:
+            Response -- JSON with the new database ids by temporary id
+        """
+        document = request.data
+        if not isinstance(document, dict):
+            return Response({"reason": "Expected a story object"}, status=status.HTTP_400_BAD_REQUEST)
+
+        for key in ("nodes", "choices"):
+            items = document.get(key)
+            if isinstance(items, list) and len(items) > settings.STORY_IMPORT_MAX_SIZE:
+                return Response(
+                    {"reason": f"At most {settings.STORY_IMPORT_MAX_SIZE} {key} can be imported at once"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        try:
+            capsule_content = TimeCapsuleContent.objects.get(pk=document["capsule_content"])
+        except (KeyError, TypeError, ValueError, TimeCapsuleContent.DoesNotExist):
+            return Response(
+                {"reason": "Invalid capsule content id sent"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        try:
+            node_ids, choice_ids = import_story(capsule_content, document)
+            return Response(
+                {"capsule_content": capsule_content.id, "nodes": node_ids, "choices": choice_ids},
+                status=status.HTTP_201_CREATED,
+            )
+        except InvalidStory as ex:
+            return Response(
+                {"reason": "Invalid story document", "errors": ex.errors},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except Exception as ex:
+            logger.error(
+                f"Error importing story into TimeCapsuleContent {capsule_content.id}: {str(ex)}",
+                exc_info=True,
+            )
+            return HttpResponseServerError(ex)
+
+    @action(detail=True, methods=['get'])
+    def ancestors(self, request, pk=None):
+        """Handle GET requests for the path from a story node up to its root
+
+        Returns:
+            Response -- JSON serialized array, parent first
+        """
+        return self._walk(request, pk, story_tree.ancestors, include_self=False)
+
+    @action(detail=True, methods=['get'])
+    def subtree(self, request, pk=None):
+        """Handle GET requests for a story node and all of its descendants
+
+        Returns:
+            Response -- JSON serialized array, level by level
+        """
+        return self._walk(request, pk, story_tree.subtree, include_self=True)
+
+    def _walk(self, request, pk, walk, include_self):
+        try:
+            max_depth = settings.STORY_TREE_MAX_DEPTH
+            if "depth" in request.query_params:
+                try:
+                    max_depth = min(int(request.query_params["depth"]), max_depth)
+                except ValueError:
+                    return Response({"reason": "depth must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+                if max_depth < 0:
+                    return Response({"reason": "depth must not be negative"}, status=status.HTTP_400_BAD_REQUEST)
+
+            nodes = walk(pk, max_depth)
+            if not nodes:
+                return Response(None, status=status.HTTP_404_NOT_FOUND)
+            if not include_self:
+                nodes = nodes[1:]
+
+            serializer = StoryTreeNodeSerializer(nodes, many=True)
             return Response(serializer.data, status=status.HTTP_200_OK)
         except Exception as ex:
+            logger.error(
+                f"Error walking StoryNode with id {pk}: {str(ex)}",
+                exc_info=True,
+            )
             return HttpResponseServerError(ex)
 
 
@@ -174,4 +444,21 @@ class StoryNodeSerializer(serializers.ModelSerializer):
             "content",
             "created_at",
         )
-        depth = 1
\ No newline at end of file
+        depth = 1
+
+
+class StoryTreeNodeSerializer(serializers.ModelSerializer):
+    """JSON serializer for story nodes returned by the tree walks"""
+
+    depth = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = StoryNode
+        fields = (
+            "id",
+            "capsule_content",
+            "parent_node",
+            "content",
+            "created_at",
+            "depth",
+        )
@@ -1,12 +1,32 @@
+import heapq
 import logging
+import math
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Prefetch, Q
 from django.http import HttpResponseServerError
+from django.utils import timezone
 from rest_framework import serializers, status
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
-from timecapsuleapi.models import TimeCapsule, UserProfile, CapsuleStatus, CapsuleType
+from rest_framework.decorators import action
+from timecapsuleapi.models import (
+    TimeCapsule, UserProfile, CapsuleStatus, CapsuleType,
+    TimeCapsuleContent, Prediction, StoryNode, DiscussionThread, CapsuleDiscovery
+)
+from timecapsuleapi.models.capsule import grid_cell
+from timecapsuleapi.pagination import KeysetPagination, InvalidCursor
+from timecapsuleapi import achievements, buffers, counters, registry, stats_cache, timeline
 
 logger = logging.getLogger(__name__)
 
+RETRIEVE_INCLUDES = ("contents", "predictions", "story_nodes", "discussion_threads")
+BATCH_FIELDS = ("status", "type", "title", "descriptions", "opening_date", "location_x", "location_y")
+
+# Most grid columns GET /capsules/nearby looks up one by one
+NEARBY_MAX_COLUMNS = 64
+
 
 class CapsuleView(ViewSet):
     """Void view set"""
@@ -18,11 +38,11 @@ class CapsuleView(ViewSet):
             Response -- JSON serialized instance
         """
         capsule = TimeCapsule()
-        authenticated_user_profile = UserProfile.objects.get(user=request.auth.user)
-        capsule.creator = authenticated_user_profile
+        authenticated_user_profile = request.profile
+        capsule.creator_id = authenticated_user_profile.id
 
         try:
-            capsule_status = CapsuleStatus.objects.get(pk=request.data["status"])
+            capsule_status = registry.capsule_statuses.get(request.data["status"])
             capsule.status = capsule_status
         except CapsuleStatus.DoesNotExist:
             return Response(
@@ -31,7 +51,7 @@ class CapsuleView(ViewSet):
             )
 
         try:
-            capsule_type = CapsuleType.objects.get(pk=request.data["type"])
+            capsule_type = registry.capsule_types.get(request.data["type"])
             capsule.type = capsule_type
         except CapsuleType.DoesNotExist:
             return Response(
@@ -55,16 +75,59 @@ class CapsuleView(ViewSet):
     def retrieve(self, request, pk=None):
         """Handle GET requests for single item
 
+        ?include= is a comma separated list of contents, predictions,
+        story_nodes and discussion_threads to embed. Predictions and story
+        nodes are nested under their content. Each include costs exactly one
+        extra query, however many children the capsule has.
+
         Returns:
             Response -- JSON serialized instance
         """
-        # try:
-        #     void = Void.objects.get(pk=pk)
-        #     serializer = VoidSerializer(void)
-        #     return Response(serializer.data)
-        # except Exception as ex:
-        #     return Response({"reason": ex.args[0]}, status=status.HTTP_400_BAD_REQUEST)
-        pass
+        include = {name for name in request.query_params.get("include", "").split(",") if name}
+        unknown = include.difference(RETRIEVE_INCLUDES)
+        if unknown:
+            return Response(
+                {"reason": f"Unknown include: {', '.join(sorted(unknown))}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if "predictions" in include or "story_nodes" in include:
+            include.add("contents")
+
+        try:
+            capsules = TimeCapsule.objects.all()
+
+            if "contents" in include:
+                capsules = capsules.prefetch_related(Prefetch(
+                    "contents",
+                    queryset=TimeCapsuleContent.objects.select_related("content_type").order_by("created_at", "id"),
+                ))
+
+            if "predictions" in include:
+                capsules = capsules.prefetch_related(Prefetch(
+                    "contents__predictions",
+                    queryset=Prediction.objects.select_related("verification_status").order_by("created_at", "id"),
+                ))
+
+            if "story_nodes" in include:
+                capsules = capsules.prefetch_related(Prefetch(
+                    "contents__story_nodes",
+                    queryset=StoryNode.objects.order_by("created_at", "id"),
+                ))
+
+            if "discussion_threads" in include:
+                capsules = capsules.prefetch_related(Prefetch(
+                    "discussion_threads",
+                    queryset=DiscussionThread.objects.order_by("-created_at", "-id"),
+                ))
+
+            capsule = capsules.get(pk=pk)
+            serializer = CapsuleDetailSerializer(capsule, context={"include": include})
+            return Response(serializer.data)
+        except TimeCapsule.DoesNotExist:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        except Exception as ex:
+            return Response({"reason": ex.args[0]}, status=status.HTTP_400_BAD_REQUEST)
 
     def update(self, request, pk=None):
         """Handle PUT requests
@@ -76,7 +139,7 @@ class CapsuleView(ViewSet):
             timecapsule = TimeCapsule.objects.get(pk=pk)
 
             try:
-                capsule_status = CapsuleStatus.objects.get(pk=request.data["status"])
+                capsule_status = registry.capsule_statuses.get(request.data["status"])
                 timecapsule.status = capsule_status
             except CapsuleStatus.DoesNotExist:
                 return Response(
@@ -85,7 +148,7 @@ class CapsuleView(ViewSet):
                 )
 
             try:
-                capsule_type = CapsuleType.objects.get(pk=request.data["type"])
+                capsule_type = registry.capsule_types.get(request.data["type"])
                 timecapsule.type = capsule_type
             except CapsuleType.DoesNotExist:
                 return Response(
@@ -138,12 +201,264 @@ class CapsuleView(ViewSet):
             Response -- JSON serialized array
         """
         try:
-            capsules = TimeCapsule.objects.all()
+            paginator = KeysetPagination()
+            capsules = paginator.paginate_queryset(TimeCapsule.objects.all(), request)
             serializer = CapsuleSerializer(capsules, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return paginator.get_paginated_response(serializer.data)
+        except InvalidCursor:
+            return Response({"reason": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as ex:
+            return HttpResponseServerError(ex)
+
+    @action(detail=False, methods=['get'])
+    def nearby(self, request):
+        """Handle GET requests for capsules within a radius of a point
+
+        Query params: x, y, radius and an optional limit
+
+        Returns:
+            Response -- JSON serialized array sorted by distance
+        """
+        try:
+            x = float(request.query_params["x"])
+            y = float(request.query_params["y"])
+            radius = float(request.query_params["radius"])
+            limit = int(request.query_params.get("limit", settings.API_PAGE_SIZE))
+        except (KeyError, ValueError):
+            return Response(
+                {"reason": "x, y and radius must be sent as numbers"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        bounds = (x - radius, y - radius, x + radius, y + radius)
+        if not all(math.isfinite(value) for value in (x, y, radius) + bounds):
+            return Response(
+                {"reason": "x, y and radius must be finite numbers"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if radius <= 0 or limit <= 0:
+            return Response(
+                {"reason": "radius and limit must be positive"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        limit = min(limit, settings.API_MAX_PAGE_SIZE)
+
+        try:
+            min_grid_x, min_grid_y = grid_cell(bounds[0], bounds[1])
+            max_grid_x, max_grid_y = grid_cell(bounds[2], bounds[3])
+        except OverflowError:
+            return Response(
+                {"reason": "x, y and radius are out of range"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            # Narrow down to the grid cells covering the bounding box of the
+            # circle. The (grid_x, grid_y) index only seeks on grid_y once
+            # grid_x is fixed, so each column is queried with an equality on
+            # grid_x. Very wide circles fall back to one range over grid_x,
+            # which reads the whole height of every column in the box.
+            if max_grid_x - min_grid_x < NEARBY_MAX_COLUMNS:
+                cells = Q()
+                for column in range(min_grid_x, max_grid_x + 1):
+                    cells |= Q(grid_x=column, grid_y__range=(min_grid_y, max_grid_y))
+            else:
+                cells = Q(grid_x__range=(min_grid_x, max_grid_x), grid_y__range=(min_grid_y, max_grid_y))
+
+            candidates = TimeCapsule.objects.filter(
+                cells,
+                location_x__range=(bounds[0], bounds[2]),
+                location_y__range=(bounds[1], bounds[3]),
+            )
+
+            matches = []
+            for capsule in candidates:
+                distance = math.hypot(capsule.location_x - x, capsule.location_y - y)
+                if distance <= radius:
+                    matches.append((distance, capsule.id, capsule))
+
+            closest = heapq.nsmallest(limit, matches, key=lambda match: match[:2])
+
+            results = []
+            for distance, _, capsule in closest:
+                data = CapsuleSerializer(capsule).data
+                data["distance"] = distance
+                results.append(data)
+
+            return Response(results, status=status.HTTP_200_OK)
+        except Exception as ex:
+            return HttpResponseServerError(ex)
+
+    @action(detail=True, methods=['post'])
+    def discover(self, request, pk=None):
+        """Handle POST requests recording that the user discovered a capsule
+
+        The discovery is buffered and written together with others shortly
+        after, so it shows up in discovery history within a few seconds.
+
+        Returns:
+            Response -- Empty body with 202 status code
+        """
+        try:
+            if not TimeCapsule.objects.filter(pk=pk).exists():
+                return Response(None, status=status.HTTP_404_NOT_FOUND)
+
+            authenticated_user_profile = request.profile
+            buffers.discoveries.add(CapsuleDiscovery(
+                user_id=authenticated_user_profile.id,
+                capsule_id=int(pk),
+                discovered_at=timezone.now(),
+            ))
+            return Response(None, status=status.HTTP_202_ACCEPTED)
+        except Exception as ex:
+            return Response({"reason": ex.args[0]}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """Handle POST requests that create or update many capsules at once
+
+        Items with an "id" update that capsule, items without one create a
+        new capsule. Lookups are done once for the whole batch and every
+        write happens in a single transaction.
+
+        Returns:
+            Response -- JSON array with one result per submitted item
+        """
+        items = request.data
+        if not isinstance(items, list):
+            return Response(
+                {"reason": "Expected an array of capsules"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if len(items) > settings.API_MAX_BATCH_SIZE:
+            return Response(
+                {"reason": f"At most {settings.API_MAX_BATCH_SIZE} capsules can be sent at once"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            authenticated_user_profile = request.profile
+
+            # Statuses and types come from the registry, existing capsules
+            # from one IN query for the whole batch
+            statuses = registry.capsule_statuses.in_bulk(self._batch_ids(items, "status"))
+            types = registry.capsule_types.in_bulk(self._batch_ids(items, "type"))
+            existing = TimeCapsule.objects.in_bulk(self._batch_ids(items, "id"))
+
+            results = [None] * len(items)
+            to_create = []
+            to_update = []
+
+            for index, item in enumerate(items):
+                if not isinstance(item, dict):
+                    results[index] = {"result": "error", "reason": "Expected a capsule object"}
+                    continue
+
+                if item.get("id") is not None:
+                    capsule = existing.get(self._as_id(item["id"]))
+                    if capsule is None:
+                        results[index] = {"result": "error", "reason": "Invalid capsule id sent"}
+                        continue
+                else:
+                    capsule = TimeCapsule(creator_id=authenticated_user_profile.id)
+
+                reason = self._apply_batch_item(capsule, item, statuses, types)
+                if reason is not None:
+                    results[index] = {"result": "error", "reason": reason}
+                elif capsule.pk is None:
+                    to_create.append((index, capsule))
+                else:
+                    to_update.append((index, capsule))
+
+            with transaction.atomic():
+                TimeCapsule.objects.bulk_create([capsule for _, capsule in to_create])
+                # bulk_create does not send post_save, so count the new capsules here
+                counters.adjust(UserProfile, authenticated_user_profile.id, "created_capsules_count", len(to_create))
+                if to_create:
+                    achievements.award(authenticated_user_profile.id, "capsules_created")
+                    timeline.add_created([capsule for _, capsule in to_create])
+                TimeCapsule.objects.bulk_update(
+                    [capsule for _, capsule in to_update],
+                    BATCH_FIELDS + ("grid_x", "grid_y"),
+                )
+
+            stats_cache.invalidate(*{capsule.creator_id for _, capsule in to_create + to_update})
+
+            for index, capsule in to_create:
+                results[index] = {"result": "created", "id": capsule.id}
+            for index, capsule in to_update:
+                results[index] = {"result": "updated", "id": capsule.id}
+
+            return Response(results, status=status.HTTP_200_OK)
         except Exception as ex:
+            logger.error(
+                f"Error in TimeCapsule batch: {str(ex)}",
+                exc_info=True,
+            )
             return HttpResponseServerError(ex)
 
+    def _batch_ids(self, items, key):
+        """Collect the valid integer ids stored under key in a batch"""
+        ids = set()
+        for item in items:
+            if isinstance(item, dict):
+                pk = self._as_id(item.get(key))
+                if pk is not None:
+                    ids.add(pk)
+        return ids
+
+    def _as_id(self, value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    def _apply_batch_item(self, capsule, item, statuses, types):
+        """Copy one batch item onto a capsule
+
+        Returns:
+            str -- Reason the item is invalid, or None when it was applied
+        """
+        missing = [field for field in BATCH_FIELDS if field not in item]
+        if missing:
+            return f"Missing fields: {', '.join(missing)}"
+
+        capsule_status = statuses.get(self._as_id(item["status"]))
+        if capsule_status is None:
+            return "Invalid capsule status id sent"
+
+        capsule_type = types.get(self._as_id(item["type"]))
+        if capsule_type is None:
+            return "Invalid capsule type id sent"
+
+        try:
+            capsule.opening_date = TimeCapsule._meta.get_field("opening_date").to_python(item["opening_date"])
+            capsule.location_x = float(item["location_x"])
+            capsule.location_y = float(item["location_y"])
+        except (ValidationError, TypeError, ValueError):
+            return "Invalid opening_date or location sent"
+
+        if capsule.opening_date is None:
+            return "Invalid opening_date or location sent"
+
+        # float() accepts "nan" and "inf", which have no grid cell
+        if not (math.isfinite(capsule.location_x) and math.isfinite(capsule.location_y)):
+            return "Invalid opening_date or location sent"
+
+        try:
+            # bulk_create and bulk_update skip save(), which normally does this
+            capsule.update_grid_cell()
+        except OverflowError:
+            return "Location is out of range"
+
+        capsule.status = capsule_status
+        capsule.type = capsule_type
+        capsule.title = item["title"]
+        capsule.descriptions = item["descriptions"]
+        return None
+
 
 class CapsuleSerializer(serializers.ModelSerializer):
     """JSON serializer"""
@@ -164,4 +479,91 @@ class CapsuleSerializer(serializers.ModelSerializer):
             "opening_date",
             "location_x",
             "location_y",
+            "discussion_count",
+            "content_count",
+        )
+
+
+class CapsulePredictionSerializer(serializers.ModelSerializer):
+    """JSON serializer for predictions embedded in a capsule"""
+
+    verification_status = serializers.SlugRelatedField(slug_field="name", read_only=True)
+
+    class Meta:
+        model = Prediction
+        fields = (
+            "id",
+            "prediction_text",
+            "category",
+            "verification_status",
+            "verification_date",
+            "verification_user",
+            "created_at",
         )
+
+
+class CapsuleStoryNodeSerializer(serializers.ModelSerializer):
+    """JSON serializer for story nodes embedded in a capsule"""
+
+    class Meta:
+        model = StoryNode
+        fields = (
+            "id",
+            "parent_node",
+            "content",
+            "created_at",
+        )
+
+
+class CapsuleContentSerializer(serializers.ModelSerializer):
+    """JSON serializer for contents embedded in a capsule"""
+
+    content_type = serializers.SlugRelatedField(slug_field="name", read_only=True)
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        include = self.context.get("include", ())
+        if "predictions" in include:
+            data["predictions"] = CapsulePredictionSerializer(instance.predictions.all(), many=True).data
+        if "story_nodes" in include:
+            data["story_nodes"] = CapsuleStoryNodeSerializer(instance.story_nodes.all(), many=True).data
+        return data
+
+    class Meta:
+        model = TimeCapsuleContent
+        fields = (
+            "id",
+            "content_type",
+            "content",
+            "media_url",
+            "created_at",
+        )
+
+
+class CapsuleThreadSerializer(serializers.ModelSerializer):
+    """JSON serializer for discussion threads embedded in a capsule"""
+
+    class Meta:
+        model = DiscussionThread
+        fields = (
+            "id",
+            "title",
+            "created_by",
+            "created_at",
+            "comment_count",
+        )
+
+
+class CapsuleDetailSerializer(CapsuleSerializer):
+    """JSON serializer for a capsule and the children named in ?include="""
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        include = self.context.get("include", ())
+        if "contents" in include:
+            data["contents"] = CapsuleContentSerializer(
+                instance.contents.all(), many=True, context=self.context
+            ).data
+        if "discussion_threads" in include:
+            data["discussion_threads"] = CapsuleThreadSerializer(instance.discussion_threads.all(), many=True).data
+        return data
@@ -1,10 +1,13 @@
 import logging
+from django.db.models import Count
 from django.http import HttpResponseServerError
 from rest_framework import serializers, status
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
 from rest_framework.decorators import action
-from timecapsuleapi.models import TimeCapsule, UserProfile, CapsuleStatus
+from timecapsuleapi.models import TimeCapsule, CapsuleStatus, CapsuleDiscovery
+from timecapsuleapi.pagination import KeysetPagination, InvalidCursor
+from timecapsuleapi import achievements, registry, stats_cache, timeline
 
 logger = logging.getLogger(__name__)
 
@@ -20,19 +23,20 @@ class UserTimelineView(ViewSet):
         """
         try:
             # Get the authenticated user
-            authenticated_user_profile = UserProfile.objects.get(user=request.auth.user)
+            authenticated_user_profile = request.profile
 
-            # Get all capsules created by the user
-            created_capsules = TimeCapsule.objects.filter(creator=authenticated_user_profile).order_by('-created_at')
-
-            # Get all capsules the user has access to (but didn't create)
-            # This would require additional logic based on your access control model
-            # For example, if you have a model that tracks which users have access to which capsules
-            # accessible_capsules = TimeCapsule.objects.filter(access_controls__user=authenticated_user_profile).exclude(creator=authenticated_user_profile)
+            # Capsules the user created or was granted access to, fanned out
+            # into TimelineEntry on write so this is one indexed query
+            entries = timeline.visible_entries(authenticated_user_profile).select_related(
+                "capsule__status", "capsule__type"
+            )
 
-            # For now, we'll just return the created capsules
-            serializer = TimelineCapsuleSerializer(created_capsules, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            paginator = KeysetPagination()
+            entries = paginator.paginate_queryset(entries, request)
+            serializer = TimelineCapsuleSerializer([entry.capsule for entry in entries], many=True)
+            return paginator.get_paginated_response(serializer.data)
+        except InvalidCursor:
+            return Response({"reason": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as ex:
             return HttpResponseServerError(ex)
 
@@ -45,36 +49,12 @@ class UserTimelineView(ViewSet):
         """
         try:
             # Get the authenticated user
-            authenticated_user_profile = UserProfile.objects.get(user=request.auth.user)
-
-            # Count capsules by status
-            status_stats = {}
-            capsule_statuses = CapsuleStatus.objects.all()
-
-            for cs in capsule_statuses:
-                count = TimeCapsule.objects.filter(creator=authenticated_user_profile, status=cs).count()
-                status_stats[cs.name] = count
-
-            # Count total capsules created
-            total_created = TimeCapsule.objects.filter(creator=authenticated_user_profile).count()
-
-            # Count total discussions started
-            total_discussions = authenticated_user_profile.discussion_threads.count()
-
-            # Count total comments made
-            total_comments = authenticated_user_profile.discussion_comments.count()
-
-            # Count total predictions verified
-            total_verified = authenticated_user_profile.verified_predictions.count()
+            authenticated_user_profile = request.profile
 
-            statistics = {
-                "status_stats": status_stats,
-                "total_created": total_created,
-                "total_discussions": total_discussions,
-                "total_comments": total_comments,
-                "total_verified": total_verified,
-                "achievements": self._calculate_achievements(authenticated_user_profile)
-            }
+            statistics = stats_cache.get(authenticated_user_profile.id)
+            if statistics is None:
+                statistics = self._calculate_statistics(authenticated_user_profile)
+                stats_cache.store(authenticated_user_profile.id, statistics)
 
             return Response(statistics, status=status.HTTP_200_OK)
         except Exception as ex:
@@ -84,20 +64,47 @@ class UserTimelineView(ViewSet):
             )
             return HttpResponseServerError(ex)
 
+    @action(detail=False, methods=['get'])
+    def achievements(self, request):
+        """Get the achievements the user has earned
+
+        Returns:
+            Response -- JSON array of achievements, oldest first
+        """
+        try:
+            authenticated_user_profile = request.profile
+            return Response(achievements.achievements_for(authenticated_user_profile.id), status=status.HTTP_200_OK)
+        except Exception as ex:
+            logger.error(
+                f"Error getting achievements: {str(ex)}",
+                exc_info=True,
+            )
+            return HttpResponseServerError(ex)
+
     @action(detail=False, methods=['get'])
     def discovery_history(self, request):
         """Get history of capsules discovered by the user
 
+        Discoveries are buffered on write, so the newest few seconds may
+        not be listed yet.
+
         Returns:
-            Response -- JSON with discovery history
+            Response -- JSON with discovery history, newest first
         """
         try:
             # Get the authenticated user
-            authenticated_user_profile = UserProfile.objects.get(user=request.auth.user)
-
-            # This would require a model that tracks which capsules a user has discovered
-            # For now, we'll return an empty list
-            return Response([], status=status.HTTP_200_OK)
+            authenticated_user_profile = request.profile
+
+            discoveries = CapsuleDiscovery.objects.filter(
+                user=authenticated_user_profile
+            ).select_related("capsule__status", "capsule__type")
+
+            paginator = KeysetPagination(field="discovered_at")
+            discoveries = paginator.paginate_queryset(discoveries, request)
+            serializer = DiscoverySerializer(discoveries, many=True)
+            return paginator.get_paginated_response(serializer.data)
+        except InvalidCursor:
+            return Response({"reason": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as ex:
             logger.error(
                 f"Error getting discovery history: {str(ex)}",
@@ -105,75 +112,42 @@ class UserTimelineView(ViewSet):
             )
             return HttpResponseServerError(ex)
 
-    def _calculate_achievements(self, user_profile):
-        """Calculate achievements for a user
+    def _calculate_statistics(self, user_profile):
+        """Calculate statistics for a user with one query per table
 
         Args:
-            user_profile: The user profile to calculate achievements for
+            user_profile: The user profile to calculate statistics for
 
         Returns:
-            List of achievements
+            Dictionary of statistics
         """
-        achievements = []
-
-        # Count total capsules created
-        total_created = TimeCapsule.objects.filter(creator=user_profile).count()
-
-        # Achievement for creating capsules
-        if total_created >= 1:
-            achievements.append({
-                "name": "Time Capsule Creator",
-                "description": "Created your first time capsule",
-                "date_earned": TimeCapsule.objects.filter(creator=user_profile).order_by('created_at').first().created_at
-            })
-
-        if total_created >= 5:
-            achievements.append({
-                "name": "Time Capsule Enthusiast",
-                "description": "Created 5 time capsules",
-                "date_earned": TimeCapsule.objects.filter(creator=user_profile).order_by('created_at')[4].created_at
-            })
-
-        if total_created >= 10:
-            achievements.append({
-                "name": "Time Capsule Master",
-                "description": "Created 10 time capsules",
-                "date_earned": TimeCapsule.objects.filter(creator=user_profile).order_by('created_at')[9].created_at
-            })
-
-        # Achievement for starting discussions
-        total_discussions = user_profile.discussion_threads.count()
-        if total_discussions >= 1:
-            achievements.append({
-                "name": "Discussion Starter",
-                "description": "Started your first discussion",
-                "date_earned": user_profile.discussion_threads.order_by('created_at').first().created_at
-            })
-
-        # Achievement for verifying predictions
-        total_verified = user_profile.verified_predictions.count()
-        if total_verified >= 1:
-            achievements.append({
-                "name": "Prediction Verifier",
-                "description": "Verified your first prediction",
-                "date_earned": user_profile.verified_predictions.order_by('verification_date').first().verification_date
-            })
-
-        return achievements
+        capsules = TimeCapsule.objects.filter(creator=user_profile).order_by()
+
+        # Count capsules by status in a single GROUP BY
+        per_status = dict(capsules.values_list("status").annotate(total=Count("id")))
+        status_stats = {
+            cs.name: per_status.get(cs.id, 0) for cs in registry.capsule_statuses.all()
+        }
+
+        return {
+            "status_stats": status_stats,
+            "total_created": sum(per_status.values()),
+            "total_discussions": user_profile.discussion_threads.count(),
+            "total_comments": user_profile.discussion_comments.count(),
+            "total_verified": user_profile.verified_predictions_count,
+            # Awarded at write time, see timecapsuleapi/achievements.py
+            "achievements": achievements.achievements_for(user_profile.id)
+        }
 
 
 class TimelineCapsuleSerializer(serializers.ModelSerializer):
     """JSON serializer for timeline capsules"""
 
     opening_date = serializers.SerializerMethodField()
-    discussion_count = serializers.SerializerMethodField()
 
     def get_opening_date(self, obj):
         return obj.opening_date.strftime("%Y-%m-%d")
 
-    def get_discussion_count(self, obj):
-        return obj.discussion_threads.count()
-
     class Meta:
         model = TimeCapsule
         fields = (
@@ -187,5 +161,20 @@ class TimelineCapsuleSerializer(serializers.ModelSerializer):
             "location_y",
             "created_at",
             "discussion_count",
+            "content_count",
+        )
+        depth = 1
+
+
+class DiscoverySerializer(serializers.ModelSerializer):
+    """JSON serializer for discovered capsules"""
+
+    capsule = TimelineCapsuleSerializer()
+
+    class Meta:
+        model = CapsuleDiscovery
+        fields = (
+            "id",
+            "capsule",
+            "discovered_at",
         )
-        depth = 1
\ No newline at end of file
@@ -4,6 +4,7 @@ from rest_framework import serializers, status
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
 from timecapsuleapi.models import VerificationStatus
+from timecapsuleapi import registry
 
 logger = logging.getLogger(__name__)
 
@@ -18,7 +19,7 @@ class VerificationStatusView(ViewSet):
             Response -- JSON serialized verification status
         """
         try:
-            verification_status = VerificationStatus.objects.get(pk=pk)
+            verification_status = registry.verification_statuses.get(pk)
             serializer = VerificationStatusSerializer(verification_status)
             return Response(serializer.data)
         except VerificationStatus.DoesNotExist:
@@ -33,7 +34,7 @@ class VerificationStatusView(ViewSet):
             Response -- JSON serialized array
         """
         try:
-            verification_statuses = VerificationStatus.objects.all()
+            verification_statuses = registry.verification_statuses.all()
             serializer = VerificationStatusSerializer(verification_statuses, many=True)
             return Response(serializer.data, status=status.HTTP_200_OK)
         except Exception as ex:
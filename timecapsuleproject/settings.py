@@ -41,6 +41,89 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Seconds the profile id behind request.profile is cached per user (see
+# timecapsuleapi/authentication.py). Tokens are still checked on every
+# request. A profile created or deleted is seen at once by workers sharing
+# the cache backend; with the default per-process cache, other workers may
+# keep a deleted profile's id for up to this long.
+AUTH_PROFILE_CACHE_TTL = 300
+
+# Keyset pagination for list endpoints (see timecapsuleapi/pagination.py)
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+
+# Largest array accepted by batch endpoints such as POST /capsules/batch
+API_MAX_BATCH_SIZE = 1000
+
+# Seconds a worker keeps its cached copy of the small lookup tables
+# (statuses, types, permission levels) before reloading them
+LOOKUP_REGISTRY_TTL = 300
+
+# Seconds GET /usertimeline/statistics stays cached per user. Writes clear
+# the entry, so this only bounds staleness across processes that do not
+# share a cache backend. Set to 0 to disable the cache.
+USER_STATISTICS_CACHE_TTL = 300
+
+# Capsule discoveries are buffered in memory and written in one batch when
+# this many are pending or this many seconds after the oldest one arrived
+DISCOVERY_BUFFER_SIZE = 100
+DISCOVERY_BUFFER_SECONDS = 2.0
+
+# Story choices taken by readers are counted in memory per (choice, day) and
+# added to the daily rows when this many clicks are pending or this many
+# seconds after the oldest one arrived
+STORY_CHOICE_BUFFER_SIZE = 500
+STORY_CHOICE_BUFFER_SECONDS = 5.0
+
+# Most days GET /storynodes/paths counts back from today
+STORY_PATHS_MAX_DAYS = 3650
+
+# Server-sent comment streams (GET /discussionthreads/<id>/stream): events
+# held for a slow reader before it is made to reconnect, seconds between
+# keepalive lines and the reconnect delay suggested to clients
+COMMENT_STREAM_QUEUE_SIZE = 100
+COMMENT_STREAM_KEEPALIVE_SECONDS = 15
+COMMENT_STREAM_RETRY_MS = 3000
+
+# Seconds a ticket from POST /discussionthreads/<id>/stream_ticket can be
+# used to open that thread's comment stream
+COMMENT_STREAM_TICKET_SECONDS = 60
+
+# Hours after which a comment counts half as much towards its thread's hot
+# score (see timecapsuleapi/hotness.py)
+THREAD_HOTNESS_HALF_LIFE_HOURS = 24
+
+# Write-behind comment ingestion. When enabled, POST /discussioncomments
+# stages the comment in QueuedComment and answers 202 with an ingest_id.
+# One writer thread per worker commits staged comments in a transaction per
+# this many rows or this many seconds. GET
+# /discussioncomments/ingested/<ingest_id> reads the comment back from any
+# worker, whether or not it has been committed yet.
+COMMENT_WRITE_BEHIND = False
+COMMENT_BUFFER_SIZE = 50
+COMMENT_BUFFER_SECONDS = 0.05
+
+# A staged comment whose batch fails is retried after this many seconds,
+# doubling on every attempt, and marked failed after this many attempts
+# (see `ingest_queued_comments`)
+COMMENT_INGEST_RETRY_SECONDS = 0.5
+COMMENT_INGEST_MAX_ATTEMPTS = 8
+
+# Estimated Jaccard similarity of character 4-shingles (of the lowercased
+# text without punctuation) above which a new prediction is grouped with an
+# existing one as a near-duplicate
+PREDICTION_SIMILARITY_THRESHOLD = 0.7
+
+# Deepest level the story node ancestors/subtree queries walk
+STORY_TREE_MAX_DEPTH = 1000
+
+# Seconds a compiled story graph stays cached. Story writes invalidate it
+# exactly through a version bump, so this only frees memory of cold stories.
+STORY_GRAPH_CACHE_TTL = 86400
+
+# Most nodes, and separately most choices, one story import may contain
+STORY_IMPORT_MAX_SIZE = 10000
+
 CORS_ORIGIN_WHITELIST = (
     'http://localhost:3000',
     'http://127.0.0.1:3000',
@@ -56,6 +139,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'timecapsuleapi.middleware.profile_middleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
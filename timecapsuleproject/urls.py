@@ -6,7 +6,7 @@ from timecapsuleapi.views import (
     StoryNodeView, StoryChoiceView,
     PredictionView, VerificationStatusView,
     DiscussionThreadView, DiscussionCommentView,
-    UserTimelineView
+    UserTimelineView, comment_stream
 )
 
 router = routers.DefaultRouter(trailing_slash=False)
@@ -25,4 +25,5 @@ urlpatterns = [
     path('', include(router.urls)),
     path('register', register_user), # Enables http://localhost:8000/register
     path('login', login_user), # Enables http://localhost:8000/login
+    path('discussionthreads/<int:pk>/stream', comment_stream), # Server-sent events of new comments
 ]